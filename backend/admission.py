@@ -0,0 +1,213 @@
+import ipaddress
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+
+# Lanes in priority order: a lower index is more critical and is the last to be shed
+LANE_CHECKIN = "checkin"
+LANE_REGISTRATION = "registration"
+LANE_DEFAULT = "default"
+LANE_REPORTS = "reports"
+LANES = (LANE_CHECKIN, LANE_REGISTRATION, LANE_DEFAULT, LANE_REPORTS)
+
+# Total number of requests allowed in flight across all lanes
+MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "64"))
+
+# Per-lane settings:
+#   concurrency - max requests of this lane in flight at once
+#   share       - fraction of MAX_IN_FLIGHT that may be busy when a request of this lane is admitted
+#   rate/burst  - per-client token bucket (requests per second / bucket size)
+LANE_CONFIG: Dict[str, Dict[str, float]] = {
+    LANE_CHECKIN: {"concurrency": 32, "share": 1.0, "rate": 50.0, "burst": 100.0},
+    LANE_REGISTRATION: {"concurrency": 24, "share": 0.85, "rate": 5.0, "burst": 10.0},
+    LANE_DEFAULT: {"concurrency": 24, "share": 0.7, "rate": 20.0, "burst": 40.0},
+    LANE_REPORTS: {"concurrency": 4, "share": 0.5, "rate": 2.0, "burst": 10.0},
+}
+
+# Paths that are never shed (load balancer probes); CORS preflights are never shed either
+EXEMPT_PREFIXES = ("/health",)
+
+# Proxies whose X-Forwarded-For header is believed, as comma-separated addresses or networks;
+# requests from anyone else are keyed on their own address, so a client cannot pick its bucket
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(entry.strip(), strict=False)
+    for entry in os.getenv("ADMISSION_TRUSTED_PROXIES", "").split(",") if entry.strip()
+]
+
+# Upper bound on tracked client buckets, least recently seen clients are evicted first
+MAX_TRACKED_CLIENTS = 10000
+
+
+def classify_request(method: str, path: str) -> str:
+    """Map a request to its priority lane"""
+    if path.startswith("/attendance") and method == "POST":
+        return LANE_CHECKIN
+    if path.startswith("/registrations") and method == "POST":
+        return LANE_REGISTRATION
+    if path.startswith(("/reports", "/admin")):
+        return LANE_REPORTS
+    return LANE_DEFAULT
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` tokens per second"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> Tuple[bool, float]:
+        """Take one token; returns (allowed, seconds until a token is available)"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0.0
+        return False, (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Tracks in-flight requests and per-client buckets, and decides who gets in"""
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT, lane_config: Optional[Dict[str, Dict[str, float]]] = None):
+        self.max_in_flight = max_in_flight
+        self.lane_config = lane_config or LANE_CONFIG
+        self.in_flight = 0
+        self.lane_in_flight = {lane: 0 for lane in LANES}
+        self.buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        self.counters = {
+            lane: {"admitted": 0, "shed_rate_limited": 0, "shed_overloaded": 0}
+            for lane in LANES
+        }
+
+    def _bucket(self, client: str, lane: str) -> TokenBucket:
+        key = (client, lane)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            config = self.lane_config[lane]
+            bucket = TokenBucket(config["rate"], config["burst"])
+            self.buckets[key] = bucket
+            if len(self.buckets) > MAX_TRACKED_CLIENTS:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        return bucket
+
+    def try_acquire(self, client: str, lane: str) -> Tuple[Optional[int], float]:
+        """Try to admit a request. Returns (None, 0) when admitted, otherwise (status code, retry after)"""
+        config = self.lane_config[lane]
+
+        allowed, wait = self._bucket(client, lane).take()
+        if not allowed:
+            self.counters[lane]["shed_rate_limited"] += 1
+            return 429, wait
+
+        # Lower priority lanes only get the lower part of the global capacity,
+        # so check-ins still find free slots when reports are saturating the worker
+        if (self.lane_in_flight[lane] >= config["concurrency"]
+                or self.in_flight >= self.max_in_flight * config["share"]):
+            self.counters[lane]["shed_overloaded"] += 1
+            return 503, 1.0
+
+        self.in_flight += 1
+        self.lane_in_flight[lane] += 1
+        self.counters[lane]["admitted"] += 1
+        return None, 0.0
+
+    def release(self, lane: str):
+        """Mark an admitted request as finished"""
+        self.in_flight -= 1
+        self.lane_in_flight[lane] -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of the current load and the admitted/shed counters"""
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "tracked_clients": len(self.buckets),
+            "lanes": {
+                lane: {
+                    "in_flight": self.lane_in_flight[lane],
+                    "concurrency_limit": self.lane_config[lane]["concurrency"],
+                    **self.counters[lane],
+                }
+                for lane in LANES
+            },
+        }
+
+
+controller = AdmissionController()
+
+
+def _trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
+
+
+def _client_id(scope) -> str:
+    """Identify the caller; X-Forwarded-For is honoured only when the peer is a trusted proxy"""
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    if not _trusted(peer):
+        return peer
+    for name, value in scope.get("headers", []):
+        if name == b"x-forwarded-for":
+            # Proxies append, so the rightmost untrusted hop is the one a trusted proxy saw
+            hops = [hop.strip() for hop in value.decode("latin-1").split(",") if hop.strip()]
+            for hop in reversed(hops):
+                if not _trusted(hop):
+                    return hop
+            return hops[0] if hops else peer
+    return peer
+
+
+class AdmissionControlMiddleware:
+    """ASGI middleware that sheds load with fast 429/503 responses before the route runs"""
+
+    def __init__(self, app, admission: AdmissionController = controller):
+        self.app = app
+        self.admission = admission
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] == "OPTIONS"
+                or scope["path"].startswith(EXEMPT_PREFIXES)):
+            await self.app(scope, receive, send)
+            return
+
+        lane = classify_request(scope["method"], scope["path"])
+        status, retry_after = self.admission.try_acquire(_client_id(scope), lane)
+        if status is not None:
+            await _reject(send, status, retry_after)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.release(lane)
+
+
+async def _reject(send, status: int, retry_after: float):
+    """Send a minimal JSON error response with a Retry-After header"""
+    detail = "Too many requests" if status == 429 else "Server is overloaded, please retry"
+    body = ('{"detail": "%s"}' % detail).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
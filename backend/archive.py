@@ -0,0 +1,365 @@
+"""Hot/cold tiering of past events.
+
+Registrations, attendance and feedback of events older than a cutoff are
+moved into one SQLite file per academic term under ARCHIVE_DIR. The hot
+database keeps the Events rows and an ArchivedEvents index of where each
+event's history lives. Connections opened with include_archive=True attach
+the term files and see the union of hot and archived rows.
+
+SQLite attaches at most MAX_ATTACHED_ARCHIVES files per connection, so once
+there are more term files the oldest terms are folded into a single file,
+archive_older.db. ArchivedEvents still records each event's own term.
+
+Usage:
+    python archive.py archive --older-than-days 180
+    python archive.py archive --cutoff 2025-09-01 --dry-run
+    python archive.py restore --term 2025_fall
+    python archive.py fold
+    python archive.py list
+"""
+import argparse
+import glob
+import os
+import sqlite3
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import database
+
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archives")
+
+# Default age after which an event's rows are moved to the archive
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+
+# SQLite attaches at most 10 databases per connection by default
+MAX_ATTACHED_ARCHIVES = 10
+
+# Archive file holding the terms folded together to stay within the attach limit
+FOLDED = "older"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS "ArchivedEvents" (
+    "event_id"      INTEGER PRIMARY KEY,
+    "term"          TEXT NOT NULL,
+    "archived_at"   TEXT NOT NULL
+);
+"""
+
+# Columns of the archived tables, in the order used by the union views
+COLUMNS = {
+    "Registrations": ("registration_id", "student_id", "event_id", "status", "timestamp"),
+    "Attendance": ("attendance_id", "registration_id", "attended", "timestamp"),
+    "Feedback": ("feedback_id", "registration_id", "rating", "comment"),
+}
+
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {schema}."Registrations" (
+    "registration_id" INTEGER PRIMARY KEY, "student_id" INTEGER, "event_id" INTEGER,
+    "status" TEXT, "timestamp" TEXT
+);
+CREATE TABLE IF NOT EXISTS {schema}."Attendance" (
+    "attendance_id" INTEGER PRIMARY KEY, "registration_id" INTEGER, "attended" INTEGER, "timestamp" TEXT
+);
+CREATE TABLE IF NOT EXISTS {schema}."Feedback" (
+    "feedback_id" INTEGER PRIMARY KEY, "registration_id" INTEGER, "rating" TEXT, "comment" TEXT
+);
+CREATE INDEX IF NOT EXISTS {schema}."idx_registrations_event_status" ON "Registrations" ("event_id", "status");
+CREATE INDEX IF NOT EXISTS {schema}."idx_attendance_registration" ON "Attendance" ("registration_id");
+CREATE INDEX IF NOT EXISTS {schema}."idx_feedback_registration" ON "Feedback" ("registration_id");
+"""
+
+
+def init_schema():
+    """Create the archive index table if it does not exist yet"""
+    with database.get_db_connection() as conn:
+        conn.executescript(SCHEMA)
+
+
+def term_for_date(event_date: str) -> str:
+    """Academic term of an event date: January-June is spring, July-December is fall"""
+    year, month = int(event_date[:4]), int(event_date[5:7])
+    return f"{year}_{'spring' if month <= 6 else 'fall'}"
+
+
+def archive_path(term: str) -> str:
+    return os.path.join(ARCHIVE_DIR, f"archive_{term}.db")
+
+
+def _term_key(term: str) -> Tuple[int, int]:
+    if term == FOLDED:
+        return 0, 0
+    year, season = term.split("_", 1)
+    return int(year), 0 if season == "spring" else 1
+
+
+def list_terms() -> List[str]:
+    """Archive files by term, oldest first; FOLDED holds the folded terms"""
+    paths = glob.glob(os.path.join(ARCHIVE_DIR, "archive_*.db"))
+    return sorted((os.path.basename(p)[len("archive_"):-len(".db")] for p in paths), key=_term_key)
+
+
+def term_file(term: str) -> str:
+    """Archive file holding a term's rows: its own file, or the folded file once it was folded"""
+    path = archive_path(term)
+    if os.path.exists(path) or not os.path.exists(archive_path(FOLDED)):
+        return path
+    folded = database.get_single_record("SELECT 1 AS found FROM ArchivedEvents WHERE term = ? LIMIT 1", (term,))
+    return archive_path(FOLDED) if folded else path
+
+
+def event_source(event_id: int, include_archived: bool) -> Tuple[bool, Optional[int]]:
+    """(include_archive, shard) to read one event's rows: the union views if it is archived and asked for, else its shard"""
+    import sharding
+    if (include_archived and not sharding.SHARDING_ENABLED
+            and database.check_record_exists("ArchivedEvents", "event_id", event_id)):
+        return True, None
+    # Shards are never archived from, see archive_events
+    return False, sharding.shard_for_event(event_id)
+
+
+def attach_archives(conn: sqlite3.Connection):
+    """Attach every term file and shadow the fact tables with hot + archive union views"""
+    terms = list_terms()
+    if len(terms) > MAX_ATTACHED_ARCHIVES:
+        raise RuntimeError(
+            f"{len(terms)} archive files exceed the attach limit of {MAX_ATTACHED_ARCHIVES}; "
+            f"run python archive.py fold"
+        )
+    schemas = []
+    for term in terms:
+        schema = f"arc_{term}"
+        conn.execute(f"ATTACH DATABASE ? AS {schema}", (archive_path(term),))
+        schemas.append(schema)
+
+    # The folded file serves every archived term without a file of its own
+    own = ", ".join(f"'{term}'" for term in terms if term != FOLDED)
+    folded = f"WHERE term NOT IN ({own})" if own else ""
+
+    # Temp objects are resolved before main, so the existing queries read the views unchanged.
+    # Archived rows count only once their event is listed in ArchivedEvents, see _move_events
+    for table, columns in COLUMNS.items():
+        column_list = ", ".join(columns)
+        selects = [f"SELECT {column_list} FROM main.{table}"]
+        for term, schema in zip(terms, schemas):
+            if term == FOLDED:
+                archived = f"SELECT event_id FROM main.ArchivedEvents {folded}"
+            else:
+                archived = f"SELECT event_id FROM main.ArchivedEvents WHERE term = '{term}'"
+            if table == "Registrations":
+                where = f"event_id IN ({archived})"
+            else:
+                where = f"registration_id IN (SELECT registration_id FROM {schema}.Registrations WHERE event_id IN ({archived}))"
+            selects.append(f"SELECT {column_list} FROM {schema}.{table} WHERE {where}")
+        conn.execute(f"CREATE TEMP VIEW {table} AS {' UNION ALL '.join(selects)}")
+
+
+def archive_events(cutoff: str, dry_run: bool = False) -> Dict[str, List[int]]:
+    """Move the rows of events dated before the cutoff into their term archives.
+
+    Returns the archived event ids per term. Only the main database is
+    archived: with sharding enabled the rows live in the shards, so this refuses.
+    """
+    import sharding
+    if sharding.SHARDING_ENABLED:
+        raise RuntimeError("Archiving is not supported while sharding is enabled")
+    events = database.execute_query(
+        """
+        SELECT e.event_id, e.date FROM Events e
+        WHERE e.date < ?
+          AND e.event_id NOT IN (SELECT event_id FROM ArchivedEvents)
+        ORDER BY e.date
+        """,
+        (cutoff,)
+    )
+    by_term: Dict[str, List[int]] = {}
+    for event in events:
+        by_term.setdefault(term_for_date(event["date"]), []).append(event["event_id"])
+    if dry_run:
+        return by_term
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    for term, event_ids in by_term.items():
+        _move_events(term, event_ids)
+    fold_terms()
+    return by_term
+
+
+def _move_events(term: str, event_ids: List[int]):
+    """Copy one term's rows into its archive file, then delete them from the hot tables.
+
+    The main database uses write-ahead logging, where a transaction over two
+    files is not atomic as a whole, so the copy and the delete each commit on
+    their own file. Archived rows are only read once their event is listed in
+    ArchivedEvents, so a copy left by an interrupted move stays invisible and
+    is replaced by the next move.
+    """
+    with database.get_db_connection() as conn:
+        conn.execute("ATTACH DATABASE ? AS arc", (term_file(term),))
+        conn.executescript(ARCHIVE_SCHEMA.format(schema="arc"))
+        conn.execute("CREATE TEMP TABLE moving (event_id INTEGER PRIMARY KEY)")
+
+        registrations = "SELECT registration_id FROM main.Registrations WHERE event_id IN (SELECT event_id FROM moving)"
+        try:
+            conn.executemany("INSERT INTO moving VALUES (?)", [(event_id,) for event_id in event_ids])
+            conn.execute(
+                f"INSERT OR REPLACE INTO arc.Registrations SELECT {', '.join(COLUMNS['Registrations'])} "
+                f"FROM main.Registrations WHERE event_id IN (SELECT event_id FROM moving)"
+            )
+            for table in ("Attendance", "Feedback"):
+                conn.execute(
+                    f"INSERT OR REPLACE INTO arc.{table} SELECT {', '.join(COLUMNS[table])} "
+                    f"FROM main.{table} WHERE registration_id IN ({registrations})"
+                )
+            conn.commit()
+
+            for table in ("Attendance", "Feedback"):
+                conn.execute(f"DELETE FROM main.{table} WHERE registration_id IN ({registrations})")
+            conn.execute("DELETE FROM main.Registrations WHERE event_id IN (SELECT event_id FROM moving)")
+            conn.execute(
+                "INSERT INTO main.ArchivedEvents (event_id, term, archived_at) "
+                "SELECT event_id, ?, datetime('now') FROM moving",
+                (term,)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def _archived_rows(schema: str, table: str, events: str) -> str:
+    """Rows of an attached archive table belonging to the events selected by `events`"""
+    if table == "Registrations":
+        return f"SELECT {', '.join(COLUMNS[table])} FROM {schema}.{table} WHERE event_id IN ({events})"
+    return (
+        f"SELECT {', '.join(COLUMNS[table])} FROM {schema}.{table} WHERE registration_id IN "
+        f"(SELECT registration_id FROM {schema}.Registrations WHERE event_id IN ({events}))"
+    )
+
+
+def restore_term(term: str) -> int:
+    """Move a term's archived rows back into the hot tables and remove them from the archive.
+
+    A term with its own file has that file removed; a folded term has its
+    rows deleted from the folded file. Returns the number of restored events.
+    """
+    path = term_file(term)
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+
+    with database.get_db_connection() as conn:
+        conn.execute("ATTACH DATABASE ? AS arc", (path,))
+        conn.execute("CREATE TEMP TABLE restoring (event_id INTEGER PRIMARY KEY)")
+        try:
+            conn.execute("INSERT INTO restoring SELECT event_id FROM main.ArchivedEvents WHERE term = ?", (term,))
+            for table in ("Registrations", "Attendance", "Feedback"):
+                columns = ", ".join(COLUMNS[table])
+                conn.execute(
+                    f"INSERT INTO main.{table} ({columns}) {_archived_rows('arc', table, 'SELECT event_id FROM restoring')}"
+                )
+            restored = conn.execute("DELETE FROM main.ArchivedEvents WHERE term = ?", (term,)).rowcount
+            conn.commit()
+
+            if path != archive_path(term):
+                # Rows left behind by an interruption here are no longer listed in ArchivedEvents, so unread
+                for table in ("Attendance", "Feedback", "Registrations"):
+                    conn.execute(
+                        f"DELETE FROM arc.{table} WHERE {COLUMNS[table][0]} IN "
+                        f"(SELECT {COLUMNS[table][0]} FROM ({_archived_rows('arc', table, 'SELECT event_id FROM restoring')}))"
+                    )
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        conn.execute("DETACH DATABASE arc")
+
+    if path == archive_path(term):
+        os.remove(path)
+    return restored
+
+
+def fold_terms(limit: int = MAX_ATTACHED_ARCHIVES) -> List[str]:
+    """Fold the oldest term files into the FOLDED file until at most limit files remain.
+
+    Returns the folded terms.
+    """
+    folded = []
+    terms = list_terms()
+    while len(terms) > limit:
+        term = next(term for term in terms if term != FOLDED)
+        _fold_term(term)
+        folded.append(term)
+        terms = list_terms()
+    return folded
+
+
+def _fold_term(term: str):
+    """Copy one term's archived rows into the FOLDED file, then remove the term's file.
+
+    The folded file serves a term only once the term has no file of its own,
+    so the rows are read from exactly one file at every step.
+    """
+    path = archive_path(term)
+    with database.get_db_connection() as conn:
+        conn.execute("ATTACH DATABASE ? AS arc", (archive_path(FOLDED),))
+        conn.execute("ATTACH DATABASE ? AS src", (path,))
+        conn.executescript(ARCHIVE_SCHEMA.format(schema="arc"))
+        events = f"SELECT event_id FROM main.ArchivedEvents WHERE term = '{term}'"
+        try:
+            for table in ("Registrations", "Attendance", "Feedback"):
+                conn.execute(f"INSERT OR REPLACE INTO arc.{table} {_archived_rows('src', table, events)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        conn.execute("DETACH DATABASE src")
+    os.remove(path)
+
+
+def default_cutoff(days: Optional[int] = None) -> str:
+    """Cutoff date for events older than the given number of days"""
+    return (date.today() - timedelta(days=ARCHIVE_AFTER_DAYS if days is None else days)).isoformat()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive or restore past events")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    archive_cmd = commands.add_parser("archive", help="Move past events into term archives")
+    archive_cmd.add_argument("--cutoff", help="Archive events dated before this date (YYYY-MM-DD)")
+    archive_cmd.add_argument("--older-than-days", type=int, help=f"Archive events older than this (default {ARCHIVE_AFTER_DAYS})")
+    archive_cmd.add_argument("--dry-run", action="store_true", help="Only print what would be archived")
+
+    restore_cmd = commands.add_parser("restore", help="Move a term back into the hot database")
+    restore_cmd.add_argument("--term", required=True, help="Term to restore, e.g. 2025_fall")
+
+    commands.add_parser("fold", help=f"Fold the oldest terms into one file to keep {MAX_ATTACHED_ARCHIVES} files")
+    commands.add_parser("list", help="List archived terms")
+
+    args = parser.parse_args()
+    init_schema()
+
+    if args.command == "archive":
+        cutoff = args.cutoff or default_cutoff(args.older_than_days)
+        try:
+            archived = archive_events(cutoff, dry_run=args.dry_run)
+        except RuntimeError as e:
+            parser.error(str(e))
+        verb = "Would archive" if args.dry_run else "Archived"
+        for term, event_ids in archived.items():
+            print(f"{verb} {len(event_ids)} events into {term}: {event_ids}")
+        if not archived:
+            print(f"No events before {cutoff} to archive")
+    elif args.command == "restore":
+        print(f"Restored {restore_term(args.term)} events from {args.term}")
+    elif args.command == "fold":
+        folded = fold_terms()
+        print(f"Folded {', '.join(folded)} into {archive_path(FOLDED)}" if folded else "Nothing to fold")
+    else:
+        rows = database.execute_query("SELECT term, COUNT(*) as count FROM ArchivedEvents GROUP BY term")
+        for row in sorted(rows, key=lambda row: _term_key(row["term"])):
+            print(f"{row['term']}: {row['count']} events ({term_file(row['term'])})")
+
+
+if __name__ == "__main__":
+    main()
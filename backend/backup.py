@@ -0,0 +1,543 @@
+"""Online backups of the database files, taken while the API keeps serving.
+
+Each backup is a directory in BACKUP_DIR holding a copy of the main
+database, of every college shard and of every archived term, plus a
+manifest.json. Files are copied with SQLite's online backup API a few
+pages at a time (BACKUP_PAGES_PER_STEP), sleeping BACKUP_STEP_SLEEP_MS
+between steps, so a backup never holds a lock for long and leaves disk
+time to the requests.
+
+- In WAL mode (the main database and the shards) the copy holds one read
+  transaction: it is a consistent snapshot and writers are never blocked.
+- Otherwise (the archived terms, which are rarely written) a write by
+  another connection restarts the copy. After MAX_RESTARTS restarts the
+  copy backs off and tries again; after MAX_ATTEMPTS attempts the backup
+  fails rather than holding a lock for the whole copy.
+
+Backups are incremental at file level: a file unchanged since the previous
+backup (same size and modification time, WAL included) is hard-linked from
+it instead of copied, and a scheduled backup is skipped when no file
+changed. Each backup is complete on its own, so the oldest ones are simply
+deleted beyond BACKUP_RETENTION.
+
+Usage:
+    python backup.py create
+    python backup.py list
+    python backup.py verify <name>      # restore into a scratch directory and check it
+    python backup.py restore <name>     # stop the API first
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import database
+from archive import archive_path, list_terms
+from sharding import shard_ids, shard_path
+
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+
+# Seconds between scheduled backups; 0 disables the schedule
+BACKUP_INTERVAL_SECONDS = int(os.getenv("BACKUP_INTERVAL_SECONDS", "3600"))
+
+# Number of backups kept, newest first
+BACKUP_RETENTION = int(os.getenv("BACKUP_RETENTION", "24"))
+
+# Pages copied per step of the online backup, and the pause between steps
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+BACKUP_STEP_SLEEP_MS = float(os.getenv("BACKUP_STEP_SLEEP_MS", "5"))
+
+# Restarts of a stepped copy, caused by concurrent writes, before it backs off
+MAX_RESTARTS = 3
+
+# Attempts of a copy that keeps restarting before the backup fails; the pause doubles after each
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF_SECONDS = 1.0
+
+MANIFEST = "manifest.json"
+LOCK_FILE = ".lock"
+PARTIAL_PREFIX = ".partial-"
+
+TRIGGER_MANUAL = "manual"
+TRIGGER_SCHEDULED = "scheduled"
+
+
+class BackupBusy(Exception):
+    """Another backup is running, in this worker or another one"""
+
+
+class BackupFailed(Exception):
+    """A file kept changing under the copy"""
+
+
+class _Restarted(Exception):
+    pass
+
+
+class _Cancelled(Exception):
+    pass
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _sources() -> Dict[str, str]:
+    """Database files to back up: name inside the backup -> live path"""
+    sources = {"main.db": database.DATABASE_PATH}
+    for college_id in shard_ids():
+        sources[f"shards/{os.path.basename(shard_path(college_id))}"] = shard_path(college_id)
+    for term in list_terms():
+        sources[f"archives/{os.path.basename(archive_path(term))}"] = archive_path(term)
+    return sources
+
+
+def _fingerprint(path: str) -> List[int]:
+    """Size and modification time of a database file and its write-ahead log"""
+    stat = os.stat(path)
+    try:
+        wal = os.stat(path + "-wal")
+        return [stat.st_size, stat.st_mtime_ns, wal.st_size, wal.st_mtime_ns]
+    except FileNotFoundError:
+        return [stat.st_size, stat.st_mtime_ns, 0, 0]
+
+
+def _table_counts(conn: sqlite3.Connection) -> Dict[str, int]:
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )]
+    return {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+
+
+def copy_database(source_path: str, target_path: str, pages: int = BACKUP_PAGES_PER_STEP,
+                  sleep_ms: float = BACKUP_STEP_SLEEP_MS, progress=None,
+                  cancel: Optional[threading.Event] = None) -> Dict[str, Any]:
+    """Copy a live database with the online backup API, pausing between steps
+
+    progress(remaining, total) is called after every step. Returns the page
+    count, the number of restarts and how the copy was made: "snapshot" (WAL,
+    one read transaction), "stepped" or "single-step" (pages=-1). Raises
+    BackupFailed when concurrent writes keep restarting the copy.
+    """
+    source = sqlite3.connect(source_path, isolation_level=None)
+    target = sqlite3.connect(target_path)
+    try:
+        wal = source.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        if wal:
+            # Pin one version of the database: no restarts, and writers keep appending to the log
+            source.execute("BEGIN")
+            source.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone()
+
+        restarts = attempt_restarts = 0
+        last_remaining = None
+
+        def step(status, remaining, total):
+            nonlocal restarts, attempt_restarts, last_remaining
+            if cancel is not None and cancel.is_set():
+                raise _Cancelled()
+            if last_remaining is not None and remaining > last_remaining:
+                restarts += 1
+                attempt_restarts += 1
+                if attempt_restarts > MAX_RESTARTS:
+                    raise _Restarted()
+            last_remaining = remaining
+            if progress:
+                progress(remaining, total)
+            if sleep_ms:
+                time.sleep(sleep_ms / 1000)
+
+        mode = "snapshot" if wal else "stepped" if pages > 0 else "single-step"
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                source.backup(target, pages=pages, progress=step)
+                break
+            except _Restarted:
+                if attempt == MAX_ATTEMPTS:
+                    raise BackupFailed(f"{source_path} kept changing: {restarts} restarts in {attempt} attempts")
+                # Let the writes settle; cancellable, unlike a copy that holds the lock throughout
+                delay = RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+                if cancel is not None and cancel.wait(delay):
+                    raise _Cancelled()
+                if cancel is None:
+                    time.sleep(delay)
+                attempt_restarts, last_remaining = 0, None
+        if wal:
+            source.execute("COMMIT")
+        return {
+            "pages": target.execute("PRAGMA page_count").fetchone()[0],
+            "restarts": restarts,
+            "attempts": attempt,
+            "mode": mode,
+        }
+    finally:
+        target.close()
+        source.close()
+
+
+def _acquire_lock():
+    """Claim BACKUP_DIR for one backup; a lock left by a dead process is taken over"""
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    path = os.path.join(BACKUP_DIR, LOCK_FILE)
+    for _ in range(2):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                with open(path) as f:
+                    pid = int(f.read() or 0)
+                os.kill(pid, 0)
+            except (OSError, ValueError):
+                try:
+                    os.remove(path)  # Stale
+                except FileNotFoundError:
+                    pass
+                continue
+            raise BackupBusy(f"A backup is already running (pid {pid})")
+        with os.fdopen(fd, "w") as f:
+            f.write(str(os.getpid()))
+        return
+    raise BackupBusy("A backup is already running")
+
+
+def _release_lock():
+    try:
+        os.remove(os.path.join(BACKUP_DIR, LOCK_FILE))
+    except FileNotFoundError:
+        pass
+
+
+def _read_manifest(name: str) -> Dict[str, Any]:
+    with open(os.path.join(BACKUP_DIR, name, MANIFEST)) as f:
+        return json.load(f)
+
+
+def _write_manifest(directory: str, manifest: Dict[str, Any]):
+    path = os.path.join(directory, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def list_backups() -> List[str]:
+    """Names of the complete backups, oldest first"""
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    return sorted(name for name in os.listdir(BACKUP_DIR)
+                  if not name.startswith(".") and os.path.exists(os.path.join(BACKUP_DIR, name, MANIFEST)))
+
+
+def get_backup(name: str) -> Optional[Dict[str, Any]]:
+    """Manifest of a backup, None if there is no such backup"""
+    if name not in list_backups():
+        return None
+    return _read_manifest(name)
+
+
+def _new_name() -> str:
+    name = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    existing = set(list_backups())
+    suffix = 1
+    candidate = name
+    while candidate in existing:
+        suffix += 1
+        candidate = f"{name}-{suffix}"
+    return candidate
+
+
+def prune(retention: int = BACKUP_RETENTION) -> List[str]:
+    """Delete the oldest backups beyond the retention; returns their names"""
+    names = list_backups()
+    removed = names[:max(len(names) - retention, 0)]
+    for name in removed:
+        shutil.rmtree(os.path.join(BACKUP_DIR, name), ignore_errors=True)
+    return removed
+
+
+def create_backup(trigger: str = TRIGGER_MANUAL, skip_unchanged: bool = False, progress=None,
+                  cancel: Optional[threading.Event] = None) -> Optional[Dict[str, Any]]:
+    """Back up every database file; returns the manifest, or None when skipped as unchanged
+
+    progress(file, remaining, total) is called after every step of a copy.
+    Raises BackupBusy when another backup is running.
+    """
+    _acquire_lock()
+    try:
+        for name in os.listdir(BACKUP_DIR):
+            if name.startswith(PARTIAL_PREFIX):
+                shutil.rmtree(os.path.join(BACKUP_DIR, name), ignore_errors=True)
+
+        previous_names = list_backups()
+        previous = _read_manifest(previous_names[-1]) if previous_names else None
+        previous_files = previous["files"] if previous else {}
+        sources = _sources()
+        fingerprints = {name: _fingerprint(path) for name, path in sources.items()}
+        unchanged = {name for name in sources
+                     if name in previous_files and previous_files[name]["fingerprint"] == fingerprints[name]}
+        if skip_unchanged and previous and unchanged == set(sources) == set(previous_files):
+            return None
+
+        name = _new_name()
+        directory = os.path.join(BACKUP_DIR, PARTIAL_PREFIX + name)
+        os.makedirs(directory)
+        started = time.perf_counter()
+        manifest: Dict[str, Any] = {
+            "name": name, "created_at": _now(), "trigger": trigger,
+            "base": previous["name"] if previous else None, "files": {},
+        }
+        try:
+            for file_name, source_path in sources.items():
+                target_path = os.path.join(directory, file_name)
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                file_started = time.perf_counter()
+                if file_name in unchanged:
+                    linked = os.path.join(BACKUP_DIR, previous["name"], file_name)
+                    try:
+                        os.link(linked, target_path)
+                    except OSError:
+                        shutil.copy2(linked, target_path)
+                    entry = {**previous_files[file_name], "linked": True}
+                else:
+                    def report(remaining, total, file_name=file_name):
+                        if progress:
+                            progress(file_name, remaining, total)
+
+                    copied = copy_database(source_path, target_path, progress=report, cancel=cancel)
+                    conn = sqlite3.connect(target_path)
+                    try:
+                        tables = _table_counts(conn)
+                    finally:
+                        conn.close()
+                    entry = {**copied, "fingerprint": fingerprints[file_name], "tables": tables, "linked": False}
+                entry.update(source=source_path, bytes=os.path.getsize(target_path),
+                             duration_ms=round((time.perf_counter() - file_started) * 1000, 1))
+                manifest["files"][file_name] = entry
+            manifest["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            manifest["bytes"] = sum(entry["bytes"] for entry in manifest["files"].values())
+            manifest["bytes_copied"] = sum(entry["bytes"] for entry in manifest["files"].values()
+                                           if not entry["linked"])
+            _write_manifest(directory, manifest)
+            os.rename(directory, os.path.join(BACKUP_DIR, name))
+        except BaseException:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        manifest["pruned"] = prune()
+        return manifest
+    finally:
+        _release_lock()
+
+
+def verify_backup(name: str) -> Dict[str, Any]:
+    """Restore a backup into a scratch directory and check every file
+
+    A file passes when PRAGMA integrity_check reports ok and every table has
+    the row count recorded when it was backed up. The result is stored in
+    the manifest. Raises KeyError for an unknown backup.
+    """
+    manifest = get_backup(name)
+    if manifest is None:
+        raise KeyError(name)
+    started = time.perf_counter()
+    scratch = tempfile.mkdtemp(prefix=".verify-", dir=BACKUP_DIR)
+    files = {}
+    try:
+        for file_name, entry in manifest["files"].items():
+            restored = os.path.join(scratch, file_name.replace("/", "_"))
+            copy_database(os.path.join(BACKUP_DIR, name, file_name), restored, pages=-1, sleep_ms=0)
+            conn = sqlite3.connect(restored)
+            try:
+                integrity = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+                tables = _table_counts(conn)
+            finally:
+                conn.close()
+            mismatches = {
+                table: {"expected": expected, "found": tables.get(table)}
+                for table, expected in entry["tables"].items() if tables.get(table) != expected
+            }
+            files[file_name] = {
+                "ok": integrity == ["ok"] and not mismatches,
+                "integrity": integrity[:10],
+                "tables": len(tables),
+                "mismatches": mismatches,
+            }
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    result = {
+        "ok": all(file["ok"] for file in files.values()),
+        "verified_at": _now(),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        "files": files,
+    }
+    manifest["verification"] = result
+    _write_manifest(os.path.join(BACKUP_DIR, name), manifest)
+    return result
+
+
+def restore_backup(name: str) -> Dict[str, str]:
+    """Copy a backup over the live database files; the API must not be running
+
+    Returns backup file -> restored path. Raises KeyError for an unknown backup.
+    """
+    manifest = get_backup(name)
+    if manifest is None:
+        raise KeyError(name)
+    restored = {}
+    for file_name, entry in manifest["files"].items():
+        target = entry["source"]
+        if os.path.dirname(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+        copy_database(os.path.join(BACKUP_DIR, name, file_name), target, pages=-1, sleep_ms=0)
+        restored[file_name] = target
+    return restored
+
+
+class BackupScheduler:
+    """Takes scheduled backups in a background thread and runs the ones triggered by the API"""
+
+    def __init__(self, interval: int = BACKUP_INTERVAL_SECONDS):
+        self.interval = interval
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._running: Optional[Dict[str, Any]] = None
+        self._last: Optional[Dict[str, Any]] = None
+
+    def start(self):
+        """Start the schedule; no-op when it is disabled or already running"""
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="backup-scheduler", daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        """Stop the schedule and cancel a backup in progress"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _due_in(self) -> float:
+        """Seconds until the next scheduled backup, counted from the newest one of any worker"""
+        names = list_backups()
+        if not names:
+            return self.interval
+        created = datetime.fromisoformat(_read_manifest(names[-1])["created_at"]).timestamp()
+        return max(created + self.interval - time.time(), 0)
+
+    def _loop(self):
+        while not self._stop.wait(self._due_in()):
+            try:
+                self._claim(TRIGGER_SCHEDULED)
+                manifest = self._execute(TRIGGER_SCHEDULED, skip_unchanged=True)
+            except Exception:
+                manifest = None  # Running elsewhere, or failed and recorded in status()
+            # Nothing new to count the next one from: wait a whole interval
+            if manifest is None and self._stop.wait(self.interval):
+                return
+
+    def _progress(self, file_name: str, remaining: int, total: int):
+        self._running.update(file=file_name, remaining_pages=remaining, total_pages=total)
+
+    def _claim(self, trigger: str):
+        with self._lock:
+            if self._running is not None:
+                raise BackupBusy("A backup is already running")
+            self._running = {"trigger": trigger, "started_at": _now()}
+
+    def _execute(self, trigger: str, skip_unchanged: bool = False) -> Optional[Dict[str, Any]]:
+        last: Dict[str, Any] = {"trigger": trigger}
+        try:
+            manifest = create_backup(trigger, skip_unchanged, progress=self._progress, cancel=self._stop)
+            if manifest is None:
+                last["skipped"] = True
+            else:
+                last.update(name=manifest["name"], duration_ms=manifest["duration_ms"],
+                            bytes_copied=manifest["bytes_copied"])
+            return manifest
+        except _Cancelled:
+            last["error"] = "Cancelled at shutdown"
+            raise
+        except Exception as e:
+            last["error"] = str(e)
+            raise
+        finally:
+            last["finished_at"] = _now()
+            with self._lock:
+                self._running = None
+                self._last = last
+
+    def trigger(self) -> Dict[str, Any]:
+        """Start a backup in the background now; raises BackupBusy when one is running"""
+        self._claim(TRIGGER_MANUAL)
+
+        def run():
+            try:
+                self._execute(TRIGGER_MANUAL)
+            except Exception:
+                pass  # Recorded in status()
+
+        threading.Thread(target=run, name="backup-manual", daemon=True).start()
+        return self.status()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "interval_seconds": self.interval,
+            "retention": BACKUP_RETENTION,
+            "pages_per_step": BACKUP_PAGES_PER_STEP,
+            "step_sleep_ms": BACKUP_STEP_SLEEP_MS,
+            "scheduled": self._thread is not None,
+            "running": dict(self._running) if self._running else None,
+            "last": self._last,
+        }
+
+
+scheduler = BackupScheduler()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Online backups of the database files")
+    parser.add_argument("command", choices=["create", "list", "verify", "restore"])
+    parser.add_argument("name", nargs="?", help="Backup to verify or restore")
+    args = parser.parse_args()
+
+    if args.command == "create":
+        manifest = create_backup()
+        print(f"Backup {manifest['name']}: {len(manifest['files'])} files, {manifest['bytes_copied']} bytes copied "
+              f"in {manifest['duration_ms']:.0f} ms")
+        for name in manifest["pruned"]:
+            print(f"Removed {name}")
+    elif args.command == "list":
+        for name in list_backups():
+            manifest = _read_manifest(name)
+            verification = manifest.get("verification")
+            verified = "unverified" if verification is None else ("verified" if verification["ok"] else "FAILED")
+            print(f"{name}  {manifest['trigger']:<9}  {len(manifest['files'])} files  {manifest['bytes']} bytes  {verified}")
+    else:
+        if not args.name:
+            parser.error(f"{args.command} needs the name of a backup")
+        try:
+            if args.command == "verify":
+                result = verify_backup(args.name)
+                for file_name, file in result["files"].items():
+                    print(f"{file_name}: {'ok' if file['ok'] else 'FAILED'}, {file['tables']} tables"
+                          + ("" if file["ok"] else f", integrity {file['integrity']}, mismatches {file['mismatches']}"))
+                print("Backup verified" if result["ok"] else "Verification FAILED")
+                if not result["ok"]:
+                    raise SystemExit(1)
+            else:
+                for file_name, target in restore_backup(args.name).items():
+                    print(f"{file_name} -> {target}")
+        except KeyError:
+            parser.error(f"No backup named {args.name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Hot-path query latency as history grows, with and without archiving.
+
+Each round adds a term (26 weekly events) of history plus one current event,
+then times the hot-path queries before and after archiving the past terms.
+With archiving the hot tables only ever hold the current events, so the
+timings stay flat while the unarchived ones grow with history.
+
+    python benchmarks/bench_archive.py
+"""
+import os
+import shutil
+import tempfile
+from datetime import date
+
+from common import create_schema, populate, use_database, measure
+
+import archive
+import database
+from routes.reports import compute_event_popularity
+
+TERMS = (1, 2, 4, 8)
+
+
+def run():
+    workdir = tempfile.mkdtemp(prefix="bench_archive_")
+    archive.ARCHIVE_DIR = os.path.join(workdir, "archives")
+    try:
+        print(f"{'terms':>5} {'mode':>10} {'hot regs':>9} {'count p50':>10} {'report p50':>11}")
+        for terms in TERMS:
+            for mode in ("unarchived", "archived"):
+                path = os.path.join(workdir, f"{terms}_{mode}.db")
+                shutil.rmtree(archive.ARCHIVE_DIR, ignore_errors=True)
+                create_schema(path)
+                use_database(path)
+                populate(path, students=2000, events=26 * terms, registrations_per_event=200,
+                         first_date=date(2020, 1, 6), days_between_events=7)
+                populate(path, students=2000, events=1, registrations_per_event=200,
+                         first_date=date(2100, 1, 1))
+                database.init_schema()
+                archive.init_schema()
+                current_event = database.get_single_record("SELECT MAX(event_id) as id FROM Events")["id"]
+
+                if mode == "archived":
+                    archive.archive_events("2099-01-01")
+
+                hot_rows = database.get_single_record("SELECT COUNT(*) as c FROM Registrations")["c"]
+                count = measure(lambda: database.get_registration_count_for_event(current_event), repeat=200)
+                report = measure(compute_event_popularity, repeat=10)
+                print(f"{terms:>5} {mode:>10} {hot_rows:>9} {count['p50_ms']:>10} {report['p50_ms']:>11}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,147 @@
+"""Request latency while a multi-GB database is being backed up.
+
+Reader threads look up events and count their registrations, as GET
+/events/{id} and the reports do, while a writer registers a student every
+WRITE_INTERVAL_MS. Latency is measured with no backup running, during a
+backup copied in a single step (pages=-1, the read lock held throughout)
+and during the stepped backup backup.py takes (BACKUP_PAGES_PER_STEP pages,
+BACKUP_STEP_SLEEP_MS between steps). "restarts" counts the stepped copies
+restarted by the writer: in rollback-journal mode they keep restarting
+until the backup gives up ("failed"), which is why the main database runs
+in WAL mode. The database is padded with long event descriptions up
+to DATABASE_GB; it was just written, so most of it is in the page cache.
+
+    python benchmarks/bench_backup.py
+"""
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from common import create_schema, populate, use_database
+
+import backup
+import changes
+import database
+
+DATABASE_GB = 2
+READERS = 4
+WRITE_INTERVAL_MS = 50
+IDLE_SECONDS = 5
+PADDING_BYTES = 4000
+
+
+def pad(path: str, gigabytes: float):
+    """Add events with long descriptions until the file reaches the given size"""
+    conn = sqlite3.connect(path)
+    while os.path.getsize(path) < gigabytes * 1024 ** 3:
+        conn.execute(f"""
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 50000)
+        INSERT INTO Events (name, type, date, capacity, description, college_id, created_by)
+        SELECT 'Padding ' || i, 'Seminar', '2024-01-01', 100, hex(randomblob({PADDING_BYTES // 2})), 1, 'benchmark'
+        FROM n
+        """)
+        conn.commit()
+    conn.close()
+
+
+def load(event_ids, stop: threading.Event):
+    """Run readers and a writer until stop is set; returns read latencies (ms) and failed writes"""
+    latencies, failed = [], []
+
+    def reader(seed: int):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            event_id = rng.choice(event_ids)
+            started = time.perf_counter()
+            database.get_event_by_id(event_id)
+            database.get_single_record(
+                "SELECT COUNT(*) AS n FROM Registrations WHERE event_id = ? AND status = 'Registered'", (event_id,)
+            )
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    def writer():
+        rng = random.Random(0)
+        while not stop.wait(WRITE_INTERVAL_MS / 1000):
+            try:
+                database.execute_insert(
+                    "INSERT INTO Registrations (student_id, event_id, status, timestamp) "
+                    "VALUES (?, ?, 'Registered', datetime('now'))",
+                    (rng.randint(1, 1000), rng.choice(event_ids))
+                )
+            except sqlite3.IntegrityError:
+                pass  # Already registered
+            except sqlite3.OperationalError:
+                failed.append(1)  # Timed out waiting for the write lock
+
+    threads = [threading.Thread(target=reader, args=(seed,)) for seed in range(READERS)]
+    threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    return threads, latencies, failed
+
+
+def percentile(samples, fraction: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] if samples else 0.0
+
+
+def phase(event_ids, target: str = None, pages: int = None, sleep_ms: float = None) -> dict:
+    """Latency under load, during a backup into target or for IDLE_SECONDS without one"""
+    stop = threading.Event()
+    threads, latencies, failed = load(event_ids, stop)
+    started = time.perf_counter()
+    copied = {"mode": "-", "restarts": 0}
+    if target:
+        try:
+            copied = backup.copy_database(database.DATABASE_PATH, target, pages=pages, sleep_ms=sleep_ms)
+        except backup.BackupFailed:
+            copied = {"mode": "failed", "restarts": backup.MAX_ATTEMPTS * (backup.MAX_RESTARTS + 1)}
+    else:
+        time.sleep(IDLE_SECONDS)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return {**copied, "seconds": elapsed, "reads": len(latencies), "p50": percentile(latencies, 0.5),
+            "p99": percentile(latencies, 0.99), "max": max(latencies, default=0.0), "failed": len(failed)}
+
+
+def run():
+    workdir = tempfile.mkdtemp(prefix="bench_backup_")
+    try:
+        path = os.path.join(workdir, "campus.db")
+        create_schema(path)
+        populate(path, colleges=8, students=1000, events=200, registrations_per_event=50)
+        use_database(path)
+        database.init_schema()  # Switches to WAL; each round below sets its journal mode
+        changes.init_schema()
+        event_ids = [row["event_id"] for row in database.execute_query("SELECT event_id FROM Events")]
+        started = time.perf_counter()
+        pad(path, DATABASE_GB)
+        print(f"Database: {os.path.getsize(path) / 1024 ** 3:.2f} GB, padded in {time.perf_counter() - started:.0f} s")
+
+        print(f"{'journal':>7} {'backup':>12} {'mode':>11} {'restarts':>8} {'seconds':>8} {'reads':>7} "
+              f"{'p50 ms':>7} {'p99 ms':>7} {'max ms':>7} {'failed writes':>13}")
+        for journal in ("delete", "wal"):
+            conn = sqlite3.connect(path)
+            conn.execute(f"PRAGMA journal_mode={journal}")
+            conn.close()
+            for label, pages, sleep_ms in (("none", None, None), ("single step", -1, 0),
+                                           ("stepped", backup.BACKUP_PAGES_PER_STEP, backup.BACKUP_STEP_SLEEP_MS)):
+                target = None if pages is None else os.path.join(workdir, f"backup_{journal}_{pages}.db")
+                result = phase(event_ids, target, pages, sleep_ms)
+                if target and os.path.exists(target):
+                    os.remove(target)
+                print(f"{journal:>7} {label:>12} {result['mode']:>11} {result['restarts']:>8} "
+                      f"{result['seconds']:>8.1f} {result['reads']:>7} {result['p50']:>7.2f} {result['p99']:>7.2f} "
+                      f"{result['max']:>7.1f} {result['failed']:>13}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run()
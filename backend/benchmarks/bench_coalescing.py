@@ -0,0 +1,101 @@
+"""Database load during a thundering herd, with and without read coalescing.
+
+HERD requests for the same event arrive at once: GET /events/{id},
+GET /attendance/event/{id} and GET /reports/event-popularity, in equal
+numbers. The route functions are called from THREADS threads, as the
+server's thread pool runs them. "queries" counts the statements that
+reached SQLite; with coalescing on, identical reads that overlap share
+one execution. "query s" is the time spent running them, summed over
+the threads.
+
+    python benchmarks/bench_coalescing.py
+"""
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import create_schema, populate, use_database
+
+import database
+from coalescing import flight
+from routes.attendance import get_event_attendance_report
+from routes.events import get_event
+from routes.reports import get_event_popularity_report
+
+HERDS = (50, 200, 1000)
+THREADS = 40  # Default size of the thread pool running def routes
+ROUNDS = 3
+
+
+def requests(event_id: int):
+    return [
+        lambda: get_event(event_id),
+        lambda: get_event_attendance_report(event_id, False),
+        lambda: get_event_popularity_report(None, None, None, False, False),
+    ]
+
+
+def herd(size: int, event_id: int) -> dict:
+    """Send size requests at once; returns queries executed and request latencies"""
+    calls = requests(event_id)
+    latencies = []
+    gate = threading.Event()
+
+    def request(i: int):
+        gate.wait()
+        started = time.perf_counter()
+        calls[i % len(calls)]()
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    flight.reset()
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        futures = [pool.submit(request, i) for i in range(size)]
+        started = time.perf_counter()
+        gate.set()
+        for future in futures:
+            future.result()
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    stats = flight.stats()
+    return {
+        "queries": stats["executed"],
+        "coalesced": stats["coalesced"],
+        "query_seconds": stats["execute_seconds"],
+        "seconds": elapsed,
+        "p50": statistics.median(latencies),
+        "p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+    }
+
+
+def run():
+    workdir = tempfile.mkdtemp(prefix="bench_coalescing_")
+    try:
+        path = os.path.join(workdir, "campus.db")
+        create_schema(path)
+        populate(path, colleges=8, students=5000, events=400, registrations_per_event=200)
+        use_database(path)
+        database.init_schema()
+        event_id = database.execute_query("SELECT MAX(event_id) AS id FROM Events")[0]["id"]
+
+        print(f"{'herd':>5} {'coalescing':>10} {'queries':>8} {'per request':>11} {'coalesced':>9} "
+              f"{'query s':>8} {'seconds':>8} {'p50 ms':>7} {'p99 ms':>7}")
+        for size in HERDS:
+            for enabled in (False, True):
+                flight.enabled = enabled
+                results = [herd(size, event_id) for _ in range(ROUNDS)]
+                result = min(results, key=lambda r: r["seconds"])
+                print(f"{size:>5} {'on' if enabled else 'off':>10} {result['queries']:>8} "
+                      f"{result['queries'] / size:>11.2f} {result['coalesced']:>9} "
+                      f"{result['query_seconds']:>8.2f} {result['seconds']:>8.2f} "
+                      f"{result['p50']:>7.1f} {result['p99']:>7.1f}")
+        flight.enabled = True
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run()
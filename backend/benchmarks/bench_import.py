@@ -0,0 +1,61 @@
+"""Rows/sec of the bulk student import against the one-request-per-student path.
+
+    python benchmarks/bench_import.py [rows]
+"""
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from common import create_schema, populate, use_database
+
+import database
+from database import check_record_exists, execute_insert
+from importer import import_students
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+PER_ROW_SAMPLE = 500
+
+
+def make_csv(rows: int, prefix: str) -> bytes:
+    lines = ["name,email,college_id"]
+    lines += [f"Student {i},{prefix}{i}@example.edu,{i % 5 + 1}" for i in range(rows)]
+    # A few duplicates and invalid rows, as in a real roster export
+    lines += [f"Dup {i},{prefix}{i}@example.edu,1" for i in range(0, rows, 1000)]
+    lines += ["Broken,not-an-email,1", "Nobody,nobody@example.edu,999"]
+    return "\n".join(lines).encode()
+
+
+def per_row(rows: int, prefix: str) -> float:
+    """The previous path: two existence checks and one insert per student"""
+    started = time.perf_counter()
+    for i in range(rows):
+        email = f"{prefix}{i}@example.edu"
+        if check_record_exists("Colleges", "College_id", i % 5 + 1) and not check_record_exists("Students", "email", email):
+            execute_insert("INSERT INTO Students (name, email, college_id) VALUES (?, ?, ?)",
+                           (f"Student {i}", email, i % 5 + 1))
+    return rows / (time.perf_counter() - started)
+
+
+def run():
+    workdir = tempfile.mkdtemp(prefix="bench_import_")
+    try:
+        path = os.path.join(workdir, "import.db")
+        create_schema(path)
+        populate(path, students=10000, events=0)
+        use_database(path)
+        database.init_schema()
+
+        summary = import_students(io.BytesIO(make_csv(ROWS, "bulk")))
+        print(f"bulk import:  {summary['total_rows']} rows, {summary['inserted']} inserted, "
+              f"{summary['duplicates']} duplicates, {summary['failed']} failed "
+              f"in {summary['elapsed_seconds']}s -> {summary['rows_per_second']} rows/sec")
+        print(f"per-row path: {PER_ROW_SAMPLE} rows -> {per_row(PER_ROW_SAMPLE, 'single'):.1f} rows/sec")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,57 @@
+"""Payload size and latency of the event registration list per response mode.
+
+One event with many registrations, as at a campus fest: the default rows
+repeat the full event (description included) and join three tables; a
+narrow ?fields= list skips the joins; normalised mode returns the event
+and each student once.
+
+    python benchmarks/bench_projection.py
+"""
+import json
+import os
+import shutil
+import tempfile
+
+from common import create_schema, populate, use_database, measure
+
+import database
+from routes.registrations import EVENT_REGISTRATIONS
+
+REGISTRATIONS = (1000, 10000)
+
+MODES = (
+    ("default", None, None, False),
+    ("fields=status,student.name", "status,student.name", None, False),
+    ("expand=", None, "", False),
+    ("normalized", None, None, True),
+)
+
+
+def run():
+    workdir = tempfile.mkdtemp(prefix="bench_projection_")
+    try:
+        print(f"{'regs':>6} {'mode':>28} {'payload KB':>11} {'p50 ms':>8}")
+        for count in REGISTRATIONS:
+            path = os.path.join(workdir, f"{count}.db")
+            create_schema(path)
+            populate(path, students=count, events=1, registrations_per_event=count)
+            use_database(path)
+            database.init_schema()
+            event_id = database.get_single_record("SELECT MAX(event_id) as id FROM Events")["id"]
+            for name, fields, expand, normalized in MODES:
+                selected = EVENT_REGISTRATIONS.select(fields, expand)
+
+                def fetch():
+                    return json.dumps(EVENT_REGISTRATIONS.fetch(
+                        selected, "r.event_id = ?", (event_id,), "r.timestamp ASC", normalized
+                    ))
+
+                size_kb = len(fetch()) / 1024
+                timing = measure(fetch, repeat=20)
+                print(f"{count:>6} {name:>28} {size_kb:>11.0f} {timing['p50_ms']:>8}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run()
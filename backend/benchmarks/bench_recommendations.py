@@ -0,0 +1,112 @@
+"""Co-attendance matrix build time, memory and recommendation latency.
+
+Students mostly attend events of their own college, as on the real
+campuses, so the matrix stays sparse: about ten events per student,
+nine in ten of them at the home college. Memory is what the built
+matrix retains, measured with tracemalloc on a second build.
+
+    python benchmarks/bench_recommendations.py
+"""
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+from common import create_schema, use_database, measure
+
+import database
+import recommendations
+from recommendations import CoAttendanceMatrix, recommend_events
+
+ATTENDANCE_ROWS = (100_000, 1_000_000)
+COLLEGES = 8
+EVENTS_PER_COLLEGE = 250
+REGISTRATIONS_PER_STUDENT = 12.5
+ATTENDANCE_RATE = 0.8
+HOME_COLLEGE_RATE = 0.9
+
+
+def populate_clustered(path: str, attendance_rows: int, seed: int = 42) -> int:
+    """Fill a database with about attendance_rows attended registrations; returns the number of students"""
+    rng = random.Random(seed)
+    students = int(attendance_rows / (REGISTRATIONS_PER_STUDENT * ATTENDANCE_RATE))
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO Colleges (College_id, name, location) VALUES (?, ?, 'Bengaluru')",
+                     [(college, f"College {college}") for college in range(1, COLLEGES + 1)])
+    events_by_college = {college: [] for college in range(1, COLLEGES + 1)}
+    events = []
+    for event_id in range(1, COLLEGES * EVENTS_PER_COLLEGE + 1):
+        college = (event_id - 1) % COLLEGES + 1
+        events_by_college[college].append(event_id)
+        events.append((event_id, f"Event {event_id}", rng.choice(["Workshop", "Seminar", "Fest", "Hackathon"]),
+                       f"2025-{(event_id % 12) + 1:02d}-{(event_id % 28) + 1:02d}", 500, college))
+    conn.executemany("INSERT INTO Events (event_id, name, type, date, capacity, college_id, created_by) "
+                     "VALUES (?, ?, ?, ?, ?, ?, 'benchmark')", events)
+    all_events = [event[0] for event in events]
+
+    registrations, attendance = [], []
+    for student_id in range(1, students + 1):
+        college = rng.randint(1, COLLEGES)
+        count = int(REGISTRATIONS_PER_STUDENT) + (rng.random() < REGISTRATIONS_PER_STUDENT % 1)
+        chosen = set()
+        while len(chosen) < count:
+            pool = events_by_college[college] if rng.random() < HOME_COLLEGE_RATE else all_events
+            chosen.add(rng.choice(pool))
+        for event_id in chosen:
+            registrations.append((len(registrations) + 1, student_id, event_id))
+            if rng.random() < ATTENDANCE_RATE:
+                attendance.append((len(registrations),))
+    conn.executemany("INSERT INTO Students (student_id, name, email, college_id) VALUES (?, ?, ?, ?)",
+                     [(s, f"Student {s}", f"student{s}@example.edu", rng.randint(1, COLLEGES))
+                      for s in range(1, students + 1)])
+    conn.executemany("INSERT INTO Registrations (registration_id, student_id, event_id, status, timestamp) "
+                     "VALUES (?, ?, ?, 'Registered', '2025-01-01 09:00')", registrations)
+    conn.executemany("INSERT INTO Attendance (registration_id, attended, timestamp) "
+                     "VALUES (?, 1, '2025-01-01 10:00')", attendance)
+    conn.commit()
+    conn.close()
+    return students
+
+
+def run():
+    workdir = tempfile.mkdtemp(prefix="bench_recommendations_")
+    try:
+        print(f"{'attendance':>10} {'pairs':>9} {'build s':>8} {'memory MB':>10} "
+              f"{'matrix p50':>11} {'endpoint p50':>13} {'add p50':>8}")
+        for rows in ATTENDANCE_ROWS:
+            path = os.path.join(workdir, f"{rows}.db")
+            create_schema(path)
+            students = populate_clustered(path, rows)
+            use_database(path)
+            database.init_schema()
+
+            matrix = CoAttendanceMatrix()
+            started = time.perf_counter()
+            matrix.build()
+            build_seconds = time.perf_counter() - started
+
+            tracemalloc.start()
+            measured = CoAttendanceMatrix()
+            measured.build()
+            memory_mb = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+            tracemalloc.stop()
+            del measured
+
+            rng = random.Random(7)
+            in_matrix = measure(lambda: matrix.recommend(rng.randint(1, students), 10, set()), repeat=200)
+            # Through the same path as the endpoint: registrations lookup, matrix, event details
+            recommendations.matrix = matrix
+            endpoint = measure(lambda: recommend_events(rng.randint(1, students), 10), repeat=200)
+            add = measure(lambda: matrix.add_attendance(rng.randint(1, students),
+                                                        rng.randint(1, COLLEGES * EVENTS_PER_COLLEGE)), repeat=1000)
+            print(f"{rows:>10} {matrix.stats()['pairs']:>9} {build_seconds:>8.1f} {memory_mb:>10.0f} "
+                  f"{in_matrix['p50_ms']:>11} {endpoint['p50_ms']:>13} {add['p50_ms']:>8}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,49 @@
+"""Clash check and schedule window latency for students with many registrations.
+
+    python benchmarks/bench_schedule.py
+"""
+import os
+import random
+import shutil
+import tempfile
+from datetime import date
+
+from common import create_schema, populate, use_database, measure
+
+import database
+import schedule
+
+REGISTRATIONS = (10, 100, 500, 1000)
+
+
+def run():
+    workdir = tempfile.mkdtemp(prefix="bench_schedule_")
+    try:
+        print(f"{'regs':>5} {'interval list p50':>18} {'linear scan p50':>16} {'schedule week p50':>18}")
+        for count in REGISTRATIONS:
+            path = os.path.join(workdir, f"{count}.db")
+            create_schema(path)
+            # A single student registered for every event, one event a day
+            populate(path, students=1, events=count, registrations_per_event=1,
+                     first_date=date(2024, 1, 1), days_between_events=1)
+            use_database(path)
+            database.init_schema()
+            schedule.init_schema()
+
+            rows = database.execute_query("SELECT event_id, starts_at, ends_at FROM EventSchedule")
+            intervals = schedule.IntervalList([(r["starts_at"], r["ends_at"], r["event_id"]) for r in rows])
+            probes = [(start + 3600, start + 7200) for start in random.choices([r["starts_at"] for r in rows], k=20)]
+
+            indexed = measure(lambda: [intervals.overlapping(s, e) for s, e in probes], repeat=100)
+            linear = measure(lambda: [[r["event_id"] for r in rows if r["starts_at"] < e and r["ends_at"] > s]
+                                      for s, e in probes], repeat=100)
+            week_start = schedule.parse_time("2024-03-01")
+            window = measure(lambda: schedule.get_student_schedule(1, week_start, week_start + 7 * 86400), repeat=100)
+            print(f"{count:>5} {indexed['p50_ms'] / len(probes):>18.4f} {linear['p50_ms'] / len(probes):>16.4f} "
+                  f"{window['p50_ms']:>18}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run()
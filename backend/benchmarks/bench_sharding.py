@@ -0,0 +1,82 @@
+"""Registration write throughput as the number of college shards grows.
+
+Eight writer threads register students for random events spread over all
+colleges, one transaction per registration as the API does. Unsharded,
+every commit queues on the single database file's writer lock; sharded,
+writers for different colleges commit to different files in parallel.
+
+    python benchmarks/bench_sharding.py
+"""
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from common import create_schema, populate, use_database
+
+import database
+import sharding
+
+SHARD_COUNTS = (1, 2, 4, 8)
+WRITERS = 8
+WRITES_PER_WRITER = 100
+
+
+def write_load(event_ids) -> tuple:
+    """Registrations per second achieved by the writer threads, and writes that timed out on a lock"""
+    failed = []
+
+    def writer(seed: int):
+        rng = random.Random(seed)
+        for _ in range(WRITES_PER_WRITER):
+            event_id = rng.choice(event_ids)
+            try:
+                database.execute_insert(
+                    "INSERT INTO Registrations (student_id, event_id, status, timestamp) "
+                    "VALUES (?, ?, 'Registered', datetime('now'))",
+                    (rng.randint(1, 1000), event_id), sharding.shard_for_event(event_id)
+                )
+            except sqlite3.OperationalError:
+                failed.append(event_id)
+
+    threads = [threading.Thread(target=writer, args=(seed,)) for seed in range(WRITERS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return (WRITERS * WRITES_PER_WRITER - len(failed)) / elapsed, len(failed)
+
+
+def run():
+    workdir = tempfile.mkdtemp(prefix="bench_sharding_")
+    try:
+        print(f"{'colleges':>8} {'unsharded/s':>12} {'locked':>7} {'sharded/s':>10} {'locked':>7}")
+        for count in SHARD_COUNTS:
+            path = os.path.join(workdir, f"{count}.db")
+            create_schema(path)
+            populate(path, colleges=count, students=1000, events=count * 4, registrations_per_event=20)
+            use_database(path)
+            database.init_schema()
+            event_ids = [row["event_id"] for row in database.execute_query("SELECT event_id FROM Events")]
+
+            sharding.SHARDING_ENABLED = False
+            unsharded, unsharded_locked = write_load(event_ids)
+
+            sharding.SHARD_DIR = os.path.join(workdir, f"shards_{count}")
+            sharding.split_database()
+            sharding.SHARDING_ENABLED = True
+            sharded, sharded_locked = write_load(event_ids)
+            print(f"{count:>8} {unsharded:>12.1f} {unsharded_locked:>7} {sharded:>10.1f} {sharded_locked:>7}")
+            sharding._known_shards.clear()
+            sharding._event_colleges.clear()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run()
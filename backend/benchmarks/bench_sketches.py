@@ -0,0 +1,83 @@
+"""Exact versus approximate (sketch-backed) reports as the data grows.
+
+Each round fills a fresh database, counts it into the sketches once (as
+a rebuild does), then times both modes of the reports and compares the
+approximate answers with the exact ones ("bound" is the largest error
+bound reported, relative to its estimate). The exact reports scan and
+join every row, so they grow with the data; the approximate ones read
+only the rows written since the last refresh, none here, and grow only
+with the number of rows they return.
+
+    python benchmarks/bench_sketches.py
+"""
+import os
+import shutil
+import tempfile
+import time
+
+from common import create_schema, populate, use_database, measure
+
+import archive
+import database
+import sketches
+from routes.reports import (
+    approx_distinct_attendees, approx_event_popularity, approx_event_ratings, approx_top_students,
+    compute_distinct_attendees, compute_event_popularity, compute_event_ratings, compute_top_students,
+)
+
+EVENT_COUNTS = (50, 200, 800)
+STUDENTS = 5000
+REGISTRATIONS_PER_EVENT = 200
+
+REPORTS = (
+    ("event-popularity", compute_event_popularity, approx_event_popularity, "event_id", "registration_count"),
+    ("top-students", compute_top_students, approx_top_students, "student_id", "total_events"),
+    ("distinct-attendees", compute_distinct_attendees, approx_distinct_attendees, "group_id", "distinct_attendees"),
+    ("event-ratings", compute_event_ratings, approx_event_ratings, "event_id", "median_rating"),
+)
+
+
+def max_relative_error(exact, approx, key: str, value: str) -> float:
+    """Largest relative difference between the two answers over the rows both returned"""
+    exact_values = {row[key]: row[value] for row in exact}
+    worst = 0.0
+    for row in approx:
+        expected = exact_values.get(row[key])
+        if expected:
+            worst = max(worst, abs(row[value] - expected) / expected)
+    return worst
+
+
+def run():
+    workdir = tempfile.mkdtemp(prefix="bench_sketches_")
+    try:
+        print(f"{'events':>6} {'report':>18} {'exact p50':>10} {'approx p50':>11} {'max error':>10} {'bound':>6}")
+        for events in EVENT_COUNTS:
+            path = os.path.join(workdir, f"{events}.db")
+            create_schema(path)
+            use_database(path)
+            populate(path, colleges=8, students=STUDENTS, events=events,
+                     registrations_per_event=REGISTRATIONS_PER_EVENT)
+            database.init_schema()
+            archive.init_schema()
+            sketches.init_schema()
+            started = time.perf_counter()
+            sketches.store.rebuild()
+            build_ms = (time.perf_counter() - started) * 1000
+            for name, exact_fn, approx_fn, key, value in REPORTS:
+                exact = measure(exact_fn, repeat=5)
+                approx = measure(approx_fn, repeat=50)
+                answer = approx_fn()
+                error = max_relative_error(exact_fn(), answer["rows"], key, value)
+                bound = max((row.get(f"{value}_error", 0) / row[value] for row in answer["rows"] if row[value]),
+                            default=0.0)
+                print(f"{events:>6} {name:>18} {exact['p50_ms']:>10} {approx['p50_ms']:>11} "
+                      f"{error:>10.2%} {bound:>6.1%}")
+            print(f"{events:>6} {'initial build':>18} {build_ms:>10.0f} ms, "
+                  f"{events * REGISTRATIONS_PER_EVENT} registrations")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run()
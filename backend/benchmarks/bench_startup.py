@@ -0,0 +1,132 @@
+"""Cold-start cost: import time, time until /health is ready and first-request latency.
+
+Each run starts uvicorn on a fresh copy of campus_events.db, as the hosted
+instance does after waking up, and exits with status 1 when a median is
+over its budget so it can gate a deploy.
+
+    python benchmarks/bench_startup.py
+"""
+import os
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RUNS = 3
+
+# Regression budgets in milliseconds, overridable for slower machines
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "400"))
+READY_BUDGET_MS = float(os.getenv("READY_BUDGET_MS", "1000"))
+FIRST_REQUEST_BUDGET_MS = float(os.getenv("FIRST_REQUEST_BUDGET_MS", "100"))
+
+FIRST_REQUESTS = ("/events/", "/reports/event-popularity")
+
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)")
+
+
+def import_profile():
+    """Total import time of main in ms and its slowest top-level imports"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    # Children are printed before their parent, so main's direct imports are the
+    # depth-one lines after the previous top-level import
+    children = []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if not match:
+            continue
+        cumulative_ms = int(match.group(2)) / 1000
+        depth = (len(match.group(3)) - 1) // 2
+        if depth == 1:
+            children.append((cumulative_ms, match.group(4)))
+        elif depth == 0:
+            if match.group(4) == "main":
+                return cumulative_ms, sorted(children, reverse=True)[:8]
+            children = []
+    raise RuntimeError("main not found in the import profile")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get(url: str) -> int:
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def cold_start(workdir: str):
+    """Milliseconds until /health is ready, and the latency of the first requests after that"""
+    database_path = os.path.join(workdir, "campus_events.db")
+    shutil.copy(os.path.join(BACKEND_DIR, "campus_events.db"), database_path)
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env={**os.environ, "DATABASE_PATH": database_path},
+    )
+    try:
+        while True:
+            try:
+                if _get(f"{base}/health") == 200:
+                    break
+            except OSError:
+                pass  # Not listening yet
+            if time.perf_counter() - started > 60:
+                raise RuntimeError("Server did not become ready within 60s")
+            time.sleep(0.01)
+        ready_ms = (time.perf_counter() - started) * 1000
+        first = {}
+        for path in FIRST_REQUESTS:
+            request_started = time.perf_counter()
+            _get(base + path)
+            first[path] = (time.perf_counter() - request_started) * 1000
+        return ready_ms, first
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run() -> bool:
+    imports, slowest = [], []
+    for _ in range(RUNS):
+        total, slowest = import_profile()
+        imports.append(total)
+    print(f"import main: {statistics.median(imports):.0f} ms (budget {IMPORT_BUDGET_MS:.0f})")
+    for cumulative_ms, module in slowest:
+        print(f"  {module:<32} {cumulative_ms:>7.1f} ms")
+
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    try:
+        runs = [cold_start(workdir) for _ in range(RUNS)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    ready = statistics.median(r[0] for r in runs)
+    print(f"process start to /health ready: {ready:.0f} ms (budget {READY_BUDGET_MS:.0f})")
+    within_budget = statistics.median(imports) <= IMPORT_BUDGET_MS and ready <= READY_BUDGET_MS
+    for path in FIRST_REQUESTS:
+        latency = statistics.median(r[1][path] for r in runs)
+        print(f"first GET {path}: {latency:.1f} ms (budget {FIRST_REQUEST_BUDGET_MS:.0f})")
+        within_budget = within_budget and latency <= FIRST_REQUEST_BUDGET_MS
+
+    print("within budget" if within_budget else "OVER BUDGET")
+    return within_budget
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run() else 1)
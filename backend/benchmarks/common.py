@@ -0,0 +1,102 @@
+"""Helpers shared by the benchmark scripts: synthetic databases and timing"""
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import database  # noqa: E402
+
+SOURCE_DATABASE = os.path.join(BACKEND_DIR, "campus_events.db")
+
+
+def create_schema(path: str):
+    """Create an empty database with the same tables as campus_events.db"""
+    if os.path.exists(path):
+        os.remove(path)
+    source = sqlite3.connect(SOURCE_DATABASE)
+    ddl = [row[0] for row in source.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    )]
+    source.close()
+    conn = sqlite3.connect(path)
+    for statement in ddl:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+
+
+def populate(path: str, colleges: int = 5, students: int = 1000, events: int = 50,
+             registrations_per_event: int = 100, first_date: date = date(2025, 1, 10),
+             days_between_events: int = 7, seed: int = 42):
+    """Fill a database with random colleges, students, events and their registrations,
+    attendance and feedback. Event ids continue after the existing ones."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    college_ids = [row[0] for row in conn.execute("SELECT College_id FROM Colleges")]
+    for i in range(colleges - len(college_ids)):
+        college_ids.append(conn.execute(
+            "INSERT INTO Colleges (name, location) VALUES (?, ?)", (f"College {i}", "Bengaluru")
+        ).lastrowid)
+
+    student_ids = [row[0] for row in conn.execute("SELECT student_id FROM Students")]
+    start = len(student_ids)
+    conn.executemany(
+        "INSERT INTO Students (name, email, college_id) VALUES (?, ?, ?)",
+        [(f"Student {i}", f"student{i}@example.edu", rng.choice(college_ids))
+         for i in range(start, students)]
+    )
+    student_ids = [row[0] for row in conn.execute("SELECT student_id FROM Students")]
+
+    offset = conn.execute("SELECT COUNT(*) FROM Events").fetchone()[0]
+    for i in range(events):
+        event_date = first_date + timedelta(days=(offset + i) * days_between_events)
+        event_id = conn.execute(
+            "INSERT INTO Events (name, type, date, capacity, description, college_id, created_by) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (f"Event {offset + i}", rng.choice(["Workshop", "Seminar", "Fest", "Hackathon"]),
+             event_date.isoformat(), registrations_per_event * 2, "Synthetic event " * 8,
+             rng.choice(college_ids), "benchmark")
+        ).lastrowid
+        for student_id in rng.sample(student_ids, min(registrations_per_event, len(student_ids))):
+            registration_id = conn.execute(
+                "INSERT INTO Registrations (student_id, event_id, status, timestamp) VALUES (?, ?, 'Registered', ?)",
+                (student_id, event_id, f"{event_date.isoformat()} 09:00")
+            ).lastrowid
+            if rng.random() < 0.8:
+                conn.execute(
+                    "INSERT INTO Attendance (registration_id, attended, timestamp) VALUES (?, 1, ?)",
+                    (registration_id, f"{event_date.isoformat()} 10:00")
+                )
+                if rng.random() < 0.7:
+                    conn.execute(
+                        "INSERT INTO Feedback (registration_id, rating, comment) VALUES (?, ?, ?)",
+                        (registration_id, rng.randint(1, 5), "ok")
+                    )
+    conn.commit()
+    conn.close()
+
+
+def use_database(path: str):
+    """Point the data-access layer at the given database file"""
+    database.DATABASE_PATH = path
+
+
+def measure(fn, repeat: int = 50) -> dict:
+    """Run fn repeatedly and return latency statistics in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "mean_ms": round(statistics.mean(samples), 3),
+        "p50_ms": round(samples[len(samples) // 2], 3),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 3),
+    }
@@ -0,0 +1,242 @@
+"""Change-data-capture outbox for incremental sync.
+
+Every INSERT/UPDATE/DELETE on a captured table that goes through
+database.execute_insert/execute_update is run with RETURNING * and one
+ChangeLog row per affected row is appended on the same connection before
+the commit, so a change and its outbox entry land in the same
+transaction. Internal tables (ReportJobs, EventSchedule, ...) are not
+captured.
+
+Each database file keeps its own ChangeLog: campus_events.db, and every
+college shard when sharding is enabled (shard change ids start at
+college_id * SHARD_ID_RANGE like its other ids). A feed cursor lists the
+last change id read from each file. Archiving and splitting into shards
+move rows physically and are not recorded as changes.
+
+Compaction drops entries older than CHANGES_RETENTION_DAYS that were
+superseded by a later change to the same row, so a consumer always sees
+the latest state of each row. Delete tombstones are kept for
+TOMBSTONE_RETENTION_DAYS; once some are purged, cursors from before them
+are rejected and the consumer has to resync in full.
+
+Usage:
+    python changes.py compact
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import database
+from sharding import SHARD_ID_RANGE, SHARDING_ENABLED, shard_ids
+
+
+CHANGES_RETENTION_DAYS = int(os.getenv("CHANGES_RETENTION_DAYS", "7"))
+
+TOMBSTONE_RETENTION_DAYS = int(os.getenv("TOMBSTONE_RETENTION_DAYS", "30"))
+
+# Minimum time between compactions triggered by reads of the feed
+COMPACT_INTERVAL_SECONDS = int(os.getenv("CHANGES_COMPACT_INTERVAL_SECONDS", "3600"))
+
+# Captured tables and their primary key columns
+CAPTURED_TABLES = {
+    "Colleges": "College_id",
+    "Students": "student_id",
+    "Events": "event_id",
+    "Registrations": "registration_id",
+    "Attendance": "attendance_id",
+    "Feedback": "feedback_id",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS "ChangeLog" (
+    "change_id"     INTEGER PRIMARY KEY AUTOINCREMENT,
+    "table_name"    TEXT NOT NULL,
+    "row_id"        INTEGER NOT NULL,
+    "op"            TEXT NOT NULL,
+    "data"          TEXT,
+    "changed_at"    TEXT NOT NULL DEFAULT (datetime('now'))
+);
+CREATE INDEX IF NOT EXISTS "idx_changelog_row" ON "ChangeLog" ("table_name", "row_id", "change_id");
+CREATE INDEX IF NOT EXISTS "idx_changelog_changed_at" ON "ChangeLog" ("changed_at");
+CREATE TABLE IF NOT EXISTS "ChangeLogHorizon" (
+    "id"                INTEGER PRIMARY KEY CHECK ("id" = 1),
+    "purged_through"    INTEGER NOT NULL
+);
+"""
+
+_STATEMENT = re.compile(
+    r'^\s*(INSERT|UPDATE|DELETE)\b(?:\s+OR\s+\w+)?(?:\s+INTO|\s+FROM)?\s+(?:main\.)?"?(\w+)"?',
+    re.IGNORECASE
+)
+
+_compact_lock = threading.Lock()
+_last_compacted: Optional[float] = None
+
+
+class CursorExpired(Exception):
+    """The cursor points before changes that were compacted away"""
+
+
+def init_schema():
+    """Create the outbox in the main database"""
+    with database.get_db_connection() as conn:
+        conn.executescript(SCHEMA)
+
+
+def _captured(query: str) -> Optional[Tuple[str, str]]:
+    """(table, op) of a write statement on a captured table, None otherwise"""
+    match = _STATEMENT.match(query)
+    if not match or match.group(2) not in CAPTURED_TABLES:
+        return None
+    return match.group(2), match.group(1).lower()
+
+
+def record_rows(conn: sqlite3.Connection, table: str, op: str, rows: List[Dict[str, Any]]):
+    """Append outbox entries for rows written on conn; call before the commit"""
+    key = CAPTURED_TABLES[table]
+    conn.executemany(
+        "INSERT INTO ChangeLog (table_name, row_id, op, data) VALUES (?, ?, ?, ?)",
+        [(table, row[key], op, None if op == "delete" else json.dumps(row)) for row in rows]
+    )
+
+
+def execute_captured(cursor: sqlite3.Cursor, query: str, params: tuple) -> int:
+    """Execute a write, recording it in the outbox when it targets a captured table; returns affected rows"""
+    captured = _captured(query)
+    if captured is None:
+        cursor.execute(query, params)
+        return cursor.rowcount
+    cursor.execute(query.strip().rstrip(";") + " RETURNING *", params)
+    rows = [dict(row) for row in cursor.fetchall()]
+    if rows:
+        record_rows(cursor.connection, *captured, rows)
+    return len(rows)
+
+
+def _sources() -> List[int]:
+    """Database files with an outbox: 0 for the main database, then the college shards"""
+    return [0] + (shard_ids() if SHARDING_ENABLED else [])
+
+
+def _shard(source: int) -> Optional[int]:
+    return source or None
+
+
+def parse_cursor(cursor: Optional[str]) -> Dict[int, int]:
+    """Last change id read per source from a cursor string"""
+    positions = {}
+    for part in (cursor or "").split(","):
+        if part.strip():
+            change_id = int(part)
+            positions[change_id // SHARD_ID_RANGE] = change_id
+    return positions
+
+
+def format_cursor(positions: Dict[int, int]) -> str:
+    return ",".join(str(positions[source]) for source in sorted(positions))
+
+
+def head_cursor() -> str:
+    """Cursor at the newest change of every source, to start following the feed after a full sync"""
+    positions = {}
+    for source in _sources():
+        with database.get_db_connection(shard=_shard(source)) as conn:
+            latest = conn.execute("SELECT MAX(change_id) FROM ChangeLog").fetchone()[0]
+        positions[source] = latest if latest is not None else source * SHARD_ID_RANGE
+    return format_cursor(positions)
+
+
+def read_changes(since: Optional[str], limit: int) -> Dict[str, Any]:
+    """Changes after a cursor in commit order, at most limit, with the cursor to continue from"""
+    maybe_compact()
+    positions = parse_cursor(since)
+    batch = []
+    for source in _sources():
+        position = positions.get(source, source * SHARD_ID_RANGE)
+        with database.get_db_connection(shard=_shard(source)) as conn:
+            horizon = conn.execute("SELECT purged_through FROM ChangeLogHorizon WHERE id = 1").fetchone()
+            if since is not None and horizon and position < horizon[0]:
+                raise CursorExpired(f"Changes before {horizon[0]} were compacted, resync from the start")
+            rows = conn.execute(
+                "SELECT change_id, table_name, row_id, op, data, changed_at FROM ChangeLog "
+                "WHERE change_id > ? ORDER BY change_id LIMIT ?",
+                (position, limit + 1)
+            ).fetchall()
+        batch.extend((source, dict(row)) for row in rows)
+
+    # Each source is in commit order; interleave the sources by commit time
+    batch.sort(key=lambda item: (item[1]["changed_at"], item[1]["change_id"]))
+    changes = []
+    for source, change in batch[:limit]:
+        positions[source] = change["change_id"]
+        change["table"] = change.pop("table_name")
+        change["data"] = json.loads(change["data"]) if change["data"] else None
+        changes.append(change)
+    return {"changes": changes, "next_cursor": format_cursor(positions), "has_more": len(batch) > limit}
+
+
+def compact() -> Dict[str, int]:
+    """Drop superseded entries past the retention window and expired tombstones; returns rows removed"""
+    retention = f"-{CHANGES_RETENTION_DAYS} days"
+    tombstone_retention = f"-{TOMBSTONE_RETENTION_DAYS} days"
+    removed = {"superseded": 0, "tombstones": 0}
+    for source in _sources():
+        with database.get_db_connection(shard=_shard(source)) as conn:
+            removed["superseded"] += conn.execute(
+                """
+                DELETE FROM ChangeLog
+                WHERE changed_at < datetime('now', ?) AND EXISTS (
+                    SELECT 1 FROM ChangeLog newer
+                    WHERE newer.table_name = ChangeLog.table_name AND newer.row_id = ChangeLog.row_id
+                      AND newer.change_id > ChangeLog.change_id
+                )
+                """,
+                (retention,)
+            ).rowcount
+            purged_through = conn.execute(
+                "SELECT MAX(change_id) FROM ChangeLog WHERE op = 'delete' AND changed_at < datetime('now', ?)",
+                (tombstone_retention,)
+            ).fetchone()[0]
+            if purged_through is not None:
+                removed["tombstones"] += conn.execute(
+                    "DELETE FROM ChangeLog WHERE op = 'delete' AND change_id <= ?", (purged_through,)
+                ).rowcount
+                conn.execute(
+                    "INSERT INTO ChangeLogHorizon (id, purged_through) VALUES (1, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET purged_through = excluded.purged_through",
+                    (purged_through,)
+                )
+            conn.commit()
+    return removed
+
+
+def maybe_compact():
+    """Compact if the last compaction is older than COMPACT_INTERVAL_SECONDS"""
+    global _last_compacted
+    if _last_compacted is not None and time.monotonic() - _last_compacted < COMPACT_INTERVAL_SECONDS:
+        return
+    if not _compact_lock.acquire(blocking=False):
+        return  # Another request is compacting
+    try:
+        _last_compacted = time.monotonic()
+        compact()
+    finally:
+        _compact_lock.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the change-data-capture outbox")
+    parser.add_argument("command", choices=["compact"])
+    parser.parse_args()
+    init_schema()
+    removed = compact()
+    print(f"Removed {removed['superseded']} superseded changes and {removed['tombstones']} tombstones")
+
+
+if __name__ == "__main__":
+    main()
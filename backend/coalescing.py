@@ -0,0 +1,159 @@
+"""Single-flight coalescing of identical concurrent reads.
+
+When many requests ask for the same rows at the same instant (a popular
+event opening), only the first caller runs the query. The others wait
+for it and receive its rows. The key is the query with whitespace
+collapsed, its parameters and the database it runs on. The result is
+dropped as soon as the execution finishes, so a read arriving after that
+runs the query again: nothing is cached.
+
+Every caller gets its own copy of the shared rows, so one caller
+modifying its result cannot affect another. A read never joins an
+execution that started before a write committed in this worker: after
+POST /registrations/, the same client reads its own registration.
+"""
+import copy
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+# Set to 0 to run every read on its own
+COALESCE_READS = os.getenv("COALESCE_READS", "1") == "1"
+
+
+def normalize(query: str) -> str:
+    """Query text with whitespace collapsed; statements with string literals are kept as written"""
+    if "'" in query or '"' in query:
+        return query
+    return " ".join(query.split())
+
+
+def _reraised(error: BaseException) -> BaseException:
+    """A new exception like error for a waiting caller; one exception object is raised in one thread only"""
+    try:
+        return copy.copy(error)  # Same type and args, no traceback
+    except Exception:
+        return RuntimeError(str(error))
+
+
+def _copy(result: Any) -> Any:
+    if isinstance(result, list):
+        return [dict(row) for row in result]
+    if isinstance(result, dict):
+        return dict(result)
+    return result
+
+
+class _Call:
+    """One in-flight execution and the callers waiting for it"""
+
+    def __init__(self, generation: int):
+        self.generation = generation
+        self.done = threading.Event()
+        self.waiters = 0
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Runs identical concurrent calls once and hands the result to every caller"""
+
+    def __init__(self, enabled: bool = COALESCE_READS):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        # Bumped by every committed write; calls started before it take no new callers
+        self._generation = 0
+        self.executed = 0
+        self.coalesced = 0
+        self.largest_group = 0
+        self.execute_seconds = 0.0  # Time spent running the executed calls
+
+    def invalidate(self):
+        """Record a committed write: later reads must not share an execution started before it"""
+        with self._lock:
+            self._generation += 1
+
+    def commit(self, conn):
+        """Commit a write, invalidating before and after so no read in between joins an older execution"""
+        self.invalidate()
+        try:
+            conn.commit()
+        finally:
+            self.invalidate()
+
+    def _run(self, fn: Callable[[], Any]) -> Any:
+        started = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.execute_seconds += elapsed
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Result of fn(), shared with the concurrent calls made with the same key"""
+        try:
+            hash(key)
+        except TypeError:
+            key = None  # Unhashable parameters, e.g. a list
+        if not self.enabled or key is None:
+            with self._lock:
+                self.executed += 1
+            return self._run(fn)
+
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call.generation == self._generation:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call(self._generation)
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise _reraised(call.error) from call.error
+            return _copy(call.result)
+
+        try:
+            call.result = self._run(fn)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:  # A write may have replaced it with a newer call
+                    del self._calls[key]
+                self.largest_group = max(self.largest_group, call.waiters + 1)
+            call.done.set()
+        # No caller joins once the call is removed; the leader copies only if others share the rows
+        return _copy(call.result) if call.waiters else call.result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = self.executed + self.coalesced
+            return {
+                "enabled": self.enabled,
+                "calls": calls,
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "coalesced_ratio": round(self.coalesced / calls, 4) if calls else 0.0,
+                "largest_group": self.largest_group,
+                "execute_seconds": round(self.execute_seconds, 3),
+                "in_flight": len(self._calls),
+            }
+
+    def reset(self):
+        """Zero the counters"""
+        with self._lock:
+            self.executed = self.coalesced = self.largest_group = 0
+            self.execute_seconds = 0.0
+
+
+flight = SingleFlight()
@@ -0,0 +1,191 @@
+"""Cold-start support for the hosted instance, which sleeps when idle.
+
+- init_schemas() creates every support table in one transaction, so a
+  fresh database file costs one sync to disk instead of one per module.
+- A prebuilt OpenAPI document (python coldstart.py openapi) is served
+  instead of generating the schema on first use, as long as it was built
+  from the current code and settings.
+- A warm-up thread opens the database, runs the hot queries, fills the
+  in-memory caches and sends a few requests through the app in-process,
+  on the server's event loop;
+  /health answers 503 until it is done, so traffic is only routed to the
+  instance once it is warm.
+
+benchmarks/bench_startup.py measures import time, time to healthy and
+first-request latency against a budget.
+
+Usage:
+    python coldstart.py openapi     # write the prebuilt OpenAPI document
+"""
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import archive
+import changes
+import database
+import jobs
+import recommendations
+import schedule
+import sharding
+import sketches
+
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+
+OPENAPI_PATH = os.getenv("OPENAPI_PATH", "openapi.json")
+
+# Database bytes read ahead during warm-up so the first queries find their pages in the OS cache
+WARMUP_READ_LIMIT_BYTES = 64 * 1024 * 1024
+
+# Requests sent through the app in-process during warm-up
+WARMUP_PATHS = ("/events/", "/students/", "/colleges/", "/reports/event-popularity")
+
+_SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Settings read by the code, e.g. PROFILE_INTERVAL_MS, which feed defaults shown in the schema
+_SETTING = re.compile(rb'os\.(?:getenv|environ\.get)\(\s*"([A-Za-z0-9_]+)"')
+
+
+def init_schemas():
+    """Create every support table and index in a single transaction"""
+    database.enable_wal()  # Cannot change inside a transaction
+    with database.get_db_connection() as conn:
+        conn.executescript("BEGIN;" + "".join((
+            database.SCHEMA, archive.SCHEMA, changes.SCHEMA, jobs.SCHEMA, schedule.SCHEMA, sharding.CATALOG_SCHEMA,
+            sketches.SCHEMA
+        )))
+        schedule.backfill(conn)
+        jobs.recover(conn)
+        conn.commit()
+
+
+def source_fingerprint() -> str:
+    """Hash of the code the OpenAPI document is generated from and of the settings it reads"""
+    digest = hashlib.sha256()
+    paths = sorted(glob.glob(os.path.join(_SOURCE_DIR, "*.py")))
+    paths += sorted(glob.glob(os.path.join(_SOURCE_DIR, "routes", "*.py")))
+    settings = set()
+    for path in paths:
+        with open(path, "rb") as f:
+            source = f.read()
+        digest.update(source)
+        settings.update(name.decode() for name in _SETTING.findall(source))
+    for name in sorted(settings):
+        digest.update(f"{name}={os.getenv(name)}".encode())
+    return digest.hexdigest()
+
+
+def write_openapi(app, path: str = OPENAPI_PATH):
+    """Generate the OpenAPI document and store it with the fingerprint of the code"""
+    with open(path, "w") as f:
+        json.dump({"fingerprint": source_fingerprint(), "openapi": app.openapi()}, f)
+
+
+def load_openapi(app, path: str = OPENAPI_PATH) -> bool:
+    """Serve the prebuilt OpenAPI document if it matches the current code"""
+    try:
+        with open(path) as f:
+            document = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if document.get("fingerprint") != source_fingerprint():
+        return False  # Stale, the schema is generated on first use as usual
+    app.openapi_schema = document["openapi"]
+    return True
+
+
+def _read_ahead(path: str):
+    with open(path, "rb") as f:
+        remaining = WARMUP_READ_LIMIT_BYTES
+        while remaining > 0 and f.read(min(remaining, 1024 * 1024)):
+            remaining -= 1024 * 1024
+
+
+async def _get(app, path: str) -> int:
+    """Send a GET request through the ASGI app and return the status code"""
+    status = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app({
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"warmup")], "client": ("warmup", 0), "server": ("warmup", 80),
+    }, receive, send)
+    return status[0] if status else 0
+
+
+class WarmUp:
+    """Primes the worker in a background thread and reports when it is ready"""
+
+    def __init__(self):
+        self.ready = not WARMUP_ENABLED
+        self.steps: Dict[str, float] = {}
+        self.errors: List[str] = []
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _step(self, name: str, fn):
+        started = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            self.errors.append(f"{name}: {e}")  # A failed step only costs the first request some latency
+        self.steps[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def run(self, app):
+        self._step("database", lambda: _read_ahead(database.DATABASE_PATH))
+        self._step("shards", lambda: sharding.fan_out(
+            lambda shard: database.execute_query("SELECT COUNT(*) FROM Registrations", shard=shard)
+        ))
+        self._step("caches", sharding.load_event_colleges)
+        self._step("sketches", sketches.store.current)
+        self._step("recommendations", recommendations.matrix.refresh)
+        self._step("openapi", app.openapi)  # Already cached when the prebuilt document was loaded
+        # On the server's loop: the app and its middleware are not safe to run on a second loop
+        self._step("requests", lambda: asyncio.run_coroutine_threadsafe(self._requests(app), self._loop).result())
+        self.ready = True
+
+    async def _requests(self, app):
+        for path in WARMUP_PATHS:
+            await _get(app, path)
+
+    def start(self, app):
+        """Warm up in the background so the server accepts connections right away; call from the server's loop"""
+        if self.ready:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._thread = threading.Thread(target=self.run, args=(app,), name="warmup", daemon=True)
+        self._thread.start()
+
+    def status(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "steps_ms": self.steps, "errors": self.errors}
+
+
+warm_up = WarmUp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start build steps")
+    parser.add_argument("command", choices=["openapi"])
+    parser.parse_args()
+    from main import app
+    write_openapi(app)
+    print(f"Wrote {OPENAPI_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,60 +3,108 @@ import os
 from typing import List, Dict, Any, Optional
 from contextlib import contextmanager
 
+from coalescing import flight, normalize
 
-DATABASE_PATH = "campus_events.db"
+
+DATABASE_PATH = os.getenv("DATABASE_PATH", "campus_events.db")
+
+# Indexes keeping the hot-path lookups independent of table size; emails are unique per student
+SCHEMA = """
+CREATE UNIQUE INDEX IF NOT EXISTS "idx_students_email" ON "Students" ("email");
+CREATE INDEX IF NOT EXISTS "idx_registrations_event_status" ON "Registrations" ("event_id", "status");
+CREATE INDEX IF NOT EXISTS "idx_registrations_student" ON "Registrations" ("student_id");
+CREATE INDEX IF NOT EXISTS "idx_attendance_registration" ON "Attendance" ("registration_id");
+CREATE INDEX IF NOT EXISTS "idx_feedback_registration" ON "Feedback" ("registration_id");
+"""
+
+
+def enable_wal():
+    """Switch the database to write-ahead logging; the mode is stored in the file, so this is a no-op once done"""
+    # Readers never wait for writers, and online backups copy one pinned version instead of restarting
+    with get_db_connection() as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+
+
+def init_schema():
+    """Create the indexes used by the hot path if they do not exist yet"""
+    enable_wal()
+    with get_db_connection() as conn:
+        conn.executescript(SCHEMA)
 
 
 @contextmanager
-def get_db_connection():
-    """Context manager for database connections"""
-    conn = sqlite3.connect(DATABASE_PATH)
+def get_db_connection(include_archive: bool = False, shard: Optional[int] = None):
+    """Context manager for database connections.
+
+    With include_archive the archived terms are attached and the fact tables
+    are shadowed by views over the hot and archived rows. With shard (a
+    college id) the connection opens that college's shard, see sharding.py.
+    """
+    if shard is not None:
+        if include_archive:
+            raise RuntimeError("Archived rows cannot be read from a shard")
+        from sharding import open_shard
+        conn = open_shard(shard)
+    else:
+        conn = sqlite3.connect(DATABASE_PATH)
     conn.row_factory = sqlite3.Row  # This allows accessing columns by name
     try:
+        if include_archive:
+            from archive import attach_archives
+            attach_archives(conn)
         yield conn
     finally:
         conn.close()
 
 
-def execute_query(query: str, params: tuple = ()) -> List[Dict[str, Any]]:
-    """Execute a SELECT query and return results as list of dictionaries"""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        return [dict(row) for row in cursor.fetchall()]
+def execute_query(query: str, params: tuple = (), include_archive: bool = False,
+                  shard: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Execute a SELECT query and return results as list of dictionaries; identical concurrent calls share one run"""
+    def run():
+        with get_db_connection(include_archive, shard) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            return [dict(row) for row in cursor.fetchall()]
 
+    return flight.do(("all", normalize(query), tuple(params), include_archive, shard, DATABASE_PATH), run)
 
-def execute_insert(query: str, params: tuple = ()) -> int:
-    """Execute an INSERT query and return the last row ID"""
-    with get_db_connection() as conn:
+
+def execute_insert(query: str, params: tuple = (), shard: Optional[int] = None) -> int:
+    """Execute an INSERT query and return the last row ID, recording the change in the outbox"""
+    from changes import execute_captured
+    with get_db_connection(shard=shard) as conn:
         cursor = conn.cursor()
-        cursor.execute(query, params)
-        conn.commit()
+        execute_captured(cursor, query, params)
+        flight.commit(conn)
         return cursor.lastrowid
 
 
-def execute_update(query: str, params: tuple = ()) -> int:
-    """Execute an UPDATE/DELETE query and return number of affected rows"""
-    with get_db_connection() as conn:
+def execute_update(query: str, params: tuple = (), shard: Optional[int] = None) -> int:
+    """Execute an UPDATE/DELETE query and return number of affected rows, recording the changes in the outbox"""
+    from changes import execute_captured
+    with get_db_connection(shard=shard) as conn:
         cursor = conn.cursor()
-        cursor.execute(query, params)
-        conn.commit()
-        return cursor.rowcount
+        affected = execute_captured(cursor, query, params)
+        flight.commit(conn)
+        return affected
 
 
-def get_single_record(query: str, params: tuple = ()) -> Optional[Dict[str, Any]]:
-    """Execute a SELECT query and return a single record"""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        row = cursor.fetchone()
-        return dict(row) if row else None
+def get_single_record(query: str, params: tuple = (), shard: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Execute a SELECT query and return a single record; identical concurrent calls share one run"""
+    def run():
+        with get_db_connection(shard=shard) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            row = cursor.fetchone()
+            return dict(row) if row else None
+
+    return flight.do(("one", normalize(query), tuple(params), shard, DATABASE_PATH), run)
 
 
-def check_record_exists(table: str, column: str, value: Any) -> bool:
+def check_record_exists(table: str, column: str, value: Any, shard: Optional[int] = None) -> bool:
     """Check if a record exists in a table"""
     query = f"SELECT 1 FROM {table} WHERE {column} = ?"
-    result = get_single_record(query, (value,))
+    result = get_single_record(query, (value,), shard)
     return result is not None
 
 
@@ -83,8 +131,10 @@ def get_event_by_id(event_id: int) -> Optional[Dict[str, Any]]:
 
 def get_registration_by_id(registration_id: int) -> Optional[Dict[str, Any]]:
     """Get registration by ID"""
+    from sharding import shard_for_registration
     return get_single_record(
-        "SELECT * FROM Registrations WHERE registration_id = ?", (registration_id,)
+        "SELECT * FROM Registrations WHERE registration_id = ?", (registration_id,),
+        shard_for_registration(registration_id)
     )
 
 
@@ -122,10 +172,11 @@ def get_registration_with_details(registration_id: int) -> Optional[Dict[str, An
     JOIN Colleges c ON s.college_id = c.College_id
     WHERE r.registration_id = ?
     """
-    return get_single_record(query, (registration_id,))
+    from sharding import shard_for_registration
+    return get_single_record(query, (registration_id,), shard_for_registration(registration_id))
 
 
-def get_attendance_count_for_event(event_id: int) -> int:
+def get_attendance_count_for_event(event_id: int, include_archived: bool = False) -> int:
     """Get total attendance count for an event"""
     query = """
     SELECT COUNT(*) as count
@@ -133,16 +184,20 @@ def get_attendance_count_for_event(event_id: int) -> int:
     JOIN Registrations r ON a.registration_id = r.registration_id
     WHERE r.event_id = ? AND a.attended = 1
     """
-    result = get_single_record(query, (event_id,))
-    return result['count'] if result else 0
+    from archive import event_source
+    include_archive, shard = event_source(event_id, include_archived)
+    result = execute_query(query, (event_id,), include_archive, shard)
+    return result[0]['count'] if result else 0
 
 
-def get_registration_count_for_event(event_id: int) -> int:
-    """Get total registration count for an event"""
+def get_registration_count_for_event(event_id: int, include_archived: bool = True) -> int:
+    """Get total registration count for an event; archived registrations still hold their seats"""
     query = """
     SELECT COUNT(*) as count
     FROM Registrations
     WHERE event_id = ? AND status = 'Registered'
     """
-    result = get_single_record(query, (event_id,))
-    return result['count'] if result else 0
+    from archive import event_source
+    include_archive, shard = event_source(event_id, include_archived)
+    result = execute_query(query, (event_id,), include_archive, shard)
+    return result[0]['count'] if result else 0
@@ -0,0 +1,165 @@
+"""Streaming bulk import of students from CSV or NDJSON.
+
+Rows are read lazily from the upload and processed in chunks: emails are
+deduplicated within the file with a set and against the database with one
+IN lookup per chunk, colleges are validated against a single lookup of all
+college ids, and each chunk is inserted with one multi-row INSERT ... ON
+CONFLICT, recorded in the change outbox and committed on its own.
+Emails are compared and stored in lower case.
+
+A stream that cannot be decoded (invalid UTF-8, a broken CSV quote) stops
+the import at that point: the rows read before it are still imported, and
+the summary is returned with "stopped": true and the failing row.
+"""
+import csv
+import json
+import time
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from changes import execute_captured
+from coalescing import flight
+from database import get_db_connection, execute_query
+
+
+# Rows per transaction; also bounds the size of the email IN (...) lookup and the
+# multi-row INSERT (3 parameters per row, SQLite allows 32766)
+CHUNK_SIZE = 500
+
+# Row-level errors returned in the summary, the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+REQUIRED_FIELDS = ("name", "email", "college_id")
+
+
+def _lines(stream: BinaryIO) -> Iterator[str]:
+    """Decoded lines, line endings kept; decoding per line makes an invalid byte fail at its own line"""
+    encoding = "utf-8-sig"  # Drops a byte order mark at the start
+    for line in stream:
+        yield line.decode(encoding)
+        encoding = "utf-8"
+
+
+def _csv_rows(stream: BinaryIO) -> Iterator[Dict[str, Any]]:
+    yield from csv.DictReader(_lines(stream))
+
+
+def _ndjson_rows(stream: BinaryIO) -> Iterator[Any]:
+    for line in _lines(stream):
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> str:
+    """Pick csv or ndjson from the upload's file name or content type"""
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or (content_type or "").endswith(("ndjson", "jsonl")):
+        return "ndjson"
+    return "csv"
+
+
+def _validate(row: Any, college_ids: set) -> Tuple[Optional[tuple], Optional[str]]:
+    """Return (name, email, college_id) for a valid row, otherwise an error message"""
+    if not isinstance(row, dict):
+        return None, "Malformed row"
+    missing = [field for field in REQUIRED_FIELDS if not str(row.get(field) or "").strip()]
+    if missing:
+        return None, f"Missing {', '.join(missing)}"
+    if not isinstance(row["email"], str):
+        return None, "Invalid email"
+    email = row["email"].strip().lower()
+    if "@" not in email:
+        return None, "Invalid email"
+    if isinstance(row["college_id"], bool):
+        return None, "Invalid college_id"  # JSON true would pass int()
+    try:
+        college_id = int(row["college_id"])
+    except (TypeError, ValueError):
+        return None, "Invalid college_id"
+    if college_id not in college_ids:
+        return None, "College not found"
+    return (str(row["name"]).strip(), email, college_id), None
+
+
+def import_students(stream: BinaryIO, fmt: str = "csv", chunk_size: int = CHUNK_SIZE) -> Dict[str, Any]:
+    """Import students from a binary stream and return a summary with row-level errors"""
+    started = time.perf_counter()
+    rows = _ndjson_rows(stream) if fmt == "ndjson" else _csv_rows(stream)
+    college_ids = {row["College_id"] for row in execute_query("SELECT College_id FROM Colleges")}
+
+    summary = {"total_rows": 0, "inserted": 0, "duplicates": 0, "failed": 0, "errors": [], "errors_truncated": False,
+               "stopped": False}
+    seen_emails = set()
+
+    def error(row_number: int, message: str, email: Optional[str] = None, duplicate: bool = False):
+        summary["duplicates" if duplicate else "failed"] += 1
+        if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+            summary["errors"].append({"row": row_number, "email": email, "error": message})
+        else:
+            summary["errors_truncated"] = True
+
+    with get_db_connection() as conn:
+        chunk: List[Tuple[int, tuple]] = []
+
+        def flush():
+            emails = [values[1] for _, values in chunk]
+            placeholders = ", ".join("?" * len(emails))
+            existing = {row[0] for row in conn.execute(
+                f"SELECT email FROM Students WHERE email IN ({placeholders})", emails
+            )}
+            new_rows = []
+            for row_number, values in chunk:
+                if values[1] in existing:
+                    error(row_number, "Email already registered", values[1], duplicate=True)
+                else:
+                    new_rows.append(values)
+            inserted = 0
+            if new_rows:
+                # One multi-row statement so the inserted rows come back for the change outbox
+                values = ", ".join(["(?, ?, ?)"] * len(new_rows))
+                inserted = execute_captured(
+                    conn.cursor(),
+                    f"INSERT INTO Students (name, email, college_id) VALUES {values} ON CONFLICT(email) DO NOTHING",
+                    tuple(value for row in new_rows for value in row)
+                )
+            flight.commit(conn)
+            summary["inserted"] += inserted
+            # Rows that lost a race with a concurrent insert of the same email
+            summary["duplicates"] += len(new_rows) - inserted
+            chunk.clear()
+
+        row_number = 0
+        while True:
+            try:
+                row = next(rows)
+            except StopIteration:
+                break
+            except (UnicodeDecodeError, csv.Error) as e:
+                # The reader cannot continue past this point; keep what was read before it
+                error(row_number + 1, f"Unreadable input, import stopped: {e}")
+                summary["stopped"] = True
+                break
+            row_number += 1
+            summary["total_rows"] += 1
+            values, message = _validate(row, college_ids)
+            if message:
+                email = row.get("email") if isinstance(row, dict) else None
+                error(row_number, message, email if isinstance(email, str) else None)
+                continue
+            if values[1] in seen_emails:
+                error(row_number, "Duplicate email in file", values[1], duplicate=True)
+                continue
+            seen_emails.add(values[1])
+            chunk.append((row_number, values))
+            if len(chunk) >= chunk_size:
+                flush()
+        if chunk:
+            flush()
+
+    elapsed = time.perf_counter() - started
+    summary["elapsed_seconds"] = round(elapsed, 3)
+    summary["rows_per_second"] = round(summary["total_rows"] / elapsed, 1) if elapsed > 0 else None
+    return summary
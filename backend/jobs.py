@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from database import get_db_connection, execute_insert, execute_update, get_single_record
+
+
+# Number of worker threads computing reports off the request path
+JOB_WORKERS = int(os.getenv("REPORT_JOB_WORKERS", "2"))
+
+# How long a finished report result is served before it has to be recomputed
+RESULT_TTL_SECONDS = int(os.getenv("REPORT_RESULT_TTL_SECONDS", "900"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS "ReportJobs" (
+    "job_id"        TEXT PRIMARY KEY,
+    "report"        TEXT NOT NULL,
+    "params"        TEXT NOT NULL,
+    "params_hash"   TEXT NOT NULL,
+    "status"        TEXT NOT NULL,
+    "result"        TEXT,
+    "result_hash"   TEXT,
+    "error"         TEXT,
+    "created_at"    REAL NOT NULL,
+    "finished_at"   REAL,
+    "expires_at"    REAL,
+    "boot_id"       TEXT
+);
+CREATE INDEX IF NOT EXISTS "idx_report_jobs_params_hash" ON "ReportJobs" ("params_hash", "status");
+"""
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+# Stamped on every job; jobs left queued or running under another boot id were interrupted by a restart.
+# Workers of one server must share it: set REPORT_JOBS_BOOT_ID per start when running several workers
+BOOT_ID = os.getenv("REPORT_JOBS_BOOT_ID") or uuid.uuid4().hex
+
+# Error of the jobs whose worker stopped before they finished
+INTERRUPTED_ERROR = "Interrupted by a restart, submit the report again"
+
+# Report name -> function computing it from a params dict
+_handlers: Dict[str, Callable[..., List[Dict[str, Any]]]] = {}
+
+
+def init_schema():
+    """Create the job table if it does not exist yet and fail the jobs interrupted by a restart"""
+    with get_db_connection() as conn:
+        conn.executescript(SCHEMA)
+        recover(conn)
+        conn.commit()
+
+
+def recover(conn):
+    """Mark queued and running jobs of an earlier boot as failed, without committing.
+
+    The job pool lives in memory, so such jobs would otherwise stay queued or running forever.
+    """
+    columns = [row[1] for row in conn.execute('PRAGMA table_info("ReportJobs")')]
+    if "boot_id" not in columns:
+        conn.execute('ALTER TABLE "ReportJobs" ADD COLUMN "boot_id" TEXT')
+    finished = time.time()
+    conn.execute(
+        """
+        UPDATE ReportJobs SET status = ?, error = ?, finished_at = ?, expires_at = ?
+        WHERE status IN (?, ?) AND (boot_id IS NULL OR boot_id != ?)
+        """,
+        (STATUS_FAILED, INTERRUPTED_ERROR, finished, finished + RESULT_TTL_SECONDS,
+         STATUS_QUEUED, STATUS_RUNNING, BOOT_ID)
+    )
+
+
+def register_report(name: str, handler: Callable[..., List[Dict[str, Any]]]):
+    """Make a report available to the job runner"""
+    _handlers[name] = handler
+
+
+def available_reports() -> List[str]:
+    """Names of all reports that can be run as jobs"""
+    return sorted(_handlers)
+
+
+def _hash(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _row_to_job(row: Dict[str, Any]) -> Dict[str, Any]:
+    job = dict(row)
+    job["params"] = json.loads(job["params"])
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    del job["params_hash"]
+    job.pop("boot_id", None)
+    return job
+
+
+class JobRunner:
+    """Bounded worker pool for report jobs with coalescing of identical requests"""
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        # params_hash -> job_id of the queued/running job computing it
+        self._in_flight: Dict[str, str] = {}
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="report-job")
+        return self._executor
+
+    def submit(self, report: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Enqueue a report, reusing an identical in-flight job or a fresh stored result"""
+        if report not in _handlers:
+            raise KeyError(report)
+        params_hash = _hash({"report": report, "params": params})
+
+        with self._lock:
+            job_id = self._in_flight.get(params_hash)
+            if job_id is None:
+                now = time.time()
+                execute_update("DELETE FROM ReportJobs WHERE expires_at < ?", (now,))
+                cached = get_single_record(
+                    """
+                    SELECT job_id FROM ReportJobs
+                    WHERE params_hash = ? AND status = ? AND expires_at >= ?
+                    ORDER BY finished_at DESC LIMIT 1
+                    """,
+                    (params_hash, STATUS_DONE, now)
+                )
+                if cached:
+                    return self.get(cached["job_id"])
+
+                job_id = uuid.uuid4().hex
+                execute_insert(
+                    """
+                    INSERT INTO ReportJobs (job_id, report, params, params_hash, status, created_at, boot_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (job_id, report, json.dumps(params, sort_keys=True), params_hash, STATUS_QUEUED, now, BOOT_ID)
+                )
+                self._in_flight[params_hash] = job_id
+                self._pool().submit(self._run, job_id, report, params, params_hash)
+
+        return self.get(job_id)
+
+    def _run(self, job_id: str, report: str, params: Dict[str, Any], params_hash: str):
+        execute_update("UPDATE ReportJobs SET status = ? WHERE job_id = ?", (STATUS_RUNNING, job_id))
+        try:
+            result = _handlers[report](**params)
+            payload = json.dumps(result, default=str)
+            finished = time.time()
+            execute_update(
+                """
+                UPDATE ReportJobs
+                SET status = ?, result = ?, result_hash = ?, finished_at = ?, expires_at = ?
+                WHERE job_id = ?
+                """,
+                (STATUS_DONE, payload, hashlib.sha256(payload.encode()).hexdigest(),
+                 finished, finished + RESULT_TTL_SECONDS, job_id)
+            )
+        except Exception as e:
+            finished = time.time()
+            execute_update(
+                "UPDATE ReportJobs SET status = ?, error = ?, finished_at = ?, expires_at = ? WHERE job_id = ?",
+                (STATUS_FAILED, str(e), finished, finished + RESULT_TTL_SECONDS, job_id)
+            )
+        finally:
+            with self._lock:
+                self._in_flight.pop(params_hash, None)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job with its result once finished"""
+        row = get_single_record("SELECT * FROM ReportJobs WHERE job_id = ?", (job_id,))
+        return _row_to_job(row) if row else None
+
+    def shutdown(self):
+        """Stop accepting jobs and wait for the running ones"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+runner = JobRunner()
@@ -1,6 +1,28 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routes import colleges, students, events, registrations, attendance, feedback, reports
+from fastapi.responses import JSONResponse
+from admission import AdmissionControlMiddleware
+from profiler import ProfilerMiddleware
+import backup
+import coldstart
+import jobs
+import sketches
+from routes import colleges, students, events, registrations, attendance, feedback, reports, changes, admin
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Prepare support tables, start warming up and the backup schedule on startup, drain background work on shutdown"""
+    coldstart.init_schemas()
+    coldstart.load_openapi(app)
+    coldstart.warm_up.start(app)
+    backup.scheduler.start()
+    yield
+    backup.scheduler.shutdown()
+    jobs.runner.shutdown()
+    sketches.store.save()
+
 
 # Create FastAPI application
 app = FastAPI(
@@ -8,9 +30,16 @@ app = FastAPI(
     description="A comprehensive API for managing campus events, student registrations, attendance, and feedback",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
+# Profile requests picked by the X-Profile header or PROFILE_SAMPLE_RATE; innermost, so shed requests are not profiled
+app.add_middleware(ProfilerMiddleware)
+
+# Shed load before it reaches the routes; added before CORS so CORS headers still wrap 429/503 responses
+app.add_middleware(AdmissionControlMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -28,6 +57,8 @@ app.include_router(registrations.router)
 app.include_router(attendance.router)
 app.include_router(feedback.router)
 app.include_router(reports.router)
+app.include_router(changes.router)
+app.include_router(admin.router)
 
 
 @app.get("/")
@@ -45,14 +76,18 @@ async def root():
             "registrations": "/registrations",
             "attendance": "/attendance",
             "feedback": "/feedback",
-            "reports": "/reports"
+            "reports": "/reports",
+            "changes": "/changes",
+            "admin": "/admin"
         }
     }
 
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
+    """Health check endpoint, not ready until the warm-up has finished"""
+    if not coldstart.warm_up.ready:
+        return JSONResponse(status_code=503, content={"status": "warming", "message": "API is warming up"})
     return {"status": "healthy", "message": "API is running"}
 
 
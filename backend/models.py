@@ -38,6 +38,24 @@ class Student(StudentBase):
         from_attributes = True
 
 
+class StudentImportError(BaseModel):
+    row: int
+    email: Optional[str] = None
+    error: str
+
+
+class StudentImportResult(BaseModel):
+    total_rows: int
+    inserted: int
+    duplicates: int
+    failed: int
+    errors: List[StudentImportError]
+    errors_truncated: bool
+    stopped: bool = False  # The input became unreadable; rows after the last error were not read
+    elapsed_seconds: float
+    rows_per_second: Optional[float] = None
+
+
 # Event Models
 class EventBase(BaseModel):
     name: str
@@ -60,6 +78,18 @@ class Event(EventBase):
         from_attributes = True
 
 
+class ScheduledEvent(BaseModel):
+    registration_id: int
+    status: str
+    event_id: int
+    name: str
+    type: str
+    date: str
+    college_id: int
+    starts_at: str
+    ends_at: str
+
+
 # Registration Models
 class RegistrationBase(BaseModel):
     student_id: int
@@ -139,6 +169,32 @@ class TopStudentReport(BaseModel):
     participation_rate: float
 
 
+class EventRecommendation(BaseModel):
+    event_id: int
+    event_name: str
+    event_type: str
+    date: str
+    college_name: str
+    score: float  # Summed cosine similarity to the events the student attended
+    co_attendees: int
+
+
+class DistinctAttendeesReport(BaseModel):
+    group_id: int  # event_id or College_id, depending on group_by
+    name: str
+    distinct_attendees: int
+
+
+class EventRatingsReport(BaseModel):
+    event_id: int
+    event_name: str
+    feedback_count: int
+    average_rating: Optional[float] = None
+    p25_rating: Optional[int] = None
+    median_rating: Optional[int] = None
+    p75_rating: Optional[int] = None
+
+
 # Extended Models for detailed responses
 class StudentWithCollege(Student):
     college: College
@@ -159,3 +215,45 @@ class AttendanceWithDetails(Attendance):
 
 class FeedbackWithDetails(Feedback):
     registration: RegistrationWithDetails
+
+
+# Background report job models
+class ReportJobCreate(BaseModel):
+    report: str  # event-popularity, student-participation or top-students
+    college_id: Optional[int] = None
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+    include_archived: bool = False
+
+
+class ReportJob(BaseModel):
+    job_id: str
+    report: str
+    params: dict
+    status: str  # queued, running, done or failed (also when its worker stopped first, see error)
+    result: Optional[List[dict]] = None
+    result_hash: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float
+    finished_at: Optional[float] = None
+    expires_at: Optional[float] = None
+
+
+# Change feed models
+class ChangeRecord(BaseModel):
+    change_id: int
+    table: str
+    row_id: int
+    op: str  # insert, update or delete
+    data: Optional[dict] = None  # Row after the change, None for deletes
+    changed_at: str
+
+
+class ChangeFeed(BaseModel):
+    changes: List[ChangeRecord]
+    next_cursor: str
+    has_more: bool
+
+
+class ChangeCursor(BaseModel):
+    cursor: str
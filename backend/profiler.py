@@ -0,0 +1,210 @@
+"""Opt-in sampling profiler producing collapsed stacks for flame graphs.
+
+A sampler thread reads the stacks of the worker's threads with
+sys._current_frames() every PROFILE_INTERVAL_MS and counts them as
+collapsed stacks ("file:function;file:function count"), the input format
+of flamegraph.pl and speedscope. Threads parked in a wait (the idle event
+loop, idle threadpool workers) are skipped.
+
+Requests are profiled when they carry "X-Profile: <PROFILE_TOKEN>" or are
+picked at PROFILE_SAMPLE_RATE. Their stacks are kept per route, so short
+requests add up over many samples; the most recent profiles are kept in
+full. Other requests running at the same time show up in a profile too.
+With no token and a zero rate the middleware only checks two settings per
+request and no sampler thread runs.
+"""
+import asyncio
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Any, Dict, Optional
+
+
+# Fraction of requests profiled, 0 disables sampling
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+
+# Value of the X-Profile header that profiles a single request, unset disables the header
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+# Longest window the admin endpoint records
+MAX_CAPTURE_SECONDS = 60
+
+# Recent request profiles kept in full
+MAX_STORED_PROFILES = 50
+
+# Routes with aggregated stacks, least recently profiled are dropped first
+MAX_PROFILED_ROUTES = 200
+
+# Frames that, at the top of a stack, mean the thread is waiting: blocking waits in the
+# stdlib, or an event loop (uvloop runs its loop in C, under asyncio.run) with nothing to do
+_IDLE_MODULES = ("threading.py", "selectors.py", "queue.py")
+_IDLE_FUNCTIONS = {("runners.py", "run"), ("base_events.py", "run_forever")}
+
+_request_ids = itertools.count(1)
+
+
+def _label(code) -> str:
+    # Spaces separate the stack from its count in the collapsed format ("<frozen runpy>")
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}".replace(" ", "_")
+
+
+def _collapse(frame) -> Optional[str]:
+    """Stack of a frame as root-first labels joined by semicolons, None when the thread is idle"""
+    leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+    if leaf[0] in _IDLE_MODULES or leaf in _IDLE_FUNCTIONS:
+        return None
+    labels = []
+    while frame is not None:
+        labels.append(_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class Sampler:
+    """Background thread sampling every other thread's stack into a Counter"""
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000.0
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = _collapse(frame)
+                if stack:
+                    self.stacks[stack] += 1
+            self.samples += 1
+
+    def start(self) -> "Sampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+def to_collapsed(stacks: Counter) -> str:
+    """Collapsed-stack text, heaviest stacks first"""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+async def capture(seconds: float, interval_ms: float = PROFILE_INTERVAL_MS) -> Dict[str, Any]:
+    """Sample the whole worker for a time-boxed window while it keeps serving requests"""
+    sampler = Sampler(interval_ms).start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        stacks = await asyncio.to_thread(sampler.stop)
+    return {"seconds": seconds, "samples": sampler.samples, "collapsed": to_collapsed(stacks)}
+
+
+class ProfileStore:
+    """Recent request profiles and stacks aggregated per route"""
+
+    def __init__(self):
+        self.recent: "deque[Dict[str, Any]]" = deque(maxlen=MAX_STORED_PROFILES)
+        self.routes: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile: Dict[str, Any], stacks: Counter):
+        with self._lock:
+            self.recent.append({**profile, "stacks": stacks})
+            route = self.routes.get(profile["route"])
+            if route is None:
+                route = self.routes[profile["route"]] = {"requests": 0, "duration_ms": 0.0, "stacks": Counter()}
+                if len(self.routes) > MAX_PROFILED_ROUTES:
+                    self.routes.popitem(last=False)
+            else:
+                self.routes.move_to_end(profile["route"])
+            route["requests"] += 1
+            route["duration_ms"] += profile["duration_ms"]
+            route["stacks"].update(stacks)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sample_rate": PROFILE_SAMPLE_RATE,
+                "header_enabled": bool(PROFILE_TOKEN),
+                "interval_ms": PROFILE_INTERVAL_MS,
+                "recent": [{k: v for k, v in p.items() if k != "stacks"} for p in reversed(self.recent)],
+                "routes": {
+                    name: {
+                        "requests": route["requests"],
+                        "mean_duration_ms": round(route["duration_ms"] / route["requests"], 2),
+                        "samples": sum(route["stacks"].values()),
+                    }
+                    for name, route in self.routes.items()
+                },
+            }
+
+    def collapsed(self, profile_id: Optional[int] = None, route: Optional[str] = None) -> Optional[str]:
+        """Collapsed stacks of one request profile or of every profiled request of a route"""
+        with self._lock:
+            if profile_id is not None:
+                for profile in self.recent:
+                    if profile["profile_id"] == profile_id:
+                        return to_collapsed(profile["stacks"])
+                return None
+            entry = self.routes.get(route)
+            return to_collapsed(entry["stacks"]) if entry else None
+
+
+store = ProfileStore()
+
+
+def _should_profile(scope) -> bool:
+    if PROFILE_TOKEN:
+        for name, value in scope.get("headers", []):
+            if name == b"x-profile":
+                return value.decode("latin-1") == PROFILE_TOKEN
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+class ProfilerMiddleware:
+    """ASGI middleware profiling requests picked by header or sampling rate"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or (not PROFILE_TOKEN and PROFILE_SAMPLE_RATE <= 0)
+                or scope["path"].startswith("/admin") or not _should_profile(scope)):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = next(_request_ids)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", str(profile_id).encode())]
+            await send(message)
+
+        started = time.perf_counter()
+        sampler = Sampler().start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            duration_ms = round((time.perf_counter() - started) * 1000, 2)
+            stacks = await asyncio.to_thread(sampler.stop)
+            route = scope.get("route")
+            store.add({
+                "profile_id": profile_id,
+                "route": f"{scope['method']} {route.path if route else scope['path']}",
+                "path": scope["path"],
+                "duration_ms": duration_ms,
+                "samples": sampler.samples,
+            }, stacks)
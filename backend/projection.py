@@ -0,0 +1,180 @@
+"""Field selection, expansion and normalised responses for list endpoints.
+
+A Projection describes the rows of an endpoint: the columns of the row
+itself and the related objects that can be embedded in it. From the
+?fields= and ?expand= parameters it builds the SQL projection, selecting
+only the requested columns and joining only the tables they come from.
+
+- fields: comma-separated; "status" is a column of the row, "event.name" a
+  column of an embedded object (which expands it). Ids are always included.
+- expand: comma-separated relations to embed in full, e.g. "student,event".
+- With neither, every relation is embedded in full, as the endpoints
+  always did.
+
+In normalised mode, relations with a side table are not joined: rows keep
+the foreign id and each referenced object is fetched once, by id, into a
+side table keyed by id.
+"""
+from typing import Any, Dict, List, Optional
+
+from database import execute_query
+
+
+# Ids looked up per side table query
+SIDE_TABLE_BATCH = 500
+
+
+class Relation:
+    """An object embedded in each row, and how the base query reaches it"""
+
+    def __init__(self, path: str, key: str, columns: Dict[str, str], table: Optional[str] = None,
+                 foreign_key: Optional[str] = None, side_table: Optional[str] = None):
+        self.path = path              # "event", or "registration.event" for a nested object
+        self.key = key                # Field holding the object's id
+        self.columns = columns        # Field -> SQL expression
+        self.table = table            # "Events e", joined when expanded; None if the base query reads it already
+        self.foreign_key = foreign_key  # Expression of the base query that holds the id
+        self.side_table = side_table  # Name of the side table in normalised mode
+
+    @property
+    def parent(self) -> str:
+        return self.path.rpartition(".")[0]
+
+
+STUDENT_COLUMNS = {"student_id": "s.student_id", "name": "s.name", "email": "s.email", "college_id": "s.college_id"}
+
+EVENT_COLUMNS = {
+    "event_id": "e.event_id", "name": "e.name", "type": "e.type", "date": "e.date", "capacity": "e.capacity",
+    "description": "e.description", "college_id": "e.college_id", "created_by": "e.created_by",
+}
+
+REGISTRATION_COLUMNS = {
+    "registration_id": "r.registration_id", "student_id": "r.student_id", "event_id": "r.event_id",
+    "status": "r.status", "timestamp": "r.timestamp",
+}
+
+FIELDS_DESCRIPTION = ("Comma-separated fields to return, e.g. status,student.name; "
+                      "fields of a related object expand it. Ids are always included")
+EXPAND_DESCRIPTION = "Comma-separated related objects to embed in full; all of them when fields and expand are unset"
+NORMALIZED_DESCRIPTION = ("Return {items, students, events}: each referenced student and event once, "
+                          "keyed by id, instead of embedded in every row")
+
+
+def _split(value: Optional[str]) -> List[str]:
+    return [part.strip() for part in value.split(",") if part.strip()] if value else []
+
+
+class Projection:
+    """Builds and runs the query of a list endpoint for the requested fields and relations"""
+
+    def __init__(self, source: str, key: str, columns: Dict[str, str], relations: List[Relation]):
+        self.source = source      # FROM clause of the base query, with the joins it always needs
+        self.key = key
+        self.columns = columns
+        self.relations = {relation.path: relation for relation in relations}
+
+    def _columns(self, path: str) -> Dict[str, str]:
+        return self.columns if not path else self.relations[path].columns
+
+    def _key(self, path: str) -> str:
+        return self.key if not path else self.relations[path].key
+
+    def select(self, fields: Optional[str], expand: Optional[str]) -> Dict[str, List[str]]:
+        """Fields to return per path ("" is the row itself); raises ValueError for unknown names"""
+        requested: Dict[str, List[str]] = {}
+        for name in _split(fields):
+            path, _, field = name.rpartition(".")
+            requested.setdefault(path, []).append(field)
+        expanded = set(_split(expand)) if fields or expand is not None else set(self.relations)
+        expanded.update(path for path in requested if path)
+
+        unknown = sorted(path for path in expanded if path not in self.relations)
+        if unknown:
+            raise ValueError(f"Unknown relation(s) {', '.join(unknown)}; expected {', '.join(self.relations)}")
+        implied = set()
+        for path in list(expanded):
+            parent = self.relations[path].parent
+            while parent and parent not in expanded:
+                implied.add(parent)
+                parent = self.relations[parent].parent
+        expanded |= implied
+
+        selected = {}
+        for path in [""] + sorted(expanded, key=lambda path: path.count(".")):
+            columns, key = self._columns(path), self._key(path)
+            if path in requested:
+                unknown = [f"{path}.{f}" if path else f for f in requested[path] if f not in columns]
+                if unknown:
+                    raise ValueError(f"Unknown field(s) {', '.join(unknown)}")
+                selected[path] = [key] + [f for f in requested[path] if f != key]
+            elif fields and (not path or path in implied):
+                selected[path] = [key]  # Only on the way to a requested field
+            else:
+                selected[path] = list(columns)
+        return selected
+
+    def fetch(self, selected: Dict[str, List[str]], where: str, params: tuple, order_by: str,
+              normalized: bool = False, shard: Optional[int] = None, include_archive: bool = False) -> Any:
+        """Rows with the selected fields; in normalised mode {"items": rows, <side table>: {id: object}}"""
+        aliases: Dict[str, str] = {}
+        joins = []
+        side = [] if not normalized else [
+            self.relations[path] for path in selected if path and self.relations[path].side_table
+        ]
+        for path, names in selected.items():
+            relation = self.relations.get(path)
+            if relation in side:
+                # Only the id, from the object that references it
+                prefix = f"{relation.parent}." if relation.parent else ""
+                aliases[prefix + relation.key] = relation.foreign_key
+                continue
+            prefix = f"{path}." if path else ""
+            columns = self._columns(path)
+            aliases.update((prefix + name, columns[name]) for name in names)
+            if relation and relation.table:
+                joins.append(f"JOIN {relation.table} ON {relation.columns[relation.key]} = {relation.foreign_key}")
+
+        projection = ", ".join(f'{expression} AS "{alias}"' for alias, expression in aliases.items())
+        query = f"SELECT {projection} FROM {self.source} {' '.join(joins)} WHERE {where} ORDER BY {order_by}"
+        rows = [_nest(row) for row in execute_query(query, params, include_archive, shard)]
+        if not normalized:
+            return rows
+
+        result: Dict[str, Any] = {"items": rows}
+        for relation in side:
+            ids = {_lookup(row, relation.parent)[relation.key] for row in rows}
+            result[relation.side_table] = self._side_table(relation, selected[relation.path], ids)
+        return result
+
+    def _side_table(self, relation: Relation, names: List[str], ids: set) -> Dict[str, Dict[str, Any]]:
+        """Each referenced object once, keyed by id; dimension tables are read from the main database"""
+        projection = ", ".join(f'{relation.columns[name]} AS "{name}"' for name in names)
+        ids = sorted(i for i in ids if i is not None)
+        objects = {}
+        for start in range(0, len(ids), SIDE_TABLE_BATCH):
+            batch = ids[start:start + SIDE_TABLE_BATCH]
+            placeholders = ", ".join("?" * len(batch))
+            for row in execute_query(
+                f"SELECT {projection} FROM {relation.table} WHERE {relation.columns[relation.key]} IN ({placeholders})",
+                tuple(batch)
+            ):
+                objects[str(row[relation.key])] = row
+        return objects
+
+
+def _nest(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn "event.name" style aliases into nested objects"""
+    nested: Dict[str, Any] = {}
+    for alias, value in row.items():
+        target = nested
+        *path, field = alias.split(".")
+        for part in path:
+            target = target.setdefault(part, {})
+        target[field] = value
+    return nested
+
+
+def _lookup(row: Dict[str, Any], path: str) -> Dict[str, Any]:
+    for part in path.split(".") if path else ():
+        row = row[part]
+    return row
@@ -0,0 +1,183 @@
+"""Event recommendations from a sparse event-by-event co-attendance matrix.
+
+pairs[e][f] is the number of students who attended both e and f, stored
+in both directions so an event's neighbours are a single lookup. The
+matrix is built in bulk on first use (archived attendance included) and
+then kept current: mark_attendance adds each new attendance right away,
+and every read first picks up attendance rows written by other workers
+since the last one (per shard when sharding is enabled). Adding an
+attendance the matrix already holds is a no-op, so both paths may see the
+same row.
+
+A student is recommended the events they have not registered for, scored
+by the cosine similarity of each event to the events they attended:
+
+    score(f) = sum over attended e of pairs[e][f] / sqrt(attendees[e] * attendees[f])
+"""
+import heapq
+import math
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import database
+from sharding import SHARDING_ENABLED, fan_out, query_all
+
+
+# Attendance rows read per query while catching up
+REFRESH_BATCH = 50000
+
+_ATTENDANCE = """
+SELECT a.attendance_id, r.student_id, r.event_id
+FROM Attendance a
+JOIN Registrations r ON r.registration_id = a.registration_id
+WHERE a.attended = 1 AND r.status = 'Registered' AND a.attendance_id > ?
+ORDER BY a.attendance_id
+"""
+
+
+def _source_name(shard: Optional[int]) -> str:
+    return "main" if shard is None else str(shard)
+
+
+class CoAttendanceMatrix:
+    """Co-attendance counts per event pair and the events each student attended"""
+
+    def __init__(self):
+        self.pairs: Dict[int, Dict[int, int]] = {}
+        self.attendees: Dict[int, int] = {}
+        # Student -> attended events; lists, a set per student costs five times the memory
+        self.attended: Dict[int, List[int]] = {}
+        # Source ("main" or a shard's college id) -> last attendance id included
+        self.watermarks: Dict[str, int] = {}
+        self.built = False
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def _add(self, student_id: int, event_id: int):
+        events = self.attended.setdefault(student_id, [])
+        if event_id in events:
+            return
+        row = self.pairs.setdefault(event_id, {})
+        for other in events:
+            row[other] = row.get(other, 0) + 1
+            other_row = self.pairs.setdefault(other, {})
+            other_row[event_id] = other_row.get(event_id, 0) + 1
+        events.append(event_id)
+        self.attendees[event_id] = self.attendees.get(event_id, 0) + 1
+
+    def add_attendance(self, student_id: int, event_id: int):
+        """Count a new attendance; before the first build it is picked up by the build instead"""
+        with self._lock:
+            if self.built:
+                self._add(student_id, event_id)
+
+    def _read(self, shard: Optional[int], after: int, include_archive: bool = False,
+              limit: Optional[int] = REFRESH_BATCH) -> List[Tuple[int, int, int]]:
+        query = _ATTENDANCE + (" LIMIT ?" if limit else "")
+        params = (after, limit) if limit else (after,)
+        with database.get_db_connection(include_archive, shard) as conn:
+            return conn.execute(query, params).fetchall()
+
+    def build(self):
+        """Count every attendance, archives included, replacing the current counts"""
+        def read(shard):
+            return shard, self._read(shard, 0, include_archive=not SHARDING_ENABLED, limit=None)
+
+        attended: Dict[int, List[int]] = {}
+        watermarks = {}
+        for shard, rows in fan_out(read):
+            for attendance_id, student_id, event_id in rows:
+                attended.setdefault(student_id, []).append(event_id)
+            watermarks[_source_name(shard)] = rows[-1][0] if rows else 0
+
+        # Count each pair once in one direction, then mirror it
+        pairs: Dict[int, Dict[int, int]] = {}
+        attendees: Dict[int, int] = {}
+        for student_id, events in attended.items():
+            ordered = attended[student_id] = sorted(set(events))
+            for i, event_id in enumerate(ordered):
+                attendees[event_id] = attendees.get(event_id, 0) + 1
+                row = pairs.setdefault(event_id, {})
+                for other in ordered[i + 1:]:
+                    row[other] = row.get(other, 0) + 1
+        for event_id, row in list(pairs.items()):
+            for other, count in row.items():
+                if other > event_id:
+                    pairs.setdefault(other, {})[event_id] = count
+
+        with self._lock:
+            self.pairs, self.attendees, self.attended = pairs, attendees, attended
+            self.watermarks = watermarks
+            self.built = True
+
+    def refresh(self):
+        """Build on first use, then add the attendance rows written since the last refresh"""
+        if not self.built:
+            with self._build_lock:
+                if not self.built:
+                    self.build()
+            return
+
+        def read(shard):
+            return shard, self._read(shard, self.watermarks.get(_source_name(shard), 0))
+
+        while True:
+            batches = fan_out(read)
+            with self._lock:
+                for shard, rows in batches:
+                    for attendance_id, student_id, event_id in rows:
+                        self._add(student_id, event_id)
+                    if rows:
+                        self.watermarks[_source_name(shard)] = rows[-1][0]
+            if all(len(rows) < REFRESH_BATCH for _, rows in batches):
+                return
+
+    def recommend(self, student_id: int, k: int, exclude: Set[int]) -> List[Tuple[int, float, int]]:
+        """Top k (event_id, score, co-attendance count) for a student, skipping the excluded events"""
+        self.refresh()
+        scores: Dict[int, float] = {}
+        counts: Dict[int, int] = {}
+        with self._lock:
+            attended = set(self.attended.get(student_id, ()))
+            for event_id in attended:
+                size = self.attendees[event_id]
+                for other, count in self.pairs.get(event_id, {}).items():
+                    if other in attended or other in exclude:
+                        continue
+                    scores[other] = scores.get(other, 0.0) + count / math.sqrt(size * self.attendees[other])
+                    counts[other] = counts.get(other, 0) + count
+        best = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(event_id, score, counts[event_id]) for event_id, score in best]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "events": len(self.attendees),
+                "students": len(self.attended),
+                "pairs": sum(len(row) for row in self.pairs.values()) // 2,
+            }
+
+
+matrix = CoAttendanceMatrix()
+
+
+def recommend_events(student_id: int, k: int = 10) -> List[Dict[str, Any]]:
+    """Events recommended to a student, best first"""
+    registered = {row["event_id"] for row in query_all(
+        "SELECT event_id FROM Registrations WHERE student_id = ?", (student_id,)
+    )}
+    ranked = matrix.recommend(student_id, k, registered)
+    if not ranked:
+        return []
+    placeholders = ", ".join("?" * len(ranked))
+    events = {row["event_id"]: row for row in database.execute_query(f"""
+    SELECT e.event_id, e.name as event_name, e.type as event_type, e.date, c.name as college_name
+    FROM Events e
+    JOIN Colleges c ON e.college_id = c.College_id
+    WHERE e.event_id IN ({placeholders})
+    """, tuple(event_id for event_id, _, _ in ranked))}
+    return [
+        {**events[event_id], "score": round(score, 4), "co_attendees": count}
+        for event_id, score, count in ranked
+        if event_id in events
+    ]
@@ -0,0 +1,113 @@
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from admission import controller
+import backup
+from changes import compact
+from coalescing import flight
+from coldstart import warm_up
+import profiler
+import snapshot
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.get("/admission")
+async def get_admission_stats():
+    """Get in-flight load and admitted/shed request counters per priority lane"""
+    return controller.stats()
+
+
+@router.get("/coalescing")
+async def get_coalescing_stats():
+    """Get how many reads ran a query and how many shared an identical in-flight one"""
+    return flight.stats()
+
+
+@router.get("/warmup")
+async def get_warmup_status():
+    """Get whether the warm-up has finished and how long each step took"""
+    return warm_up.status()
+
+
+@router.post("/changes/compact")
+async def compact_changes():
+    """Drop superseded change feed entries and expired delete tombstones now"""
+    try:
+        return compact()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@router.post("/snapshot")
+def export_snapshot(full: bool = Query(False, description="Rewrite the snapshot instead of appending new rows")):
+    """Write the rows added since the last columnar snapshot to SNAPSHOT_DIR"""
+    try:
+        return {"rows_written": snapshot.export(full=full)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@router.get("/backups")
+async def get_backups():
+    """Get the backup schedule, the backup in progress and the backups kept"""
+    return {**backup.scheduler.status(), "backups": backup.list_backups()}
+
+
+@router.post("/backups", status_code=202)
+async def create_backup():
+    """Start a backup of every database file in the background"""
+    try:
+        return backup.scheduler.trigger()
+    except backup.BackupBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/backups/{name}")
+async def get_backup(name: str):
+    """Get the manifest of a backup: its files, how each was copied and the last verification"""
+    manifest = backup.get_backup(name)
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="Backup not found")
+    return manifest
+
+
+@router.post("/backups/{name}/verify")
+def verify_backup(name: str):
+    """Restore a backup into a scratch directory and check its integrity and row counts"""
+    try:
+        return backup.verify_backup(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Backup not found")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@router.post("/profile", response_class=PlainTextResponse)
+async def capture_profile(
+    seconds: float = Query(10, gt=0, le=profiler.MAX_CAPTURE_SECONDS, description="Length of the recording window"),
+    interval_ms: float = Query(profiler.PROFILE_INTERVAL_MS, ge=1, le=1000, description="Time between samples")
+):
+    """Sample every thread of this worker for a time-boxed window and return collapsed stacks"""
+    result = await profiler.capture(seconds, interval_ms)
+    return PlainTextResponse(result["collapsed"], headers={"X-Profile-Samples": str(result["samples"])})
+
+
+@router.get("/profiles")
+async def get_profiles():
+    """Get the profiler settings, the recently profiled requests and the profiled routes"""
+    return profiler.store.summary()
+
+
+@router.get("/profiles/stacks", response_class=PlainTextResponse)
+async def get_profile_stacks(
+    profile_id: Optional[int] = Query(None, description="A profiled request, from its X-Profile-Id header"),
+    route: Optional[str] = Query(None, description="All profiled requests of a route, e.g. 'GET /events/{event_id}'")
+):
+    """Get collapsed stacks of a profiled request or of a route"""
+    if (profile_id is None) == (route is None):
+        raise HTTPException(status_code=400, detail="Give exactly one of profile_id or route")
+    collapsed = profiler.store.collapsed(profile_id, route)
+    if collapsed is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(collapsed)
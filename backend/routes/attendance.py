@@ -1,10 +1,13 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from typing import List
 from models import Attendance, AttendanceCreate, AttendanceWithDetails
 from database import (
     execute_query, execute_insert, check_record_exists,
     get_attendance_count_for_event
 )
+from archive import event_source
+from sharding import shard_for_registration
+from recommendations import matrix as recommendations
 
 router = APIRouter(prefix="/attendance", tags=["attendance"])
 
@@ -13,14 +16,21 @@ router = APIRouter(prefix="/attendance", tags=["attendance"])
 async def mark_attendance(attendance: AttendanceCreate):
     """Mark attendance for a registration"""
     try:
+        # Attendance lives in the shard of the registration (the main database when unsharded)
+        shard = shard_for_registration(attendance.registration_id)
+        
         # Check if registration exists
-        if not check_record_exists("Registrations", "registration_id", attendance.registration_id):
+        registration = execute_query(
+            "SELECT student_id, event_id, status FROM Registrations WHERE registration_id = ?",
+            (attendance.registration_id,), shard=shard
+        )
+        if not registration:
             raise HTTPException(status_code=400, detail="Registration not found")
         
         # Check if attendance already exists for this registration
         existing_attendance = execute_query(
             "SELECT attendance_id FROM Attendance WHERE registration_id = ?",
-            (attendance.registration_id,)
+            (attendance.registration_id,), shard=shard
         )
         if existing_attendance:
             raise HTTPException(status_code=400, detail="Attendance already marked for this registration")
@@ -29,11 +39,13 @@ async def mark_attendance(attendance: AttendanceCreate):
         INSERT INTO Attendance (registration_id, attended, timestamp)
         VALUES (?, ?, datetime('now'))
         """
-        attendance_id = execute_insert(query, (attendance.registration_id, attendance.attended))
+        attendance_id = execute_insert(query, (attendance.registration_id, attendance.attended), shard)
+        if attendance.attended == 1 and registration[0]["status"] == "Registered":
+            recommendations.add_attendance(registration[0]["student_id"], registration[0]["event_id"])
         
         # Return the created attendance record
         created_attendance = execute_query(
-            "SELECT * FROM Attendance WHERE attendance_id = ?", (attendance_id,)
+            "SELECT * FROM Attendance WHERE attendance_id = ?", (attendance_id,), shard=shard
         )
         return created_attendance[0]
     except HTTPException:
@@ -43,7 +55,10 @@ async def mark_attendance(attendance: AttendanceCreate):
 
 
 @router.get("/event/{event_id}")
-async def get_event_attendance_report(event_id: int):
+def get_event_attendance_report(
+    event_id: int,
+    include_archived: bool = Query(False, description="Include rows of archived past events")
+):
     """Get attendance report for an event"""
     try:
         # Check if event exists
@@ -65,15 +80,16 @@ async def get_event_attendance_report(event_id: int):
         WHERE r.event_id = ?
         ORDER BY a.timestamp ASC
         """
-        attendance_records = execute_query(query, (event_id,))
+        include_archive, shard = event_source(event_id, include_archived)
+        attendance_records = execute_query(query, (event_id,), include_archive, shard)
         
         # Get total registrations and attendance count
         total_registrations = execute_query(
             "SELECT COUNT(*) as count FROM Registrations WHERE event_id = ? AND status = 'Registered'",
-            (event_id,)
+            (event_id,), include_archive, shard
         )[0]['count']
         
-        total_attendance = get_attendance_count_for_event(event_id)
+        total_attendance = get_attendance_count_for_event(event_id, include_archived)
         attendance_rate = (total_attendance / total_registrations * 100) if total_registrations > 0 else 0
         
         return {
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from models import ChangeFeed, ChangeCursor
+from changes import read_changes, head_cursor, CursorExpired
+
+router = APIRouter(prefix="/changes", tags=["changes"])
+
+
+@router.get("/", response_model=ChangeFeed)
+async def get_changes(
+    since: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous call"),
+    limit: int = Query(500, ge=1, le=5000, description="Maximum number of changes to return")
+):
+    """Get the changes made after a cursor, oldest first"""
+    try:
+        try:
+            return read_changes(since, limit)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    except CursorExpired as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@router.get("/cursor", response_model=ChangeCursor)
+async def get_head_cursor():
+    """Get a cursor at the latest change, taken before a full sync to follow the feed from there"""
+    try:
+        return {"cursor": head_cursor()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
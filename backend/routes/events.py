@@ -5,6 +5,7 @@ from database import (
     execute_query, execute_insert, get_event_by_id, 
     get_event_with_college, check_record_exists
 )
+from schedule import index_event
 
 router = APIRouter(prefix="/events", tags=["events"])
 
@@ -38,7 +39,7 @@ async def get_events(college_id: Optional[int] = Query(None, description="Filter
 
 
 @router.get("/{event_id}", response_model=Event)
-async def get_event(event_id: int):
+def get_event(event_id: int):
     """Get a specific event by ID"""
     try:
         event = get_event_by_id(event_id)
@@ -67,6 +68,7 @@ async def create_event(event: EventCreate):
             event.name, event.type, event.date, event.capacity,
             event.description, event.college_id, event.created_by
         ))
+        index_event(event_id, event.date)
         
         # Return the created event
         created_event = get_event_by_id(event_id)
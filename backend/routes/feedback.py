@@ -1,23 +1,46 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse
+from typing import List, Optional
 from models import Feedback, FeedbackCreate, FeedbackWithDetails
 from database import execute_query, execute_insert, check_record_exists
+from projection import (
+    Projection, Relation, STUDENT_COLUMNS, EVENT_COLUMNS, REGISTRATION_COLUMNS,
+    FIELDS_DESCRIPTION, EXPAND_DESCRIPTION, NORMALIZED_DESCRIPTION
+)
+from archive import event_source
+from sharding import shard_for_registration
 
 router = APIRouter(prefix="/feedback", tags=["feedback"])
 
+EVENT_FEEDBACK = Projection(
+    "Feedback f JOIN Registrations r ON f.registration_id = r.registration_id", "feedback_id",
+    {"feedback_id": "f.feedback_id", "registration_id": "f.registration_id",
+     "rating": "CAST(f.rating AS INTEGER)", "comment": "f.comment"},
+    [
+        # Read by the base query already, the event filter needs it
+        Relation("registration", "registration_id", REGISTRATION_COLUMNS),
+        Relation("registration.student", "student_id", STUDENT_COLUMNS, "Students s", "r.student_id",
+                 side_table="students"),
+        Relation("registration.event", "event_id", EVENT_COLUMNS, "Events e", "r.event_id", side_table="events"),
+    ]
+)
+
 
 @router.post("/", response_model=Feedback)
 async def submit_feedback(feedback: FeedbackCreate):
     """Submit feedback for an event (via registration_id)"""
     try:
+        # Feedback lives in the shard of the registration (the main database when unsharded)
+        shard = shard_for_registration(feedback.registration_id)
+        
         # Check if registration exists
-        if not check_record_exists("Registrations", "registration_id", feedback.registration_id):
+        if not check_record_exists("Registrations", "registration_id", feedback.registration_id, shard):
             raise HTTPException(status_code=400, detail="Registration not found")
         
         # Check if feedback already exists for this registration
         existing_feedback = execute_query(
             "SELECT feedback_id FROM Feedback WHERE registration_id = ?",
-            (feedback.registration_id,)
+            (feedback.registration_id,), shard=shard
         )
         if existing_feedback:
             raise HTTPException(status_code=400, detail="Feedback already submitted for this registration")
@@ -32,11 +55,11 @@ async def submit_feedback(feedback: FeedbackCreate):
         """
         feedback_id = execute_insert(query, (
             feedback.registration_id, feedback.rating, feedback.comment
-        ))
+        ), shard)
         
         # Return the created feedback
         created_feedback = execute_query(
-            "SELECT * FROM Feedback WHERE feedback_id = ?", (feedback_id,)
+            "SELECT * FROM Feedback WHERE feedback_id = ?", (feedback_id,), shard=shard
         )
         return created_feedback[0]
     except HTTPException:
@@ -46,62 +69,30 @@ async def submit_feedback(feedback: FeedbackCreate):
 
 
 @router.get("/event/{event_id}", response_model=List[FeedbackWithDetails])
-async def get_event_feedback(event_id: int):
+async def get_event_feedback(
+    event_id: int,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+    normalized: bool = Query(False, description=NORMALIZED_DESCRIPTION),
+    include_archived: bool = Query(False, description="Include rows of archived past events")
+):
     """Get all feedback for an event"""
     try:
         # Check if event exists
         if not check_record_exists("Events", "event_id", event_id):
             raise HTTPException(status_code=404, detail="Event not found")
-        
-        query = """
-        SELECT f.*, r.student_id, r.event_id, r.status as registration_status, r.timestamp as registration_timestamp,
-               s.name as student_name, s.email as student_email, s.college_id as student_college_id,
-               e.name as event_name, e.type as event_type, e.date as event_date, e.capacity, e.description, e.college_id as event_college_id, e.created_by,
-               c.name as college_name
-        FROM Feedback f
-        JOIN Registrations r ON f.registration_id = r.registration_id
-        JOIN Students s ON r.student_id = s.student_id
-        JOIN Events e ON r.event_id = e.event_id
-        JOIN Colleges c ON s.college_id = c.College_id
-        WHERE r.event_id = ?
-        ORDER BY f.feedback_id DESC
-        """
-        feedback_records = execute_query(query, (event_id,))
-        
-        # Transform the data to match the response model
-        result = []
-        for feedback in feedback_records:
-            result.append({
-                "feedback_id": feedback["feedback_id"],
-                "registration_id": feedback["registration_id"],
-                "rating": feedback["rating"],
-                "comment": feedback["comment"],
-                "registration": {
-                    "registration_id": feedback["registration_id"],
-                    "student_id": feedback["student_id"],
-                    "event_id": feedback["event_id"],
-                    "status": feedback["registration_status"],
-                    "timestamp": feedback["registration_timestamp"],
-                    "student": {
-                        "student_id": feedback["student_id"],
-                        "name": feedback["student_name"],
-                        "email": feedback["student_email"],
-                        "college_id": feedback["student_college_id"]
-                    },
-                    "event": {
-                        "event_id": feedback["event_id"],
-                        "name": feedback["event_name"],
-                        "type": feedback["event_type"],
-                        "date": feedback["event_date"],
-                        "capacity": feedback["capacity"],
-                        "description": feedback["description"],
-                        "college_id": feedback["event_college_id"],
-                        "created_by": feedback["created_by"]
-                    }
-                }
-            })
-        
-        return result
+
+        try:
+            selected = EVENT_FEEDBACK.select(fields, expand)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        include_archive, shard = event_source(event_id, include_archived)
+        result = EVENT_FEEDBACK.fetch(selected, "r.event_id = ?", (event_id,), "f.feedback_id DESC",
+                                      normalized, shard=shard, include_archive=include_archive)
+        if fields is None and expand is None and not normalized:
+            return result
+        # Partial rows and side tables do not fit the response model
+        return JSONResponse(result)
     except HTTPException:
         raise
     except Exception as e:
@@ -1,17 +1,30 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import JSONResponse
+from typing import List, Optional
 from models import Registration, RegistrationCreate, RegistrationWithDetails
 from database import (
     execute_query, execute_insert, get_registration_by_id,
     get_registration_with_details, check_record_exists,
     get_registration_count_for_event
 )
+from projection import (
+    Projection, Relation, STUDENT_COLUMNS, EVENT_COLUMNS, REGISTRATION_COLUMNS,
+    FIELDS_DESCRIPTION, EXPAND_DESCRIPTION, NORMALIZED_DESCRIPTION
+)
+from archive import event_source
+from schedule import index as schedule_index
+from sharding import shard_for_event, query_all
 
 router = APIRouter(prefix="/registrations", tags=["registrations"])
 
+EVENT_REGISTRATIONS = Projection("Registrations r", "registration_id", REGISTRATION_COLUMNS, [
+    Relation("student", "student_id", STUDENT_COLUMNS, "Students s", "r.student_id", side_table="students"),
+    Relation("event", "event_id", EVENT_COLUMNS, "Events e", "r.event_id", side_table="events"),
+])
+
 
 @router.post("/", response_model=Registration)
-async def create_registration(registration: RegistrationCreate):
+async def create_registration(registration: RegistrationCreate, response: Response):
     """Register a student for an event"""
     try:
         # Check if student exists
@@ -22,14 +35,25 @@ async def create_registration(registration: RegistrationCreate):
         if not check_record_exists("Events", "event_id", registration.event_id):
             raise HTTPException(status_code=400, detail="Event not found")
         
+        # Registrations live in the shard of the event's college (the main database when unsharded)
+        shard = shard_for_event(registration.event_id)
+        
         # Check if student is already registered for this event
         existing_registration = execute_query(
             "SELECT registration_id FROM Registrations WHERE student_id = ? AND event_id = ?",
-            (registration.student_id, registration.event_id)
+            (registration.student_id, registration.event_id), shard=shard
         )
         if existing_registration:
             raise HTTPException(status_code=400, detail="Student already registered for this event")
         
+        # Check the event does not overlap another event the student is registered for
+        clashes, possible_clashes = schedule_index.find_clashes(registration.student_id, registration.event_id)
+        if clashes:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Registration clashes with event(s) {', '.join(map(str, clashes))}"
+            )
+        
         # Get event capacity and current registrations
         event = execute_query("SELECT capacity FROM Events WHERE event_id = ?", (registration.event_id,))
         if not event:
@@ -47,7 +71,13 @@ async def create_registration(registration: RegistrationCreate):
         """
         registration_id = execute_insert(query, (
             registration.student_id, registration.event_id, status
-        ))
+        ), shard)
+        schedule_index.add_registration(registration.student_id, registration.event_id, status)
+        if possible_clashes:
+            # Whole-day events have no time, so the overlap may not be a real clash
+            response.headers["X-Schedule-Warning"] = (
+                f"Same day as whole-day event(s) {', '.join(map(str, possible_clashes))}"
+            )
         
         # Return the created registration
         created_registration = get_registration_by_id(registration_id)
@@ -77,7 +107,8 @@ async def get_student_registrations(student_id: int):
         WHERE r.student_id = ?
         ORDER BY r.timestamp DESC
         """
-        registrations = execute_query(query, (student_id,))
+        # A student's registrations can be in every college's shard
+        registrations = query_all(query, (student_id,), order_by="timestamp", reverse=True)
         
         # Transform the data to match the response model
         result = []
@@ -114,54 +145,30 @@ async def get_student_registrations(student_id: int):
 
 
 @router.get("/event/{event_id}", response_model=List[RegistrationWithDetails])
-async def get_event_registrations(event_id: int):
+async def get_event_registrations(
+    event_id: int,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    expand: Optional[str] = Query(None, description=EXPAND_DESCRIPTION),
+    normalized: bool = Query(False, description=NORMALIZED_DESCRIPTION),
+    include_archived: bool = Query(False, description="Include rows of archived past events")
+):
     """Get all students registered for an event"""
     try:
         # Check if event exists
         if not check_record_exists("Events", "event_id", event_id):
             raise HTTPException(status_code=404, detail="Event not found")
-        
-        query = """
-        SELECT r.*, s.name as student_name, s.email as student_email, s.college_id as student_college_id,
-               e.name as event_name, e.type as event_type, e.date as event_date, e.capacity, e.description, e.college_id as event_college_id, e.created_by,
-               c.name as college_name
-        FROM Registrations r
-        JOIN Students s ON r.student_id = s.student_id
-        JOIN Events e ON r.event_id = e.event_id
-        JOIN Colleges c ON s.college_id = c.College_id
-        WHERE r.event_id = ?
-        ORDER BY r.timestamp ASC
-        """
-        registrations = execute_query(query, (event_id,))
-        
-        # Transform the data to match the response model
-        result = []
-        for reg in registrations:
-            result.append({
-                "registration_id": reg["registration_id"],
-                "student_id": reg["student_id"],
-                "event_id": reg["event_id"],
-                "status": reg["status"],
-                "timestamp": reg["timestamp"],
-                "student": {
-                    "student_id": reg["student_id"],
-                    "name": reg["student_name"],
-                    "email": reg["student_email"],
-                    "college_id": reg["student_college_id"]
-                },
-                "event": {
-                    "event_id": reg["event_id"],
-                    "name": reg["event_name"],
-                    "type": reg["event_type"],
-                    "date": reg["event_date"],
-                    "capacity": reg["capacity"],
-                    "description": reg["description"],
-                    "college_id": reg["event_college_id"],
-                    "created_by": reg["created_by"]
-                }
-            })
-        
-        return result
+
+        try:
+            selected = EVENT_REGISTRATIONS.select(fields, expand)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        include_archive, shard = event_source(event_id, include_archived)
+        result = EVENT_REGISTRATIONS.fetch(selected, "r.event_id = ?", (event_id,), "r.timestamp ASC",
+                                           normalized, shard=shard, include_archive=include_archive)
+        if fields is None and expand is None and not normalized:
+            return result
+        # Partial rows and side tables do not fit the response model
+        return JSONResponse(result)
     except HTTPException:
         raise
     except Exception as e:
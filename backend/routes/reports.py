@@ -1,26 +1,319 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from models import EventPopularityReport, StudentParticipationReport, TopStudentReport
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse
+from typing import List, Optional, Dict, Any
+from models import (
+    EventPopularityReport, StudentParticipationReport, TopStudentReport,
+    DistinctAttendeesReport, EventRatingsReport, ReportJobCreate, ReportJob
+)
 from database import execute_query
+from jobs import runner, register_report, available_reports
+from sharding import SHARDING_ENABLED, fan_out, merge_counts
+from sketches import store as sketch_store, RatingHistogram
 
 router = APIRouter(prefix="/reports", tags=["reports"])
 
+APPROX_DESCRIPTION = ("Answer from sketches instead of the tables: fast at any size, "
+                      "returns {approximate, confidence, rows} with error bounds per row")
+
+
+def _event_filter(alias: str, college_id: Optional[int], date_from: Optional[str],
+                  date_to: Optional[str]) -> tuple:
+    """Build SQL conditions (and params) restricting events by college and date range"""
+    conditions = []
+    params = []
+    if college_id is not None:
+        conditions.append(f"{alias}.college_id = ?")
+        params.append(college_id)
+    if date_from:
+        conditions.append(f"{alias}.date >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append(f"{alias}.date <= ?")
+        params.append(date_to)
+    return conditions, params
+
+
+ARCHIVED_UNSHARDED = "include_archived is not available while sharding is enabled"
+
+
+def _check_archived(include_archived: bool):
+    """Archived rows are only read alongside the main database, not the shards"""
+    if include_archived and SHARDING_ENABLED:
+        raise HTTPException(status_code=400, detail=ARCHIVED_UNSHARDED)
+
+
+def _run_on_shards(query: str, params: tuple, include_archived: bool) -> List[List[Dict[str, Any]]]:
+    """Per-shard partial results of a report query, in parallel (a single partial when unsharded)"""
+    return fan_out(lambda shard: execute_query(query, params, include_archive=include_archived, shard=shard))
+
+
+def compute_event_popularity(college_id: Optional[int] = None, date_from: Optional[str] = None,
+                             date_to: Optional[str] = None, include_archived: bool = False) -> List[Dict[str, Any]]:
+    """Events ordered by number of registrations"""
+    conditions, params = _event_filter("e", college_id, date_from, date_to)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"""
+    SELECT e.event_id, e.name as event_name, c.name as college_name,
+           COUNT(r.registration_id) as registration_count
+    FROM Events e
+    JOIN Colleges c ON e.college_id = c.College_id
+    LEFT JOIN Registrations r ON e.event_id = r.event_id AND r.status = 'Registered'
+    {where}
+    GROUP BY e.event_id, e.name, c.name
+    ORDER BY registration_count DESC, e.name ASC
+    """
+    if not SHARDING_ENABLED:
+        return execute_query(query, tuple(params), include_archive=include_archived)
+    # Every shard lists all events with the counts of its own registrations
+    merged = merge_counts(_run_on_shards(query, tuple(params), include_archived), "event_id", ["registration_count"])
+    return sorted(merged, key=lambda row: (-row["registration_count"], row["event_name"]))
+
+
+def _student_filters(college_id: Optional[int], date_from: Optional[str],
+                     date_to: Optional[str]) -> tuple:
+    """Student-side WHERE clause and the registration join restricted to events in the date range"""
+    where, where_params = "", []
+    if college_id is not None:
+        where, where_params = "WHERE s.college_id = ?", [college_id]
+    conditions, join_params = _event_filter("ev", None, date_from, date_to)
+    event_join = ""
+    if conditions:
+        event_join = f"AND r.event_id IN (SELECT ev.event_id FROM Events ev WHERE {' AND '.join(conditions)})"
+    return where, where_params, event_join, join_params
+
+
+def compute_student_participation(college_id: Optional[int] = None, date_from: Optional[str] = None,
+                                  date_to: Optional[str] = None, include_archived: bool = False) -> List[Dict[str, Any]]:
+    """Number of events each student attended"""
+    where, where_params, event_join, join_params = _student_filters(college_id, date_from, date_to)
+    query = f"""
+    SELECT s.student_id, s.name as student_name, c.name as college_name,
+           COUNT(a.attendance_id) as events_attended
+    FROM Students s
+    JOIN Colleges c ON s.college_id = c.College_id
+    LEFT JOIN Registrations r ON s.student_id = r.student_id {event_join}
+    LEFT JOIN Attendance a ON r.registration_id = a.registration_id AND a.attended = 1
+    {where}
+    GROUP BY s.student_id, s.name, c.name
+    ORDER BY events_attended DESC, s.name ASC
+    """
+    if not SHARDING_ENABLED:
+        return execute_query(query, tuple(join_params + where_params), include_archive=include_archived)
+    merged = merge_counts(
+        _run_on_shards(query, tuple(join_params + where_params), include_archived), "student_id", ["events_attended"]
+    )
+    return sorted(merged, key=lambda row: (-row["events_attended"], row["student_name"]))
+
+
+def compute_top_students(college_id: Optional[int] = None, date_from: Optional[str] = None,
+                         date_to: Optional[str] = None, include_archived: bool = False, limit: int = 3) -> List[Dict[str, Any]]:
+    """Most active students by attendance and participation rate"""
+    where, where_params, event_join, join_params = _student_filters(college_id, date_from, date_to)
+    query = f"""
+    SELECT s.student_id, s.name as student_name, c.name as college_name,
+           COUNT(DISTINCT r.event_id) as total_events,
+           COUNT(a.attendance_id) as events_attended,
+           CASE
+               WHEN COUNT(DISTINCT r.event_id) > 0
+               THEN ROUND(COUNT(a.attendance_id) * 100.0 / COUNT(DISTINCT r.event_id), 2)
+               ELSE 0
+           END as participation_rate
+    FROM Students s
+    JOIN Colleges c ON s.college_id = c.College_id
+    LEFT JOIN Registrations r ON s.student_id = r.student_id AND r.status = 'Registered' {event_join}
+    LEFT JOIN Attendance a ON r.registration_id = a.registration_id AND a.attended = 1
+    {where}
+    GROUP BY s.student_id, s.name, c.name
+    HAVING total_events > 0
+    ORDER BY events_attended DESC, participation_rate DESC, s.name ASC
+    """
+    if not SHARDING_ENABLED:
+        return execute_query(query + " LIMIT ?", tuple(join_params + where_params + [limit]),
+                             include_archive=include_archived)
+
+    # Shards hold disjoint sets of events, so the per-shard distinct counts add up
+    merged = merge_counts(
+        _run_on_shards(query, tuple(join_params + where_params), include_archived),
+        "student_id", ["total_events", "events_attended"]
+    )
+    for row in merged:
+        row["participation_rate"] = round(row["events_attended"] * 100.0 / row["total_events"], 2)
+    merged.sort(key=lambda row: (-row["events_attended"], -row["participation_rate"], row["student_name"]))
+    return merged[:limit]
+
+
+def compute_distinct_attendees(group_by: str = "event", college_id: Optional[int] = None,
+                               include_archived: bool = False) -> List[Dict[str, Any]]:
+    """Distinct students who attended each event, or any event hosted by each college"""
+    conditions, params = _event_filter("e", college_id, None, None)
+    where = " ".join(f"AND {condition}" for condition in conditions)
+    if group_by == "college":
+        select, group = "c.College_id as group_id, c.name as name", "c.College_id, c.name"
+    else:
+        select, group = "e.event_id as group_id, e.name as name", "e.event_id, e.name"
+    query = f"""
+    SELECT {select}, COUNT(DISTINCT r.student_id) as distinct_attendees
+    FROM Attendance a
+    JOIN Registrations r ON a.registration_id = r.registration_id AND r.status = 'Registered'
+    JOIN Events e ON r.event_id = e.event_id
+    JOIN Colleges c ON e.college_id = c.College_id
+    WHERE a.attended = 1 {where}
+    GROUP BY {group}
+    """
+    # Events, and so their host colleges, never span shards, so the per-shard counts add up
+    merged = merge_counts(_run_on_shards(query, tuple(params), include_archived), "group_id", ["distinct_attendees"])
+    return sorted(merged, key=lambda row: (-row["distinct_attendees"], row["name"]))
+
+
+def compute_event_ratings(college_id: Optional[int] = None, include_archived: bool = False) -> List[Dict[str, Any]]:
+    """Feedback count, average and quartiles of the ratings of each event"""
+    conditions, params = _event_filter("e", college_id, None, None)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"""
+    SELECT e.event_id, e.name as event_name, CAST(f.rating AS INTEGER) as rating, COUNT(*) as count
+    FROM Feedback f
+    JOIN Registrations r ON f.registration_id = r.registration_id
+    JOIN Events e ON r.event_id = e.event_id
+    {where}
+    GROUP BY e.event_id, e.name, CAST(f.rating AS INTEGER)
+    """
+    histograms: Dict[int, RatingHistogram] = {}
+    names = {}
+    for rows in _run_on_shards(query, tuple(params), include_archived):
+        for row in rows:
+            names[row["event_id"]] = row["event_name"]
+            histograms.setdefault(row["event_id"], RatingHistogram()).add(row["rating"], row["count"])
+    return _ratings_rows(histograms, names)
+
+
+def _ratings_rows(histograms: Dict[int, RatingHistogram], names: Dict[int, str]) -> List[Dict[str, Any]]:
+    rows = [
+        {"event_id": event_id, "event_name": names[event_id], **histogram.summary()}
+        for event_id, histogram in histograms.items()
+        if event_id in names and sum(histogram.counts)
+    ]
+    return sorted(rows, key=lambda row: (-row["feedback_count"], row["event_name"]))
+
+
+# Approximate reports: answered from the sketches instead of scanning the fact tables
+
+def _events(college_id: Optional[int], date_from: Optional[str], date_to: Optional[str]) -> List[Dict[str, Any]]:
+    conditions, params = _event_filter("e", college_id, date_from, date_to)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return execute_query(f"""
+    SELECT e.event_id, e.name as event_name, c.College_id as college_id, c.name as college_name
+    FROM Events e
+    JOIN Colleges c ON e.college_id = c.College_id
+    {where}
+    """, tuple(params))
+
+
+def approx_event_popularity(college_id: Optional[int] = None, date_from: Optional[str] = None,
+                            date_to: Optional[str] = None) -> Dict[str, Any]:
+    """Events ordered by registrations estimated from a count-min sketch"""
+    sketches = sketch_store.current()
+    counts = sketches.registrations_by_event
+    error = counts.error()
+    rows = [
+        {"event_id": event["event_id"], "event_name": event["event_name"], "college_name": event["college_name"],
+         "registration_count": counts.estimate(event["event_id"]), "registration_count_error": error}
+        for event in _events(college_id, date_from, date_to)
+    ]
+    rows.sort(key=lambda row: (-row["registration_count"], row["event_name"]))
+    return {"approximate": True, "confidence": round(counts.confidence(), 4), "rows": rows}
+
+
+def approx_top_students(college_id: Optional[int] = None, limit: int = 3) -> Dict[str, Any]:
+    """Most active students from the top-k attendance list and count-min estimates"""
+    sketches = sketch_store.current()
+    leaders = sketches.top_attendees.get(college_id)
+    candidates = [student_id for student_id, _ in leaders.leaders()] if leaders else []
+    students = {}
+    if candidates:
+        placeholders = ", ".join("?" * len(candidates))
+        students = {row["student_id"]: row for row in execute_query(f"""
+        SELECT s.student_id, s.name as student_name, c.name as college_name
+        FROM Students s
+        JOIN Colleges c ON s.college_id = c.College_id
+        WHERE s.student_id IN ({placeholders})
+        """, tuple(candidates))}
+    rows = []
+    for student_id in candidates:
+        if student_id not in students:
+            continue
+        attended = sketches.attendance_by_student.estimate(student_id)
+        # Both counts are overestimates; a student never attends more events than they registered for
+        total = max(sketches.registrations_by_student.estimate(student_id), attended)
+        rows.append({
+            **students[student_id],
+            "total_events": total,
+            "events_attended": attended,
+            "participation_rate": round(attended * 100.0 / total, 2) if total else 0,
+            "total_events_error": sketches.registrations_by_student.error(),
+            "events_attended_error": sketches.attendance_by_student.error(),
+        })
+    rows.sort(key=lambda row: (-row["events_attended"], -row["participation_rate"], row["student_name"]))
+    return {
+        "approximate": True,
+        "confidence": round(sketches.attendance_by_student.confidence(), 4),
+        "rows": rows[:limit],
+    }
+
+
+def approx_distinct_attendees(group_by: str = "event", college_id: Optional[int] = None) -> Dict[str, Any]:
+    """Distinct attendees estimated from HyperLogLog sketches, with a two standard error bound"""
+    sketches = sketch_store.current()
+    if group_by == "college":
+        groups = {}
+        for event in _events(college_id, None, None):
+            groups[event["college_id"]] = event["college_name"]
+        counters = sketches.attendees_by_college
+    else:
+        groups = {event["event_id"]: event["event_name"] for event in _events(college_id, None, None)}
+        counters = sketches.attendees_by_event
+    rows = []
+    for group_id, name in groups.items():
+        hll = counters.get(group_id)
+        if hll is None:
+            continue
+        estimate = hll.count()
+        rows.append({
+            "group_id": group_id, "name": name, "distinct_attendees": estimate,
+            "distinct_attendees_error": round(2 * hll.relative_error() * estimate),
+        })
+    rows.sort(key=lambda row: (-row["distinct_attendees"], row["name"]))
+    return {"approximate": True, "confidence": 0.95, "rows": rows}
+
+
+def approx_event_ratings(college_id: Optional[int] = None) -> Dict[str, Any]:
+    """Rating summaries from the per-event rating histograms"""
+    sketches = sketch_store.current()
+    names = {event["event_id"]: event["event_name"] for event in _events(college_id, None, None)}
+    rows = _ratings_rows(sketches.ratings_by_event, names)
+    # Ratings are bounded integers, so the histograms answer quantiles exactly
+    return {"approximate": True, "confidence": 1.0, "rows": rows}
+
+
+register_report("event-popularity", compute_event_popularity)
+register_report("student-participation", compute_student_participation)
+register_report("top-students", compute_top_students)
+
 
 @router.get("/event-popularity", response_model=List[EventPopularityReport])
-async def get_event_popularity_report():
+def get_event_popularity_report(
+    college_id: Optional[int] = Query(None, description="Filter by college ID"),
+    date_from: Optional[str] = Query(None, description="Only events on or after this date (YYYY-MM-DD)"),
+    date_to: Optional[str] = Query(None, description="Only events on or before this date (YYYY-MM-DD)"),
+    include_archived: bool = Query(False, description="Include rows of archived past events"),
+    approx: bool = Query(False, description=APPROX_DESCRIPTION)
+):
     """Get top events by number of registrations"""
     try:
-        query = """
-        SELECT e.event_id, e.name as event_name, c.name as college_name,
-               COUNT(r.registration_id) as registration_count
-        FROM Events e
-        JOIN Colleges c ON e.college_id = c.College_id
-        LEFT JOIN Registrations r ON e.event_id = r.event_id AND r.status = 'Registered'
-        GROUP BY e.event_id, e.name, c.name
-        ORDER BY registration_count DESC, e.name ASC
-        """
-        results = execute_query(query)
-        
+        if approx:
+            return JSONResponse(approx_event_popularity(college_id, date_from, date_to))
+        _check_archived(include_archived)
+        results = compute_event_popularity(college_id, date_from, date_to, include_archived)
+
         return [
             EventPopularityReport(
                 event_id=row['event_id'],
@@ -30,26 +323,24 @@ async def get_event_popularity_report():
             )
             for row in results
         ]
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
 @router.get("/student-participation", response_model=List[StudentParticipationReport])
-async def get_student_participation_report():
+async def get_student_participation_report(
+    college_id: Optional[int] = Query(None, description="Filter by college ID"),
+    date_from: Optional[str] = Query(None, description="Only events on or after this date (YYYY-MM-DD)"),
+    date_to: Optional[str] = Query(None, description="Only events on or before this date (YYYY-MM-DD)"),
+    include_archived: bool = Query(False, description="Include rows of archived past events")
+):
     """Get number of events each student attended"""
     try:
-        query = """
-        SELECT s.student_id, s.name as student_name, c.name as college_name,
-               COUNT(a.attendance_id) as events_attended
-        FROM Students s
-        JOIN Colleges c ON s.college_id = c.College_id
-        LEFT JOIN Registrations r ON s.student_id = r.student_id
-        LEFT JOIN Attendance a ON r.registration_id = a.registration_id AND a.attended = 1
-        GROUP BY s.student_id, s.name, c.name
-        ORDER BY events_attended DESC, s.name ASC
-        """
-        results = execute_query(query)
-        
+        _check_archived(include_archived)
+        results = compute_student_participation(college_id, date_from, date_to, include_archived)
+
         return [
             StudentParticipationReport(
                 student_id=row['student_id'],
@@ -59,34 +350,29 @@ async def get_student_participation_report():
             )
             for row in results
         ]
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
 @router.get("/top-students", response_model=List[TopStudentReport])
-async def get_top_students_report():
+async def get_top_students_report(
+    college_id: Optional[int] = Query(None, description="Filter by college ID"),
+    date_from: Optional[str] = Query(None, description="Only events on or after this date (YYYY-MM-DD)"),
+    date_to: Optional[str] = Query(None, description="Only events on or before this date (YYYY-MM-DD)"),
+    include_archived: bool = Query(False, description="Include rows of archived past events"),
+    approx: bool = Query(False, description=APPROX_DESCRIPTION)
+):
     """Get top 3 most active students"""
     try:
-        query = """
-        SELECT s.student_id, s.name as student_name, c.name as college_name,
-               COUNT(DISTINCT r.event_id) as total_events,
-               COUNT(a.attendance_id) as events_attended,
-               CASE 
-                   WHEN COUNT(DISTINCT r.event_id) > 0 
-                   THEN ROUND(COUNT(a.attendance_id) * 100.0 / COUNT(DISTINCT r.event_id), 2)
-                   ELSE 0 
-               END as participation_rate
-        FROM Students s
-        JOIN Colleges c ON s.college_id = c.College_id
-        LEFT JOIN Registrations r ON s.student_id = r.student_id AND r.status = 'Registered'
-        LEFT JOIN Attendance a ON r.registration_id = a.registration_id AND a.attended = 1
-        GROUP BY s.student_id, s.name, c.name
-        HAVING total_events > 0
-        ORDER BY events_attended DESC, participation_rate DESC, s.name ASC
-        LIMIT 3
-        """
-        results = execute_query(query)
-        
+        if approx:
+            if date_from or date_to:
+                raise HTTPException(status_code=400, detail="Approximate top students cannot be filtered by date")
+            return JSONResponse(approx_top_students(college_id))
+        _check_archived(include_archived)
+        results = compute_top_students(college_id, date_from, date_to, include_archived)
+
         return [
             TopStudentReport(
                 student_id=row['student_id'],
@@ -98,5 +384,78 @@ async def get_top_students_report():
             )
             for row in results
         ]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@router.get("/distinct-attendees", response_model=List[DistinctAttendeesReport])
+async def get_distinct_attendees_report(
+    group_by: str = Query("event", description="Count per event or per host college: event or college"),
+    college_id: Optional[int] = Query(None, description="Filter by college ID"),
+    include_archived: bool = Query(False, description="Include rows of archived past events"),
+    approx: bool = Query(False, description=APPROX_DESCRIPTION)
+):
+    """Get the number of distinct students who attended each event or college"""
+    try:
+        if group_by not in ("event", "college"):
+            raise HTTPException(status_code=400, detail="group_by must be event or college")
+        if approx:
+            return JSONResponse(approx_distinct_attendees(group_by, college_id))
+        _check_archived(include_archived)
+        return compute_distinct_attendees(group_by, college_id, include_archived)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@router.get("/event-ratings", response_model=List[EventRatingsReport])
+async def get_event_ratings_report(
+    college_id: Optional[int] = Query(None, description="Filter by college ID"),
+    include_archived: bool = Query(False, description="Include rows of archived past events"),
+    approx: bool = Query(False, description=APPROX_DESCRIPTION)
+):
+    """Get the feedback count, average rating and rating quartiles of each event"""
+    try:
+        if approx:
+            return JSONResponse(approx_event_ratings(college_id))
+        _check_archived(include_archived)
+        return compute_event_ratings(college_id, include_archived)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@router.post("/jobs", response_model=ReportJob, status_code=202)
+async def create_report_job(job: ReportJobCreate):
+    """Queue a report to be computed in the background"""
+    try:
+        if job.report not in available_reports():
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown report, expected one of: {', '.join(available_reports())}"
+            )
+        _check_archived(job.include_archived)
+        params = job.model_dump(exclude={"report"}, exclude_none=True)
+        return runner.submit(job.report, params)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@router.get("/jobs/{job_id}", response_model=ReportJob)
+async def get_report_job(job_id: str):
+    """Get the status of a report job, with its result once done"""
+    try:
+        job = runner.get(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Report job not found")
+        return job
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
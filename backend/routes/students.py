@@ -1,10 +1,15 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from models import Student, StudentCreate, StudentWithCollege
+from fastapi import APIRouter, HTTPException, UploadFile, File, Query
+from typing import List, Optional
+from models import (
+    Student, StudentCreate, StudentWithCollege, StudentImportResult, ScheduledEvent, EventRecommendation
+)
 from database import (
     execute_query, execute_insert, get_student_by_id, 
     get_student_with_college, check_record_exists
 )
+from importer import import_students, detect_format
+from schedule import get_student_schedule, parse_time
+from recommendations import recommend_events
 
 router = APIRouter(prefix="/students", tags=["students"])
 
@@ -34,6 +39,44 @@ async def get_student(student_id: int):
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
+@router.get("/{student_id}/schedule", response_model=List[ScheduledEvent])
+async def get_schedule(
+    student_id: int,
+    date_from: Optional[str] = Query(None, alias="from", description="Start of the window (YYYY-MM-DD or YYYY-MM-DD HH:MM)"),
+    date_to: Optional[str] = Query(None, alias="to", description="End of the window, exclusive")
+):
+    """Get the events a student is registered for within a time window"""
+    try:
+        if not check_record_exists("Students", "student_id", student_id):
+            raise HTTPException(status_code=404, detail="Student not found")
+        try:
+            start = parse_time(date_from) if date_from else None
+            end = parse_time(date_to) if date_to else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date, expected YYYY-MM-DD or YYYY-MM-DD HH:MM")
+        return get_student_schedule(student_id, start, end)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@router.get("/{student_id}/recommendations", response_model=List[EventRecommendation])
+async def get_recommendations(
+    student_id: int,
+    k: int = Query(10, ge=1, le=50, description="Number of events to recommend")
+):
+    """Get events attended by the same students as the events this student attended"""
+    try:
+        if not check_record_exists("Students", "student_id", student_id):
+            raise HTTPException(status_code=404, detail="Student not found")
+        return recommend_events(student_id, k)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
 @router.post("/", response_model=Student)
 async def create_student(student: StudentCreate):
     """Register a new student"""
@@ -59,3 +102,17 @@ async def create_student(student: StudentCreate):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+
+@router.post("/import", response_model=StudentImportResult)
+def import_students_file(
+    file: UploadFile = File(..., description="CSV with a header row, or NDJSON, with name, email and college_id"),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$", description="Defaults to the file extension")
+):
+    """Bulk import students from a CSV or NDJSON upload, committing in chunks"""
+    # Plain def: FastAPI runs the long import in its threadpool instead of blocking the event loop
+    try:
+        fmt = format or detect_format(file.filename, file.content_type)
+        return import_students(file.file, fmt)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -0,0 +1,257 @@
+"""Normalised event times and per-student calendars.
+
+Events.date is free-form text, so every event gets a row in EventSchedule
+with start/end as integer timestamps, indexed for range queries. A date
+without a time is treated as the whole day; a date with a time lasts
+DEFAULT_DURATION_HOURS. Clash detection keeps each student's registered
+intervals (status 'Registered'; waitlisted registrations hold no seat) in
+a sorted list (augmented with a running maximum of the end times) so
+checking a new registration is a bisect plus a short scan.
+
+A whole-day event has no real time, so any other event on the same day
+clashes with it. Set WHOLE_DAY_CLASHES=0 to accept such registrations
+with a warning instead, for data where whole-day dates stand in for
+unrecorded times.
+"""
+import calendar
+import os
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Tuple
+
+from database import get_db_connection, execute_update, get_single_record
+from sharding import query_all
+
+
+DEFAULT_DURATION_HOURS = int(os.getenv("EVENT_DEFAULT_DURATION_HOURS", "2"))
+
+# Set to 0 to accept registrations that overlap a whole-day event, with a warning
+WHOLE_DAY_CLASHES = os.getenv("WHOLE_DAY_CLASHES", "1") == "1"
+
+DAY_SECONDS = int(timedelta(days=1).total_seconds())
+
+# Students whose intervals are kept in memory, least recently used are dropped first
+MAX_CACHED_STUDENTS = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS "EventSchedule" (
+    "event_id"  INTEGER PRIMARY KEY,
+    "starts_at" INTEGER NOT NULL,
+    "ends_at"   INTEGER NOT NULL,
+    FOREIGN KEY("event_id") REFERENCES "Events"("event_id")
+);
+CREATE INDEX IF NOT EXISTS "idx_event_schedule_range" ON "EventSchedule" ("starts_at", "ends_at");
+"""
+
+_DATE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M")
+
+
+def to_timestamp(value: datetime) -> int:
+    return calendar.timegm(value.timetuple())
+
+
+def to_iso(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def parse_time(value: str) -> int:
+    """Parse a YYYY-MM-DD date or date-time into a timestamp"""
+    value = value.strip()
+    for fmt in _DATE_FORMATS:
+        try:
+            return to_timestamp(datetime.strptime(value, fmt))
+        except ValueError:
+            pass
+    return to_timestamp(datetime.strptime(value[:10], "%Y-%m-%d"))
+
+
+def event_interval(event_date: str) -> Tuple[int, int]:
+    """Start and end timestamps of an event from its date text"""
+    event_date = event_date.strip()
+    start = parse_time(event_date)
+    if len(event_date) <= 10:
+        return start, start + DAY_SECONDS
+    return start, start + DEFAULT_DURATION_HOURS * 3600
+
+
+def is_whole_day(starts_at: int, ends_at: int) -> bool:
+    """Whether an interval is a date without a time"""
+    return starts_at % DAY_SECONDS == 0 and ends_at - starts_at == DAY_SECONDS
+
+
+def init_schema():
+    """Create the schedule table and index every event that has no schedule row yet"""
+    with get_db_connection() as conn:
+        conn.executescript(SCHEMA)
+        backfill(conn)
+        conn.commit()
+
+
+def backfill(conn):
+    """Add schedule rows for events that have none, without committing"""
+    missing = conn.execute(
+        "SELECT event_id, date FROM Events WHERE event_id NOT IN (SELECT event_id FROM EventSchedule)"
+    ).fetchall()
+    rows = []
+    for event_id, event_date in missing:
+        try:
+            rows.append((event_id, *event_interval(event_date)))
+        except (ValueError, AttributeError):
+            continue  # Unparseable dates stay off the calendar
+    conn.executemany("INSERT INTO EventSchedule (event_id, starts_at, ends_at) VALUES (?, ?, ?)", rows)
+
+
+def index_event(event_id: int, event_date: str):
+    """Add or refresh the schedule row of an event"""
+    try:
+        starts_at, ends_at = event_interval(event_date)
+    except ValueError:
+        return  # Unparseable dates stay off the calendar
+    execute_update(
+        """
+        INSERT INTO EventSchedule (event_id, starts_at, ends_at) VALUES (?, ?, ?)
+        ON CONFLICT(event_id) DO UPDATE SET starts_at = excluded.starts_at, ends_at = excluded.ends_at
+        """,
+        (event_id, starts_at, ends_at)
+    )
+
+
+class IntervalList:
+    """Sorted intervals with a running max of end times for overlap queries"""
+
+    __slots__ = ("starts", "ends", "event_ids", "max_ends")
+
+    def __init__(self, intervals: List[Tuple[int, int, int]] = ()):
+        intervals = sorted(intervals)
+        self.starts = [start for start, _, _ in intervals]
+        self.ends = [end for _, end, _ in intervals]
+        self.event_ids = [event_id for _, _, event_id in intervals]
+        self.max_ends: List[int] = []
+        self._rebuild_max(0)
+
+    def _rebuild_max(self, position: int):
+        del self.max_ends[position:]
+        running = self.max_ends[-1] if self.max_ends else None
+        for end in self.ends[position:]:
+            running = end if running is None or end > running else running
+            self.max_ends.append(running)
+
+    def add(self, start: int, end: int, event_id: int):
+        position = bisect_left(self.starts, start)
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+        self.event_ids.insert(position, event_id)
+        self._rebuild_max(position)
+
+    def overlapping_positions(self, start: int, end: int) -> List[int]:
+        """Positions of intervals overlapping [start, end)"""
+        found = []
+        # Only intervals starting before `end` can overlap; walk back until no earlier one reaches `start`
+        position = bisect_left(self.starts, end) - 1
+        while position >= 0 and self.max_ends[position] > start:
+            if self.ends[position] > start:
+                found.append(position)
+            position -= 1
+        return found
+
+    def overlapping(self, start: int, end: int) -> List[int]:
+        """Event ids of intervals overlapping [start, end)"""
+        return [self.event_ids[position] for position in self.overlapping_positions(start, end)]
+
+
+class ScheduleIndex:
+    """Per-student interval lists, loaded on first use and kept in step with new registrations"""
+
+    def __init__(self, max_students: int = MAX_CACHED_STUDENTS):
+        self.max_students = max_students
+        self._students: "OrderedDict[int, IntervalList]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, student_id: int) -> IntervalList:
+        rows = query_all(
+            """
+            SELECT es.starts_at, es.ends_at, es.event_id
+            FROM Registrations r
+            JOIN EventSchedule es ON es.event_id = r.event_id
+            WHERE r.student_id = ? AND r.status = 'Registered'
+            """,
+            (student_id,)
+        )
+        return IntervalList([(row["starts_at"], row["ends_at"], row["event_id"]) for row in rows])
+
+    def _intervals(self, student_id: int) -> IntervalList:
+        intervals = self._students.get(student_id)
+        if intervals is None:
+            intervals = self._load(student_id)
+            self._students[student_id] = intervals
+            if len(self._students) > self.max_students:
+                self._students.popitem(last=False)
+        else:
+            self._students.move_to_end(student_id)
+        return intervals
+
+    def find_clashes(self, student_id: int, event_id: int) -> Tuple[List[int], List[int]]:
+        """Events the student is registered for that overlap the given event: (clashes, whole-day overlaps)
+
+        Overlaps involving a whole-day event are only warnings when WHOLE_DAY_CLASHES is off.
+        """
+        event = get_single_record("SELECT starts_at, ends_at FROM EventSchedule WHERE event_id = ?", (event_id,))
+        if not event:
+            return [], []
+        whole_day = is_whole_day(event["starts_at"], event["ends_at"])
+        clashes, possible = [], []
+        with self._lock:
+            intervals = self._intervals(student_id)
+            positions = intervals.overlapping_positions(event["starts_at"], event["ends_at"])
+            for position in positions:
+                other = intervals.event_ids[position]
+                if other == event_id:
+                    continue
+                other_whole_day = is_whole_day(intervals.starts[position], intervals.ends[position])
+                if (whole_day or other_whole_day) and not WHOLE_DAY_CLASHES:
+                    possible.append(other)
+                else:
+                    clashes.append(other)
+        return clashes, possible
+
+    def add_registration(self, student_id: int, event_id: int, status: str = "Registered"):
+        """Record a new registration in the student's cached intervals"""
+        if status != "Registered":
+            return  # Waitlisted registrations are not on the calendar
+        with self._lock:
+            if student_id not in self._students:
+                return  # Loaded with the new row on next use
+            event = get_single_record("SELECT starts_at, ends_at FROM EventSchedule WHERE event_id = ?", (event_id,))
+            if event:
+                self._students[student_id].add(event["starts_at"], event["ends_at"], event_id)
+
+
+index = ScheduleIndex()
+
+
+def get_student_schedule(student_id: int, start: Optional[int], end: Optional[int]) -> List[Dict[str, Any]]:
+    """Registered events of a student overlapping [start, end), in time order"""
+    conditions = ["r.student_id = ?", "r.status = 'Registered'"]
+    params: List[Any] = [student_id]
+    if end is not None:
+        conditions.append("es.starts_at < ?")
+        params.append(end)
+    if start is not None:
+        conditions.append("es.ends_at > ?")
+        params.append(start)
+    query = f"""
+    SELECT r.registration_id, r.status, e.event_id, e.name, e.type, e.date, e.college_id,
+           es.starts_at, es.ends_at
+    FROM Registrations r
+    JOIN EventSchedule es ON es.event_id = r.event_id
+    JOIN Events e ON e.event_id = r.event_id
+    WHERE {' AND '.join(conditions)}
+    ORDER BY es.starts_at ASC
+    """
+    rows = query_all(query, tuple(params), order_by="starts_at")
+    for row in rows:
+        row["starts_at"] = to_iso(row["starts_at"])
+        row["ends_at"] = to_iso(row["ends_at"])
+    return rows
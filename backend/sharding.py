@@ -0,0 +1,276 @@
+"""Per-college sharding of the write-heavy tables.
+
+When SHARDING_ENABLED=1, Registrations, Attendance and Feedback live in one
+SQLite file per college (SHARD_DIR/college_<id>.db), chosen by the college
+of the event. Colleges, Students, Events and the support tables stay in
+campus_events.db, which every shard connection attaches as "catalog"; the
+shard's own tables take precedence over the catalog's, so the existing
+queries run unchanged on a shard connection.
+
+Row ids stay globally unique: each shard's AUTOINCREMENT sequence starts at
+college_id * SHARD_ID_RANGE, so a registration id names its shard. Rows
+moved over from the unsharded database keep their ids and are found
+through the LegacyRegistrations table.
+
+Usage:
+    python sharding.py split     # move the fact tables into per-college shards
+    python sharding.py merge     # move them back into campus_events.db
+    python sharding.py status
+"""
+import argparse
+import glob
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+import database
+
+
+SHARDING_ENABLED = os.getenv("SHARDING_ENABLED", "0") == "1"
+
+SHARD_DIR = os.getenv("SHARD_DIR", "shards")
+
+# Threads used to query the shards in parallel for cross-college reads
+FANOUT_WORKERS = int(os.getenv("SHARD_FANOUT_WORKERS", "8"))
+
+# Size of each shard's id range: ids of college N start at N * SHARD_ID_RANGE
+SHARD_ID_RANGE = 10 ** 9
+
+FACT_TABLES = ("Registrations", "Attendance", "Feedback")
+
+SHARD_SCHEMA = """
+CREATE TABLE IF NOT EXISTS main."Registrations" (
+    "registration_id" INTEGER PRIMARY KEY AUTOINCREMENT, "student_id" INTEGER, "event_id" INTEGER,
+    "status" TEXT, "timestamp" TEXT
+);
+CREATE TABLE IF NOT EXISTS main."Attendance" (
+    "attendance_id" INTEGER PRIMARY KEY AUTOINCREMENT, "registration_id" INTEGER, "attended" INTEGER, "timestamp" TEXT
+);
+CREATE TABLE IF NOT EXISTS main."Feedback" (
+    "feedback_id" INTEGER PRIMARY KEY AUTOINCREMENT, "registration_id" INTEGER, "rating" TEXT, "comment" TEXT
+);
+CREATE INDEX IF NOT EXISTS main."idx_registrations_event_status" ON "Registrations" ("event_id", "status");
+CREATE INDEX IF NOT EXISTS main."idx_registrations_student" ON "Registrations" ("student_id");
+CREATE INDEX IF NOT EXISTS main."idx_attendance_registration" ON "Attendance" ("registration_id");
+CREATE INDEX IF NOT EXISTS main."idx_feedback_registration" ON "Feedback" ("registration_id");
+"""
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS "LegacyRegistrations" (
+    "registration_id"   INTEGER PRIMARY KEY,
+    "college_id"        INTEGER NOT NULL
+);
+"""
+
+T = TypeVar("T")
+
+_known_shards = set()
+_shard_lock = threading.Lock()
+_event_colleges: Dict[int, int] = {}
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def shard_path(college_id: int) -> str:
+    return os.path.join(SHARD_DIR, f"college_{college_id}.db")
+
+
+def _create_shard(college_id: int):
+    """Create a shard file with the fact tables, its change outbox and its id range"""
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    conn = sqlite3.connect(shard_path(college_id))
+    try:
+        # Write-ahead logging so readers of a shard never wait for its writers
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SHARD_SCHEMA)
+        from changes import SCHEMA as CHANGES_SCHEMA
+        conn.executescript(CHANGES_SCHEMA)
+        for table in FACT_TABLES + ("ChangeLog",):
+            conn.execute(
+                "INSERT INTO sqlite_sequence (name, seq) SELECT ?, ? "
+                "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)",
+                (table, college_id * SHARD_ID_RANGE, table)
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def open_shard(college_id: int) -> sqlite3.Connection:
+    """Open a college's shard with the main database attached as the catalog"""
+    if college_id not in _known_shards:
+        with _shard_lock:
+            if college_id not in _known_shards:
+                _create_shard(college_id)
+                _known_shards.add(college_id)
+    conn = sqlite3.connect(shard_path(college_id))
+    conn.execute("ATTACH DATABASE ? AS catalog", (database.DATABASE_PATH,))
+    return conn
+
+
+def init_schema():
+    """Create the legacy id directory in the catalog"""
+    with database.get_db_connection() as conn:
+        conn.executescript(CATALOG_SCHEMA)
+
+
+def shard_ids() -> List[int]:
+    """Colleges that have a shard"""
+    paths = glob.glob(os.path.join(SHARD_DIR, "college_*.db"))
+    return sorted(int(os.path.basename(p)[len("college_"):-len(".db")]) for p in paths)
+
+
+def shard_for_event(event_id: int) -> Optional[int]:
+    """Shard holding an event's registrations, None when sharding is disabled"""
+    if not SHARDING_ENABLED:
+        return None
+    college_id = _event_colleges.get(event_id)
+    if college_id is None:
+        event = database.get_single_record("SELECT college_id FROM Events WHERE event_id = ?", (event_id,))
+        if not event:
+            return None
+        college_id = _event_colleges[event_id] = event["college_id"]
+    return college_id
+
+
+def load_event_colleges():
+    """Fill the event to college cache in one query, a no-op when sharding is disabled"""
+    if SHARDING_ENABLED:
+        for row in database.execute_query("SELECT event_id, college_id FROM Events"):
+            _event_colleges[row["event_id"]] = row["college_id"]
+
+
+def shard_for_registration(registration_id: int) -> Optional[int]:
+    """Shard holding a registration (and its attendance and feedback), None when sharding is disabled"""
+    if not SHARDING_ENABLED:
+        return None
+    if registration_id >= SHARD_ID_RANGE:
+        return registration_id // SHARD_ID_RANGE
+    legacy = database.get_single_record(
+        "SELECT college_id FROM LegacyRegistrations WHERE registration_id = ?", (registration_id,)
+    )
+    return legacy["college_id"] if legacy else None
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="shard-fanout")
+    return _executor
+
+
+def fan_out(fn: Callable[[Optional[int]], T]) -> List[T]:
+    """Run fn(shard) for every shard in parallel; fn(None) once when sharding is disabled or not split yet"""
+    if not SHARDING_ENABLED:
+        return [fn(None)]
+    shards = shard_ids()
+    if not shards:
+        return [fn(None)]  # No shard files yet, the rows are still in the main database
+    if len(shards) == 1:
+        return [fn(shard) for shard in shards]
+    return list(_pool().map(fn, shards))
+
+
+def query_all(query: str, params: tuple = (), order_by: Optional[str] = None,
+              reverse: bool = False) -> List[Dict[str, Any]]:
+    """Run a query on every shard and concatenate the rows, re-sorted by order_by when merged"""
+    partials = fan_out(lambda shard: database.execute_query(query, params, shard=shard))
+    if len(partials) == 1:
+        return partials[0]
+    rows = [row for rows in partials for row in rows]
+    if order_by:
+        rows.sort(key=lambda row: row[order_by], reverse=reverse)
+    return rows
+
+
+def merge_counts(partials: List[List[Dict[str, Any]]], key: str, sum_fields: List[str]) -> List[Dict[str, Any]]:
+    """Merge per-shard aggregate rows by key, summing the count fields"""
+    merged: Dict[Any, Dict[str, Any]] = {}
+    for rows in partials:
+        for row in rows:
+            current = merged.get(row[key])
+            if current is None:
+                merged[row[key]] = dict(row)
+            else:
+                for field in sum_fields:
+                    current[field] += row[field]
+    return list(merged.values())
+
+
+def split_database() -> Dict[int, int]:
+    """Move the fact tables of campus_events.db into per-college shards; returns registrations per shard"""
+    init_schema()
+    colleges = [row["College_id"] for row in database.execute_query("SELECT College_id FROM Colleges")]
+    moved = {}
+    for college_id in colleges:
+        conn = open_shard(college_id)
+        try:
+            conn.execute(
+                "CREATE TEMP TABLE moving AS SELECT r.registration_id FROM catalog.Registrations r "
+                "JOIN catalog.Events e ON e.event_id = r.event_id WHERE e.college_id = ?",
+                (college_id,)
+            )
+            for table in FACT_TABLES:
+                conn.execute(f"INSERT INTO main.{table} SELECT * FROM catalog.{table} "
+                             f"WHERE registration_id IN (SELECT registration_id FROM moving)")
+            conn.execute(
+                "INSERT OR REPLACE INTO catalog.LegacyRegistrations (registration_id, college_id) "
+                "SELECT registration_id, ? FROM moving",
+                (college_id,)
+            )
+            for table in ("Feedback", "Attendance", "Registrations"):
+                conn.execute(f"DELETE FROM catalog.{table} "
+                             f"WHERE registration_id IN (SELECT registration_id FROM moving)")
+            moved[college_id] = conn.execute("SELECT COUNT(*) FROM moving").fetchone()[0]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    return moved
+
+
+def merge_database() -> Dict[int, int]:
+    """Move every shard's rows back into campus_events.db and delete the shard files"""
+    moved = {}
+    for college_id in shard_ids():
+        conn = open_shard(college_id)
+        try:
+            moved[college_id] = conn.execute("SELECT COUNT(*) FROM main.Registrations").fetchone()[0]
+            for table in FACT_TABLES:
+                conn.execute(f"INSERT INTO catalog.{table} SELECT * FROM main.{table}")
+            conn.execute("DELETE FROM catalog.LegacyRegistrations WHERE college_id = ?", (college_id,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        os.remove(shard_path(college_id))
+        _known_shards.discard(college_id)
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split or merge the per-college shards")
+    parser.add_argument("command", choices=["split", "merge", "status"])
+    args = parser.parse_args()
+
+    if args.command == "split":
+        for college_id, count in split_database().items():
+            print(f"college {college_id}: moved {count} registrations to {shard_path(college_id)}")
+        print("Start the API with SHARDING_ENABLED=1 to use the shards")
+    elif args.command == "merge":
+        for college_id, count in merge_database().items():
+            print(f"college {college_id}: merged {count} registrations back")
+    else:
+        for college_id in shard_ids():
+            with database.get_db_connection(shard=college_id) as conn:
+                count = conn.execute("SELECT COUNT(*) FROM main.Registrations").fetchone()[0]
+            print(f"college {college_id}: {count} registrations ({shard_path(college_id)})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+"""Mergeable sketches behind the approximate (?approx=true) reports.
+
+- HyperLogLog counts distinct attendees per event and per host college.
+- Count-min counts registrations per event and registrations/attendance
+  per student, with a top-k list of the heaviest keys for the leaderboards.
+- Ratings are integers from 1 to 5, so a five-bucket histogram is an
+  exact quantile sketch of constant size, and mergeable like the others.
+
+The sketches are kept in memory and updated incrementally: each refresh
+reads only the Registrations, Attendance and Feedback rows with ids above
+the last ones seen (per shard when sharding is enabled), so writes from
+any worker, the bulk import or another process are picked up and the
+request path of the writes is unchanged. Approximate reports refresh
+before answering, so their cost depends on the rows written since the
+last read, not on the size of the tables. The state is saved to the
+ReportSketches table every SAVE_INTERVAL_SECONDS and on shutdown, and
+loaded on startup.
+
+Rows archived before a refresh saw them are not counted; `python
+sketches.py rebuild` recounts everything, archives included.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import database
+from sharding import SHARDING_ENABLED, fan_out
+
+
+# Count-min size: overestimates stay below e / WIDTH of the total with probability 1 - e^-DEPTH
+CMS_WIDTH = 8192
+CMS_DEPTH = 5
+
+# Registers are 2^precision bytes; relative standard error is 1.04 / sqrt(2^precision)
+EVENT_HLL_PRECISION = 10
+COLLEGE_HLL_PRECISION = 14
+
+# Keys kept in each top-k list
+TOP_K = 100
+
+RATINGS = (1, 2, 3, 4, 5)
+
+SAVE_INTERVAL_SECONDS = int(os.getenv("SKETCH_SAVE_INTERVAL_SECONDS", "60"))
+
+# Rows read per query while catching up
+REFRESH_BATCH = 50000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS "ReportSketches" (
+    "name"      TEXT PRIMARY KEY,
+    "state"     BLOB NOT NULL,
+    "saved_at"  REAL NOT NULL
+);
+"""
+
+
+def _hash64(value: Any) -> int:
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "little")
+
+
+class HyperLogLog:
+    """Distinct count estimator with 2^precision registers"""
+
+    def __init__(self, precision: int, registers: Optional[bytes] = None):
+        self.precision = precision
+        self.registers = bytearray(registers) if registers else bytearray(1 << precision)
+
+    def add(self, value: Any):
+        h = _hash64(value)
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def count(self) -> int:
+        m = len(self.registers)
+        # Few distinct register values: sum per value instead of per register
+        harmonic = sum(self.registers.count(r) * 2.0 ** -r for r in set(self.registers))
+        estimate = (0.7213 / (1 + 1.079 / m)) * m * m / harmonic
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # Linear counting for small cardinalities
+        return round(estimate)
+
+    def relative_error(self) -> float:
+        """One standard error, relative to the estimate"""
+        return 1.04 / math.sqrt(len(self.registers))
+
+
+class CountMinSketch:
+    """Frequency estimator that only ever overestimates.
+
+    Uses conservative update: an add only raises the cells that are below
+    the key's new estimate, which keeps collisions from inflating the other
+    keys while every cell stays an upper bound, so merging by sum is valid.
+    """
+
+    def __init__(self, width: int = CMS_WIDTH, depth: int = CMS_DEPTH, rows: Optional[List[List[int]]] = None,
+                 total: Optional[int] = None):
+        self.rows = rows or [[0] * width for _ in range(depth)]
+        self.width = len(self.rows[0])
+        self.depth = len(self.rows)
+        self.total = total or 0
+
+    def _cells(self, key: Any) -> Iterable[Tuple[List[int], int]]:
+        h = _hash64(key)
+        h1, h2 = h & 0xFFFFFFFF, h >> 32
+        for i, row in enumerate(self.rows):
+            yield row, (h1 + i * h2) % self.width
+
+    def add(self, key: Any, count: int = 1) -> int:
+        """Add to a key's count and return its new estimate"""
+        cells = list(self._cells(key))
+        estimate = min(row[cell] for row, cell in cells) + count
+        for row, cell in cells:
+            if row[cell] < estimate:
+                row[cell] = estimate
+        self.total += count
+        return estimate
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"rows": self.rows, "total": self.total}
+
+    def estimate(self, key: Any) -> int:
+        return min(row[cell] for row, cell in self._cells(key))
+
+    def merge(self, other: "CountMinSketch"):
+        for row, other_row in zip(self.rows, other.rows):
+            for i, value in enumerate(other_row):
+                row[i] += value
+        self.total += other.total
+
+    def error(self) -> int:
+        """Largest overestimate at the confidence below"""
+        return math.ceil(math.e / self.width * self.total)
+
+    def confidence(self) -> float:
+        return 1 - math.exp(-self.depth)
+
+
+class TopK:
+    """Keys with the highest count-min estimates seen so far"""
+
+    def __init__(self, k: int = TOP_K, counts: Optional[Dict[Any, int]] = None):
+        self.k = k
+        self.counts = counts or {}
+        self._floor = 0  # Lower bound of the smallest kept count, avoids a scan for most offers
+
+    def offer(self, key: Any, estimate: int):
+        if key in self.counts or len(self.counts) < self.k:
+            self.counts[key] = estimate
+            return
+        if estimate <= self._floor:
+            return
+        smallest = min(self.counts, key=self.counts.get)
+        self._floor = self.counts[smallest]
+        if estimate > self._floor:
+            del self.counts[smallest]
+            self.counts[key] = estimate
+
+    def leaders(self) -> List[Tuple[Any, int]]:
+        return sorted(self.counts.items(), key=lambda item: -item[1])
+
+
+class RatingHistogram:
+    """Counts of each rating; quantiles read from it are exact"""
+
+    def __init__(self, counts: Optional[List[int]] = None):
+        self.counts = counts or [0] * len(RATINGS)
+
+    def add(self, rating: int, count: int = 1):
+        if rating in RATINGS:
+            self.counts[rating - RATINGS[0]] += count
+
+    def merge(self, other: "RatingHistogram"):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+
+    def quantile(self, q: float) -> Optional[int]:
+        total = sum(self.counts)
+        if not total:
+            return None
+        rank = max(1, math.ceil(q * total))
+        seen = 0
+        for rating, count in zip(RATINGS, self.counts):
+            seen += count
+            if seen >= rank:
+                return rating
+        return RATINGS[-1]
+
+    def summary(self) -> Dict[str, Any]:
+        total = sum(self.counts)
+        return {
+            "feedback_count": total,
+            "average_rating": round(sum(r * c for r, c in zip(RATINGS, self.counts)) / total, 2) if total else None,
+            "p25_rating": self.quantile(0.25),
+            "median_rating": self.quantile(0.5),
+            "p75_rating": self.quantile(0.75),
+        }
+
+
+class ReportSketches:
+    """The sketches of all approximate reports and the last row ids they include"""
+
+    def __init__(self):
+        self.registrations_by_event = CountMinSketch()
+        self.registrations_by_student = CountMinSketch()
+        self.attendance_by_student = CountMinSketch()
+        self.top_events = TopK()
+        # Top attendees per student college; None holds the leaders across all colleges
+        self.top_attendees: Dict[Optional[int], TopK] = {}
+        self.attendees_by_event: Dict[int, HyperLogLog] = {}
+        self.attendees_by_college: Dict[int, HyperLogLog] = {}
+        self.ratings_by_event: Dict[int, RatingHistogram] = {}
+        # Source ("main" or a shard's college id) -> table -> last row id included
+        self.watermarks: Dict[str, Dict[str, int]] = {}
+
+    def add_registration(self, student_id: int, event_id: int):
+        self.top_events.offer(event_id, self.registrations_by_event.add(event_id))
+        self.registrations_by_student.add(student_id)
+
+    def add_attendance(self, student_id: int, event_id: int, event_college_id: int, student_college_id: int):
+        estimate = self.attendance_by_student.add(student_id)
+        for college in (None, student_college_id):
+            self.top_attendees.setdefault(college, TopK()).offer(student_id, estimate)
+        self.attendees_by_event.setdefault(event_id, HyperLogLog(EVENT_HLL_PRECISION)).add(student_id)
+        self.attendees_by_college.setdefault(event_college_id, HyperLogLog(COLLEGE_HLL_PRECISION)).add(student_id)
+
+    def add_rating(self, event_id: int, rating: Any):
+        try:
+            rating = int(rating)
+        except (TypeError, ValueError):
+            return  # Ratings are stored as text; skip anything that is not a number
+        self.ratings_by_event.setdefault(event_id, RatingHistogram()).add(rating)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "registrations_by_event": self.registrations_by_event.to_dict(),
+            "registrations_by_student": self.registrations_by_student.to_dict(),
+            "attendance_by_student": self.attendance_by_student.to_dict(),
+            "top_events": list(self.top_events.counts.items()),
+            "top_attendees": [[college, list(top.counts.items())] for college, top in self.top_attendees.items()],
+            "attendees_by_event": {k: hll.registers.hex() for k, hll in self.attendees_by_event.items()},
+            "attendees_by_college": {k: hll.registers.hex() for k, hll in self.attendees_by_college.items()},
+            "ratings_by_event": {k: histogram.counts for k, histogram in self.ratings_by_event.items()},
+            "watermarks": self.watermarks,
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "ReportSketches":
+        sketches = cls()
+        sketches.registrations_by_event = CountMinSketch(**state["registrations_by_event"])
+        sketches.registrations_by_student = CountMinSketch(**state["registrations_by_student"])
+        sketches.attendance_by_student = CountMinSketch(**state["attendance_by_student"])
+        sketches.top_events = TopK(counts=dict(state["top_events"]))
+        sketches.top_attendees = {college: TopK(counts=dict(counts)) for college, counts in state["top_attendees"]}
+        sketches.attendees_by_event = {
+            int(k): HyperLogLog(EVENT_HLL_PRECISION, bytes.fromhex(v)) for k, v in state["attendees_by_event"].items()
+        }
+        sketches.attendees_by_college = {
+            int(k): HyperLogLog(COLLEGE_HLL_PRECISION, bytes.fromhex(v)) for k, v in state["attendees_by_college"].items()
+        }
+        sketches.ratings_by_event = {int(k): RatingHistogram(v) for k, v in state["ratings_by_event"].items()}
+        sketches.watermarks = state["watermarks"]
+        return sketches
+
+
+def _source_name(shard: Optional[int]) -> str:
+    return "main" if shard is None else str(shard)
+
+
+def _tail(shard: Optional[int], include_archive: bool, query: str, after: int) -> List[Dict[str, Any]]:
+    return database.execute_query(query + " LIMIT ?", (after, REFRESH_BATCH), include_archive, shard)
+
+
+_TAILS = {
+    "Registrations": """
+        SELECT registration_id AS id, student_id, event_id, status FROM Registrations
+        WHERE registration_id > ? ORDER BY registration_id
+    """,
+    "Attendance": """
+        SELECT a.attendance_id AS id, a.attended, r.student_id, r.event_id, r.status,
+               e.college_id AS event_college_id, s.college_id AS student_college_id
+        FROM Attendance a
+        JOIN Registrations r ON r.registration_id = a.registration_id
+        JOIN Events e ON e.event_id = r.event_id
+        JOIN Students s ON s.student_id = r.student_id
+        WHERE a.attendance_id > ? ORDER BY a.attendance_id
+    """,
+    "Feedback": """
+        SELECT f.feedback_id AS id, f.rating, r.event_id
+        FROM Feedback f
+        JOIN Registrations r ON r.registration_id = f.registration_id
+        WHERE f.feedback_id > ? ORDER BY f.feedback_id
+    """,
+}
+
+
+class SketchStore:
+    """Loads, refreshes and saves the report sketches of this worker"""
+
+    def __init__(self):
+        self._sketches: Optional[ReportSketches] = None
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def _load(self) -> ReportSketches:
+        row = database.get_single_record("SELECT state FROM ReportSketches WHERE name = 'reports'")
+        if row:
+            state = json.loads(zlib.decompress(row["state"]))
+            # Saved under the other storage layout: the watermarks do not apply, recount from scratch
+            if ("main" in state["watermarks"]) != (not SHARDING_ENABLED):
+                return ReportSketches()
+            return ReportSketches.from_dict(state)
+        return ReportSketches()
+
+    def _catch_up(self, sketches: ReportSketches, include_archive: bool = False) -> int:
+        """Add the rows written since the watermarks; returns the number of rows read"""
+        def read(shard):
+            source = sketches.watermarks.get(_source_name(shard), {})
+            return shard, {table: _tail(shard, include_archive, query, source.get(table, 0))
+                           for table, query in _TAILS.items()}
+
+        read_rows = 0
+        while True:
+            batch_rows = 0
+            for shard, tables in fan_out(read):
+                source = sketches.watermarks.setdefault(_source_name(shard), {})
+                for row in tables["Registrations"]:
+                    if row["status"] == "Registered":
+                        sketches.add_registration(row["student_id"], row["event_id"])
+                for row in tables["Attendance"]:
+                    if row["attended"] == 1 and row["status"] == "Registered":
+                        sketches.add_attendance(row["student_id"], row["event_id"],
+                                                row["event_college_id"], row["student_college_id"])
+                for row in tables["Feedback"]:
+                    sketches.add_rating(row["event_id"], row["rating"])
+                for table, rows in tables.items():
+                    if rows:
+                        source[table] = rows[-1]["id"]
+                        batch_rows += len(rows)
+            read_rows += batch_rows
+            if batch_rows == 0:
+                return read_rows
+
+    def current(self) -> ReportSketches:
+        """The sketches, brought up to date with the rows written since the last call"""
+        with self._lock:
+            if self._sketches is None:
+                self._sketches = self._load()
+            if self._catch_up(self._sketches):
+                self._dirty = True
+            if self._dirty and time.monotonic() - self._saved_at >= SAVE_INTERVAL_SECONDS:
+                self._save()
+            return self._sketches
+
+    def _save(self):
+        state = zlib.compress(json.dumps(self._sketches.to_dict()).encode())
+        database.execute_insert(
+            "INSERT INTO ReportSketches (name, state, saved_at) VALUES ('reports', ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET state = excluded.state, saved_at = excluded.saved_at",
+            (state, time.time())
+        )
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def save(self):
+        """Persist the sketches if they changed since the last save"""
+        with self._lock:
+            if self._sketches is not None and self._dirty:
+                self._save()
+
+    def rebuild(self) -> int:
+        """Recount every row, including archived ones, and save; returns the number of rows read"""
+        with self._lock:
+            self._sketches = ReportSketches()
+            read_rows = self._catch_up(self._sketches, include_archive=not SHARDING_ENABLED)
+            self._save()
+            return read_rows
+
+
+store = SketchStore()
+
+
+def init_schema():
+    """Create the sketch table if it does not exist yet"""
+    with database.get_db_connection() as conn:
+        conn.executescript(SCHEMA)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the sketches of the approximate reports")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+    init_schema()
+    started = time.perf_counter()
+    rows = store.rebuild()
+    print(f"Recounted {rows} rows in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""Columnar snapshots of the database for offline analysis.
+
+Every table is written to SNAPSHOT_DIR as one file per column:
+
+- integers and timestamps (Unix seconds) as fixed-width int64 (.i64),
+  NULL stored as NULL_INT;
+- strings dictionary-encoded: int32 codes (.i32) into a dictionary of
+  distinct values (.dict, one JSON string per line), NULL stored as -1.
+
+manifest.json records the row count of every table, the dictionary sizes
+and the last row id exported from each database file. It is replaced
+atomically after the column files are written, so a reader only ever
+sees complete rows. Snapshot() memory-maps the column files and returns
+NumPy views of them without copying, or memoryviews when NumPy is not
+installed.
+
+An export appends only the rows added since the last one (per shard when
+sharding is enabled; archived rows are included). The API only ever
+inserts rows, but when the change feed shows an update or delete since
+the last export (a direct edit of the database), the tables affected are
+rewritten in full, into a new directory so that open readers keep theirs.
+The newest KEEP_GENERATIONS directories of a table are kept, so a reader
+opened before an export can still map its files until the export after it.
+
+Usage:
+    python snapshot.py export           # append new rows
+    python snapshot.py export --full    # rewrite the whole snapshot
+    python snapshot.py info
+"""
+import argparse
+import json
+import mmap
+import os
+import shutil
+import sys
+import threading
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set
+
+import database
+from sharding import FACT_TABLES, SHARDING_ENABLED, shard_ids
+
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+
+# Rows read from the database per query
+EXPORT_BATCH = 20000
+
+# Generation directories kept per table: the current one and those older readers may hold
+KEEP_GENERATIONS = int(os.getenv("SNAPSHOT_KEEP_GENERATIONS", "2"))
+
+FORMAT_VERSION = 1
+
+NULL_INT = -(2 ** 63)
+NULL_CODE = -1
+
+INT64 = "int64"
+TIMESTAMP = "timestamp"
+STRING = "string"
+
+# Table -> (primary key, columns as (name, kind, select expression))
+TABLES = {
+    "Colleges": ("College_id", (
+        ("College_id", INT64, None), ("name", STRING, None), ("location", STRING, None),
+    )),
+    "Students": ("student_id", (
+        ("student_id", INT64, None), ("name", STRING, None), ("email", STRING, None), ("college_id", INT64, None),
+    )),
+    "Events": ("event_id", (
+        ("event_id", INT64, None), ("name", STRING, None), ("type", STRING, None), ("date", TIMESTAMP, None),
+        ("capacity", INT64, None), ("description", STRING, None), ("college_id", INT64, None),
+        ("created_by", STRING, None),
+    )),
+    "Registrations": ("registration_id", (
+        ("registration_id", INT64, None), ("student_id", INT64, None), ("event_id", INT64, None),
+        ("status", STRING, None), ("timestamp", TIMESTAMP, None),
+    )),
+    "Attendance": ("attendance_id", (
+        ("attendance_id", INT64, None), ("registration_id", INT64, None), ("attended", INT64, None),
+        ("timestamp", TIMESTAMP, None),
+    )),
+    "Feedback": ("feedback_id", (
+        ("feedback_id", INT64, None), ("registration_id", INT64, None),
+        # Ratings are stored as text
+        ("rating", INT64, "CASE WHEN rating GLOB '[0-9]*' THEN CAST(rating AS INTEGER) END"),
+        ("comment", STRING, None),
+    )),
+}
+
+_export_lock = threading.Lock()
+
+
+def _source_name(shard: Optional[int]) -> str:
+    return "main" if shard is None else str(shard)
+
+
+def _sources(table: str) -> List[Optional[int]]:
+    """Database files holding a table's rows"""
+    if table in FACT_TABLES and SHARDING_ENABLED:
+        return shard_ids()
+    return [None]
+
+
+def _select(table: str) -> str:
+    key, columns = TABLES[table]
+    expressions = []
+    for name, kind, expression in columns:
+        if kind == TIMESTAMP:
+            expression = f"CAST(strftime('%s', {name}) AS INTEGER)"
+        expressions.append(f"{expression or name} AS {name}")
+    return f"SELECT {', '.join(expressions)} FROM {table} WHERE {key} > ? ORDER BY {key} LIMIT ?"
+
+
+def _column_file(table: str, generation: int, name: str, kind: str) -> str:
+    return os.path.join(table, str(generation), f"{name}.{'i32' if kind == STRING else 'i64'}")
+
+
+def _read_manifest(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(path, "manifest.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(path: str, manifest: Dict[str, Any]):
+    temporary = os.path.join(path, "manifest.json.tmp")
+    with open(temporary, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, os.path.join(path, "manifest.json"))
+
+
+def _change_heads() -> Dict[str, int]:
+    """Newest change feed id of every database file"""
+    heads = {}
+    for shard in [None] + (shard_ids() if SHARDING_ENABLED else []):
+        row = database.get_single_record("SELECT MAX(change_id) AS head FROM ChangeLog", shard=shard)
+        heads[_source_name(shard)] = row["head"] or 0
+    return heads
+
+
+def _modified_tables(since: Dict[str, int]) -> Set[str]:
+    """Tables with rows updated or deleted after the given change feed positions"""
+    modified = set()
+    for shard in [None] + (shard_ids() if SHARDING_ENABLED else []):
+        position = since.get(_source_name(shard))
+        horizon = database.get_single_record(
+            "SELECT purged_through FROM ChangeLogHorizon WHERE id = 1", shard=shard
+        )
+        if position is None or (horizon and horizon["purged_through"] > position):
+            return set(TABLES)  # New shard or compacted feed: the changes cannot be checked
+        rows = database.execute_query(
+            "SELECT DISTINCT table_name FROM ChangeLog WHERE change_id > ? AND op != 'insert'",
+            (position,), shard=shard
+        )
+        modified.update(row["table_name"] for row in rows if row["table_name"] in TABLES)
+    return modified
+
+
+def _next_generation(table_path: str) -> int:
+    existing = os.listdir(table_path) if os.path.isdir(table_path) else []
+    return max((int(entry) for entry in existing if entry.isdigit()), default=0) + 1
+
+
+class _TableWriter:
+    """Appends rows to the column files of one table"""
+
+    def __init__(self, path: str, table: str, state: Optional[Dict[str, Any]], generation: int):
+        self.path = path
+        self.table = table
+        self.columns = TABLES[table][1]
+        self.state = state or {
+            "generation": generation,
+            "rows": 0,
+            "watermarks": {},
+            "columns": {name: {"kind": kind, "file": _column_file(table, generation, name, kind)}
+                        for name, kind, _ in self.columns},
+        }
+        os.makedirs(os.path.join(path, table, str(self.state["generation"])), exist_ok=True)
+        self.files = {}
+        self.dictionaries: Dict[str, Dict[str, int]] = {}
+        for name, kind, _ in self.columns:
+            column = self.state["columns"][name]
+            self.files[name] = self._open(column["file"], self.state["rows"] * (4 if kind == STRING else 8))
+            if kind == STRING:
+                column.setdefault("dictionary", column["file"][:-len(".i32")] + ".dict")
+                column.setdefault("dictionary_size", 0)
+                column.setdefault("dictionary_bytes", 0)
+                self.files[column["dictionary"]] = self._open(column["dictionary"], column["dictionary_bytes"])
+                self.dictionaries[name] = self._load_dictionary(column)
+
+    def _open(self, relative: str, size: int):
+        """Open a file for appending, dropping anything past the last exported size (an interrupted export)"""
+        f = open(os.path.join(self.path, relative), "ab")
+        f.truncate(size)
+        return f
+
+    def _load_dictionary(self, column: Dict[str, Any]) -> Dict[str, int]:
+        with open(os.path.join(self.path, column["dictionary"]), "rb") as f:
+            values = [json.loads(line) for line in f.read(column["dictionary_bytes"]).splitlines()]
+        return {value: code for code, value in enumerate(values)}
+
+    def _encode(self, name: str, value: Any) -> int:
+        if value is None:
+            return NULL_CODE
+        value = str(value)
+        dictionary = self.dictionaries[name]
+        code = dictionary.get(value)
+        if code is None:
+            code = dictionary[value] = len(dictionary)
+            line = (json.dumps(value) + "\n").encode()
+            column = self.state["columns"][name]
+            self.files[column["dictionary"]].write(line)
+            column["dictionary_size"] += 1
+            column["dictionary_bytes"] += len(line)
+        return code
+
+    def append(self, rows: List[Dict[str, Any]]):
+        for name, kind, _ in self.columns:
+            if kind == STRING:
+                values = array("i", [self._encode(name, row[name]) for row in rows])
+            else:
+                values = array("q", [NULL_INT if row[name] is None else int(row[name]) for row in rows])
+            self.files[name].write(values.tobytes())
+        self.state["rows"] += len(rows)
+
+    def close(self):
+        for f in self.files.values():
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+
+
+def export(path: str = SNAPSHOT_DIR, full: bool = False) -> Dict[str, int]:
+    """Append the rows added since the last export, or rewrite everything; returns rows written per table"""
+    with _export_lock:
+        os.makedirs(path, exist_ok=True)
+        manifest = _read_manifest(path)
+        if (full or manifest is None or manifest.get("format") != FORMAT_VERSION
+                or manifest.get("byteorder") != sys.byteorder or manifest.get("sharded") != SHARDING_ENABLED):
+            manifest = {"format": FORMAT_VERSION, "byteorder": sys.byteorder, "sharded": SHARDING_ENABLED,
+                        "tables": {}, "changes": {}}
+        # Taken first, so changes made during the export are checked again by the next one
+        heads = _change_heads()
+        rewrite = _modified_tables(manifest["changes"]) if manifest["tables"] else set(TABLES)
+
+        written = {}
+        for table in TABLES:
+            state = manifest["tables"].get(table)
+            generation = 0
+            if table in rewrite or state is None:
+                # Rewritten into a new directory, readers of the current manifest keep their files
+                generation = _next_generation(os.path.join(path, table))
+                state = None
+            writer = _TableWriter(path, table, state, generation)
+            query = _select(table)
+            written[table] = 0
+            try:
+                for shard in _sources(table):
+                    source = _source_name(shard)
+                    include_archive = table in FACT_TABLES and shard is None
+                    while True:
+                        rows = database.execute_query(
+                            query, (writer.state["watermarks"].get(source, 0), EXPORT_BATCH), include_archive, shard
+                        )
+                        if not rows:
+                            break
+                        writer.append(rows)
+                        writer.state["watermarks"][source] = rows[-1][TABLES[table][0]]
+                        written[table] += len(rows)
+            finally:
+                writer.close()
+            manifest["tables"][table] = writer.state
+
+        manifest["changes"] = heads
+        manifest["exported_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        _write_manifest(path, manifest)
+        for table in manifest["tables"]:
+            _drop_old_generations(os.path.join(path, table))
+        return written
+
+
+def _drop_old_generations(table_path: str):
+    """Remove the generation directories older than the newest KEEP_GENERATIONS"""
+    generations = sorted((int(entry) for entry in os.listdir(table_path) if entry.isdigit()), reverse=True)
+    for generation in generations[max(KEEP_GENERATIONS, 1):]:
+        shutil.rmtree(os.path.join(table_path, str(generation)), ignore_errors=True)
+
+
+class Snapshot:
+    """Read-only access to an exported snapshot; columns are memory-mapped, not copied.
+
+    Integer and timestamp columns come back as int64 arrays, string columns
+    as int32 codes into dictionary(table, column). The row counts are the
+    ones of the manifest at open time; open a new Snapshot to see later exports.
+    """
+
+    def __init__(self, path: str = SNAPSHOT_DIR):
+        self.path = path
+        self.manifest = _read_manifest(path)
+        if self.manifest is None:
+            raise FileNotFoundError(f"No snapshot in {path}, run python snapshot.py export")
+        if self.manifest["byteorder"] != sys.byteorder:
+            raise ValueError(f"Snapshot was written on a {self.manifest['byteorder']}-endian machine")
+        self._maps: List[mmap.mmap] = []
+        self._dictionaries: Dict[tuple, List[str]] = {}
+
+    def tables(self) -> List[str]:
+        return list(self.manifest["tables"])
+
+    def rows(self, table: str) -> int:
+        return self.manifest["tables"][table]["rows"]
+
+    def columns(self, table: str) -> Dict[str, str]:
+        """Column names and kinds (int64, timestamp or string)"""
+        return {name: column["kind"] for name, column in self.manifest["tables"][table]["columns"].items()}
+
+    def column(self, table: str, name: str):
+        """Zero-copy view of a column: a NumPy array, or a memoryview without NumPy"""
+        column = self.manifest["tables"][table]["columns"][name]
+        itemsize, typecode = (4, "i") if column["kind"] == STRING else (8, "q")
+        length = self.rows(table) * itemsize
+        if length:
+            with open(os.path.join(self.path, column["file"]), "rb") as f:
+                buffer = mmap.mmap(f.fileno(), length, access=mmap.ACCESS_READ)
+            self._maps.append(buffer)
+        else:
+            buffer = b""  # Zero-length files cannot be mapped
+        try:
+            import numpy
+        except ImportError:
+            return memoryview(buffer).cast(typecode)
+        return numpy.frombuffer(buffer, dtype=numpy.int32 if typecode == "i" else numpy.int64)
+
+    def dictionary(self, table: str, name: str) -> List[str]:
+        """Distinct values of a string column, indexed by code"""
+        key = (table, name)
+        if key not in self._dictionaries:
+            column = self.manifest["tables"][table]["columns"][name]
+            with open(os.path.join(self.path, column["dictionary"]), "rb") as f:
+                lines = f.read(column["dictionary_bytes"]).splitlines()
+            self._dictionaries[key] = [json.loads(line) for line in lines]
+        return self._dictionaries[key]
+
+    def strings(self, table: str, name: str) -> List[Optional[str]]:
+        """Decoded values of a string column; a copy, prefer the codes for large tables"""
+        dictionary = self.dictionary(table, name)
+        return [None if code == NULL_CODE else dictionary[code] for code in self.column(table, name)]
+
+    def close(self):
+        """Unmap the columns; views returned earlier must not be used afterwards"""
+        for buffer in self._maps:
+            try:
+                buffer.close()
+            except BufferError:
+                pass  # Still referenced by a view, unmapped when the view is released
+        self._maps = []
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export columnar snapshots for offline analysis")
+    parser.add_argument("command", choices=["export", "info"])
+    parser.add_argument("--full", action="store_true", help="Rewrite the snapshot instead of appending")
+    parser.add_argument("--path", default=SNAPSHOT_DIR)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        written = export(args.path, full=args.full)
+        for table, count in written.items():
+            print(f"{table}: {count} rows written")
+    else:
+        with Snapshot(args.path) as snapshot:
+            print(f"Exported at {snapshot.manifest['exported_at']}")
+            for table in snapshot.tables():
+                print(f"{table}: {snapshot.rows(table)} rows, columns {', '.join(snapshot.columns(table))}")
+
+
+if __name__ == "__main__":
+    main()